@@ -0,0 +1,102 @@
+"""
+Load test of the local API: requests per second at several concurrency levels,
+each client keeping its connection alive.
+
+    python -m benchmarks.api_load --size 10000 --concurrency 1 8 32 --duration 5
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from src.api.client import ApiClient
+from src.api.server import ApiServer
+from src.logging.logging import AuditLog
+from src.manager.password_manager import PasswordManager
+from src.user.user_manager import UserManager
+
+from benchmarks.synthetic import write_synthetic_vault
+
+USERNAME = 'bench'
+PASSWORD = 'password'
+
+
+async def client_loop(client: ApiClient, entry_ids: list[str], batch: int,
+                      deadline: float, rng: random.Random) -> int:
+    """Sends requests until the deadline, returns how many were answered"""
+    done = 0
+    while time.perf_counter() < deadline:
+        if batch > 1:
+            await client.get_many(rng.sample(entry_ids, batch))
+        else:
+            await client.get(rng.choice(entry_ids))
+        done += 1
+    return done
+
+
+async def run_level(port: int, entry_ids: list[str], concurrency: int,
+                    batch: int, duration: float) -> float:
+    """Returns requests per second with concurrency logged in clients"""
+    clients = [ApiClient(port=port) for _ in range(concurrency)]
+    for client in clients:
+        await client.login(USERNAME, PASSWORD)
+
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(
+        client_loop(client, entry_ids, batch, start + duration, random.Random(i))
+        for i, client in enumerate(clients)
+    ))
+    elapsed = time.perf_counter() - start
+
+    for client in clients:
+        await client.close()
+    return sum(counts) / elapsed
+
+
+async def load_test(workdir: Path, size: int, levels: list[int],
+                    batch: int, duration: float) -> list[tuple[int, float]]:
+    """Serves a synthetic vault of size entries and measures every concurrency level"""
+    log = AuditLog(workdir / 'trail.log')
+    users = UserManager(log, workdir / 'users.json')
+    users.register_user(USERNAME, PASSWORD)
+    key = users.login_user(USERNAME, PASSWORD)
+    write_synthetic_vault(workdir, USERNAME, size, key)
+
+    def open_vault(username: str, vault_key: bytes) -> PasswordManager:
+        return PasswordManager(username, vault_key, log, workdir)
+
+    entry_ids = [e.id for e in open_vault(USERNAME, key).list_passwords()]
+    server = await ApiServer(users, log, open_vault).start('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server:
+        return [
+            (level, await run_level(port, entry_ids, level, batch, duration))
+            for level in levels
+        ]
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Runs the load test and prints a table of the results"""
+    parser = argparse.ArgumentParser(description='Local API load test')
+    parser.add_argument('--size', type=int, default=10_000, help='Entries in the served vault')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--batch', type=int, default=1,
+                        help='Entries per request, above 1 uses get_many')
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds per level')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(load_test(
+            Path(workdir), args.size, args.concurrency, args.batch, args.duration))
+
+    print(f'{"clients":>8} {"requests/s":>12} {"entries/s":>12}')
+    for concurrency, rate in results:
+        print(f'{concurrency:>8} {rate:>12.0f} {rate * args.batch:>12.0f}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,36 @@
+"""
+Measures password generation throughput.
+
+    python -m benchmarks.bench_generators [count]
+"""
+import sys
+import time
+
+import src.common.generators as generators
+
+
+def passwords_per_second(count: int, length: int = 16) -> float:
+    """Generates count passwords in one batch and returns the achieved rate"""
+    start = time.perf_counter()
+    generators.generate_passwords(count, length, True, True, True)
+    return count / (time.perf_counter() - start)
+
+
+def passphrases_per_second(count: int, words: int = 6) -> float:
+    """Generates count passphrases and returns the achieved rate"""
+    start = time.perf_counter()
+    for _ in range(count):
+        generators.generate_passphrase(words)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Prints the generation rates"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    print(f'generate_passwords(16 chars): {passwords_per_second(count):,.0f} passwords/s')
+    print(f'generate_passphrase(6 words): {passphrases_per_second(count):,.0f} passphrases/s')
+
+
+if __name__ == '__main__':
+    main()
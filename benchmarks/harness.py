@@ -0,0 +1,92 @@
+"""
+Timing, memory measurement and baseline comparison for the benchmark suite
+"""
+import json
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable
+
+
+@dataclass
+class BenchmarkResult:
+    """
+    BenchmarkResult holds the timings of one benchmark in seconds and its peak
+    traced memory allocation in bytes
+    """
+    name: str
+    size: int
+    repeat: int
+    best: float
+    median: float
+    peak_memory: int
+
+
+@dataclass
+class Regression:
+    """
+    Regression describes a benchmark that got slower than its baseline
+    """
+    name: str
+    size: int
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        """ How many times slower the current run is """
+        return self.current / self.baseline
+
+
+def measure(name: str, size: int, func: Callable[[], object],
+            repeat: int = 5, setup: Callable[[], object] | None = None) -> BenchmarkResult:
+    """
+    Runs func repeat times, calling setup before each run outside of the timing.
+    Memory is measured in one extra run, so tracing doesn't slow down the timed runs
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(name, size, repeat, min(timings), statistics.median(timings), peak)
+
+
+def save_results(results: list[BenchmarkResult], path: Path) -> None:
+    """ Writes the results as a JSON document """
+    path.write_text(json.dumps([asdict(r) for r in results], indent=2), encoding='utf-8')
+
+
+def load_results(path: Path) -> list[BenchmarkResult]:
+    """ Reads results written by save_results """
+    return [BenchmarkResult(**r) for r in json.loads(path.read_text(encoding='utf-8'))]
+
+
+def compare(results: list[BenchmarkResult], baseline: list[BenchmarkResult],
+            threshold: float = 0.25) -> list[Regression]:
+    """
+    Returns every benchmark whose median is more than threshold slower than the
+    baseline run with the same name and size. Benchmarks missing from either side are ignored
+    """
+    previous = {(r.name, r.size): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result.name, result.size))
+        if base is not None and result.median > base.median * (1 + threshold):
+            regressions.append(Regression(result.name, result.size, base.median, result.median))
+
+    return regressions
@@ -0,0 +1,186 @@
+"""
+Runs the benchmark suite over synthetic vaults and compares it against a baseline.
+
+    python -m benchmarks.run --sizes 1000 10000 100000 --output results.json
+    python -m benchmarks.run --baseline baseline.json --threshold 0.25
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from cryptography.fernet import Fernet
+
+import src.common.encryption as encryption
+import src.common.generators as generators
+from src.logging.logging import AuditLog, Category
+from src.manager.password_manager import PasswordManager
+from src.user.user_manager import UserManager
+
+from benchmarks.harness import (
+    BenchmarkResult, measure, save_results, load_results, compare
+)
+from benchmarks.synthetic import write_synthetic_vault, write_synthetic_users
+
+USERNAME = 'bench'
+
+
+def bench_vault(size: int, workdir: Path, repeat: int) -> list[BenchmarkResult]:
+    """Benchmarks PasswordManager CRUD, search and load/save on a vault of size entries"""
+    key = Fernet.generate_key()
+    log = AuditLog(workdir / 'trail.log')
+    write_synthetic_vault(workdir, USERNAME, size, key)
+
+    def open_vault() -> PasswordManager:
+        return PasswordManager(USERNAME, key, log, workdir)
+
+    manager = open_vault()
+    entry_id = manager.list_passwords()[size // 2].id
+    state = {}
+
+    def create_entry() -> None:
+        state['created'] = manager.create_entry('new.example.com', 'new', 'password', 'work')
+
+    def delete_created() -> None:
+        manager.delete_entry(state['created'].id)
+
+    def edit_entry() -> None:
+        entry = manager.fetch_entry_by_id(entry_id)
+        entry.password = 'changed'
+        manager.edit_entry(entry_id, entry)
+
+    results = [
+        measure('vault.load', size, open_vault, repeat),
+        measure('vault.create_entry', size, create_entry, repeat),
+        measure('vault.delete_entry', size, delete_created, repeat, setup=create_entry),
+        measure('vault.fetch_entry', size, lambda: manager.fetch_entry_by_id(entry_id), repeat),
+        measure('vault.edit_entry', size, edit_entry, repeat),
+        measure('vault.list', size, manager.list_passwords, repeat),
+        measure('vault.search_by_address', size,
+                lambda: manager.search_by_address('bank'), repeat),
+        measure('vault.search_by_username', size,
+                lambda: manager.search_by_username('user42'), repeat),
+        measure('vault.search_by_groups', size,
+                lambda: manager.search_by_groups('work', 'banking'), repeat),
+        measure('vault.audit', size, manager.audit, 1),
+    ]
+
+    PasswordManager(USERNAME, key, log, workdir, vault_format='binary')
+    results.append(measure(
+        'vault.load_binary', size,
+        lambda: PasswordManager(USERNAME, key, log, workdir, vault_format='binary'), repeat))
+    return results
+
+
+def bench_users(size: int, workdir: Path, repeat: int) -> list[BenchmarkResult]:
+    """Benchmarks UserManager load, registration and login with size registered users"""
+    log = AuditLog(workdir / 'trail.log')
+    user_file = write_synthetic_users(workdir / 'users.json', size, 'password')
+    users = UserManager(log, user_file)
+
+    counter = iter(range(size, sys.maxsize))
+    return [
+        measure('users.load', size, lambda: UserManager(log, user_file), repeat),
+        measure('users.register', size,
+                lambda: users.register_user(f'user{next(counter)}', 'password'), repeat),
+        measure('users.login', size, lambda: users.login_user('user0', 'password'), repeat),
+    ]
+
+
+def bench_crypto(repeat: int) -> list[BenchmarkResult]:
+    """
+    Benchmarks key derivation, encryption and password generation. The raw variants
+    decrypt into wiped buffers, compare their peak memory with the str ones
+    """
+    key = Fernet.generate_key()
+    token = encryption.encrypt('password', key)
+    raw = encryption.to_raw(token)
+
+    def decrypt_raw() -> None:
+        for _ in range(1000):
+            encryption.wipe(encryption.decrypt_raw(raw, key))
+
+    return [
+        measure('crypto.password_to_fernet_key', 1,
+                lambda: encryption.password_to_fernet_key('password', b'saltsalt'), repeat),
+        measure('crypto.encrypt', 1000,
+                lambda: encryption.encrypt_many(['password'] * 1000, key), repeat),
+        measure('crypto.decrypt', 1000,
+                lambda: encryption.decrypt_many([token] * 1000, key), repeat),
+        measure('crypto.encrypt_raw', 1000,
+                lambda: [encryption.encrypt_raw(b'password', key) for _ in range(1000)], repeat),
+        measure('crypto.decrypt_raw', 1000, decrypt_raw, repeat),
+        measure('generators.generate_passwords', 10000,
+                lambda: generators.generate_passwords(10000, 16, True, True, True), repeat),
+    ]
+
+
+def bench_logging(workdir: Path, repeat: int) -> list[BenchmarkResult]:
+    """Benchmarks writing 1000 audit log lines, and 1000 read events the policy mostly drops"""
+    log = AuditLog(workdir / 'bench.log')
+
+    def write() -> None:
+        for i in range(1000):
+            log.log_with_user(f'Fetched password entry {i}', USERNAME)
+
+    def write_reads() -> None:
+        for _ in range(1000):
+            log.log_with_user('Listing passwords', USERNAME, category=Category.READ)
+
+    return [
+        measure('logging.log_with_user', 1000, write, repeat),
+        measure('logging.read_events', 1000, write_reads, repeat),
+    ]
+
+
+def run(sizes: list[int], repeat: int) -> list[BenchmarkResult]:
+    """Runs the whole suite, every size on a fresh temporary directory"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        results += bench_crypto(repeat)
+        results += bench_logging(workdir, repeat)
+        for size in sizes:
+            size_dir = workdir / str(size)
+            size_dir.mkdir()
+            results += bench_vault(size, size_dir, repeat)
+            results += bench_users(size, size_dir, repeat)
+            shutil.rmtree(size_dir)
+
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Runs the suite, returns 1 when a regression against the baseline was found"""
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', type=Path, help='write the results as JSON')
+    parser.add_argument('--baseline', type=Path, help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown against the baseline, 0.25 = 25%%')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat)
+    for r in results:
+        print(f'{r.name:<34} {r.size:>8} {r.median * 1000:>11.3f} ms '
+              f'{r.peak_memory / 1024:>11.1f} KiB')
+
+    if args.output is not None:
+        save_results(results, args.output)
+
+    if args.baseline is None:
+        return 0
+
+    regressions = compare(results, load_results(args.baseline), args.threshold)
+    for reg in regressions:
+        print(f'REGRESSION {reg.name} [{reg.size}]: '
+              f'{reg.baseline * 1000:.3f} ms -> {reg.current * 1000:.3f} ms ({reg.ratio:.2f}x)')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
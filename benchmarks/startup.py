@@ -0,0 +1,58 @@
+"""
+Time to first frame of the TUI, measured with Textual's headless test harness.
+
+    python -m benchmarks.startup --users 10000 --repeat 5
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from src.logging.logging import AuditLog
+from src.ui.ui import PasswordManagerApp
+from src.ui.users import LoginScreen
+
+from benchmarks.synthetic import write_synthetic_users
+
+# Enforced by the test suite, generous enough for slow CI machines
+STARTUP_BUDGET_SECONDS = 2.0
+
+
+async def time_to_first_frame(user_file: Path, log: AuditLog) -> float:
+    """
+    Returns the seconds from constructing the app until the login screen has been
+    composed and rendered, the user store may still be loading at that point
+    """
+    start = time.perf_counter()
+    app = PasswordManagerApp(user_file, log)
+    async with app.run_test() as pilot:
+        await pilot.pause()
+        if not isinstance(app.screen, LoginScreen):
+            raise RuntimeError(f'Started on {type(app.screen).__name__}, not the login screen')
+        elapsed = time.perf_counter() - start
+        await asyncio.wrap_future(app.users)
+    return elapsed
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Measures time to first frame with a synthetic user store"""
+    parser = argparse.ArgumentParser(description='TUI start-up benchmark')
+    parser.add_argument('--users', type=int, default=10_000, help='Users in the user store')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        log = AuditLog(Path(workdir) / 'trail.log')
+        user_file = write_synthetic_users(Path(workdir) / 'users.json', args.users, 'password')
+        timings = [asyncio.run(time_to_first_frame(user_file, log)) for _ in range(args.repeat)]
+
+    print(f'time to first frame: best {min(timings) * 1000:.0f} ms, '
+          f'median {statistics.median(timings) * 1000:.0f} ms '
+          f'(budget {STARTUP_BUDGET_SECONDS * 1000:.0f} ms)')
+    return 0 if statistics.median(timings) <= STARTUP_BUDGET_SECONDS else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,68 @@
+"""
+Synthetic vaults and users for benchmarks
+"""
+import json
+import uuid
+from pathlib import Path
+
+import src.common.encryption as encryption
+import src.common.generators as generators
+
+GROUPS = ('', 'work', 'personal', 'banking', 'social', 'shopping')
+DOMAINS = ('example.com', 'mail.org', 'shop.net', 'bank.io', 'social.dev')
+TIMESTAMP = '2025-01-01 12:00:00'
+
+
+def synthetic_entries(size: int, key: bytes) -> list[dict]:
+    """
+    Builds size vault records. Encrypting every password would dominate generation of
+    large vaults, so a small pool of real tokens is shared between the records
+    """
+    tokens = encryption.encrypt_many([f'password-{i}' for i in range(64)], key)
+
+    return [
+        {
+            'id': str(uuid.UUID(int=i)),
+            'username': f'user{i % 997}',
+            'password': tokens[i % len(tokens)],
+            'address': f'site{i}.{DOMAINS[i % len(DOMAINS)]}',
+            'group': GROUPS[i % len(GROUPS)],
+            'created_at': TIMESTAMP,
+            'updated_at': TIMESTAMP,
+        }
+        for i in range(size)
+    ]
+
+
+def write_synthetic_vault(storage_path: Path, username: str, size: int, key: bytes) -> Path:
+    """
+    Writes a vault of size entries where PasswordManager(storage_path=storage_path)
+    expects it, returns the vault file
+    """
+    directory = storage_path / 'user_passwords'
+    directory.mkdir(parents=True, exist_ok=True)
+
+    vault = directory / f'{username}.json'
+    vault.write_text(json.dumps(synthetic_entries(size, key)), encoding='utf-8')
+    return vault
+
+
+def write_synthetic_users(path: Path, size: int, password: str) -> Path:
+    """
+    Writes a user store of size users named user0, user1, ... sharing the same password
+    """
+    salt = generators.generate_salt()
+    password_hash = generators.generate_hashed_password(password, salt)
+
+    users = [
+        {
+            'password_salt': salt,
+            'password_hash': password_hash,
+            'username': f'user{i}',
+            'master_password_salt': salt,
+            'groups': list(GROUPS[1:]),
+        }
+        for i in range(size)
+    ]
+    path.write_text(json.dumps(users), encoding='utf-8')
+    return path
@@ -0,0 +1,178 @@
+"""
+Latency of the vault screen and its modals, driven by Textual's headless pilot
+over synthetic vaults.
+
+    python -m benchmarks.ui --sizes 1000 10000 --repeat 3
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from cryptography.fernet import Fernet
+from textual.app import App
+from textual.pilot import Pilot
+from textual.widgets import DataTable, Input, Select
+
+from src.logging.logging import AuditLog
+from src.manager.password_manager import PasswordManager
+from src.ui.entry import EntryScreen
+from src.ui.modals import EditModal, DeleteModal, FilterByGroupModal
+from src.ui.vault import VaultScreen
+from src.user.user_manager import UserManager
+
+from benchmarks.synthetic import write_synthetic_vault, write_synthetic_users
+
+USERNAME = 'user0'
+FILTER_GROUP = 'work'
+SCREEN_SIZE = (120, 50)
+
+# Seconds per interaction, enforced by the test suite on a vault of 1000 entries
+# and generous enough for slow CI machines
+UI_BUDGETS = {
+    'mount': 3.0,
+    'filter': 1.5,
+    'open_entry': 0.5,
+    'create': 3.0,
+    'edit': 3.0,
+    'delete': 3.0,
+}
+# A step that takes this many times its budget is given up as hung
+TIMEOUT_FACTOR = 10
+
+
+class VaultApp(App):
+    """Bare app showing the vault screen, skipping the login"""
+    CSS_PATH = Path(__file__).resolve().parent.parent / 'src' / 'ui' / 'style.tcss'
+
+
+async def _step(pilot: Pilot, step: str, action: Callable[[], Awaitable | None],
+                done: Callable[[], bool]) -> float:
+    """
+    Runs one interaction and returns the seconds until done() holds
+    after the app has processed everything it triggered, raises TimeoutError
+    if it doesn't hold within TIMEOUT_FACTOR times the budget of the step
+    """
+    start = time.perf_counter()
+    deadline = start + UI_BUDGETS[step] * TIMEOUT_FACTOR
+    pending = action()
+    if pending is not None:
+        await pending
+    await pilot.pause()
+    while not done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f'The {step} step did not finish within '
+                               f'{UI_BUDGETS[step] * TIMEOUT_FACTOR:.0f} seconds')
+        await pilot.pause(0.01)
+    return time.perf_counter() - start
+
+
+async def measure_vault_screen(pwd_manager: PasswordManager,
+                               user_manager: UserManager) -> dict[str, float]:
+    """
+    Mounts the vault screen, filters by group, opens an entry, then creates an entry
+    and edits and deletes it in the modals, returns the seconds each step took
+    """
+    app = VaultApp()
+    timings = {}
+    size = pwd_manager.count_entries()
+    in_group = pwd_manager.count_entries(FILTER_GROUP)
+
+    async with app.run_test(size=SCREEN_SIZE) as pilot:
+        def rows() -> int:
+            return app.screen.query_one(DataTable).row_count
+
+        screen = VaultScreen(pwd_manager, user_manager)
+        timings['mount'] = await _step(
+            pilot, 'mount', lambda: app.push_screen(screen),
+            lambda: app.screen is screen and rows() == size)
+
+        await pilot.press('f')
+        await pilot.pause()
+        if not isinstance(app.screen, FilterByGroupModal):
+            raise RuntimeError(f'Expected the group filter, got {type(app.screen).__name__}')
+        app.screen.query_one('#group_filter', Select).value = FILTER_GROUP
+        timings['filter'] = await _step(
+            pilot, 'filter', lambda: pilot.click('#filter'),
+            lambda: app.screen is screen and rows() == in_group)
+
+        timings['open_entry'] = await _step(
+            pilot, 'open_entry', lambda: pilot.press('enter'),
+            lambda: isinstance(app.screen, EntryScreen))
+        await pilot.press('escape')
+        await pilot.pause()
+
+        await pilot.press('c')
+        await pilot.pause()
+        modal = app.screen
+        if not isinstance(modal, EditModal):
+            raise RuntimeError(f'Expected the edit modal, got {type(modal).__name__}')
+        modal.query_one('#address', Input).value = 'benchmark.example.com'
+        modal.query_one('#username', Input).value = 'benchmark'
+        modal.query_one('#password', Input).value = 'benchmark-password'
+        timings['create'] = await _step(
+            pilot, 'create', lambda: pilot.click('#ok'),
+            lambda: app.screen is screen and rows() == size + 1)
+
+        created = pwd_manager.search_by_address('benchmark.example.com')[0].id
+        table = screen.query_one(DataTable)
+        table.move_cursor(row=table.get_row_index(created))
+        await pilot.press('e')
+        await pilot.pause()
+        app.screen.query_one('#password', Input).value = 'changed-password'
+        timings['edit'] = await _step(
+            pilot, 'edit', lambda: pilot.click('#ok'), lambda: app.screen is screen)
+
+        table.move_cursor(row=table.get_row_index(created))
+        await pilot.press('d')
+        await pilot.pause()
+        if not isinstance(app.screen, DeleteModal):
+            raise RuntimeError(f'Expected the delete modal, got {type(app.screen).__name__}')
+        timings['delete'] = await _step(
+            pilot, 'delete', lambda: pilot.click('#confirm'),
+            lambda: app.screen is screen and rows() == size)
+
+    return timings
+
+
+def open_synthetic_vault(workdir: Path, size: int,
+                         log: AuditLog) -> tuple[PasswordManager, UserManager]:
+    """Writes a synthetic vault and user store to workdir and opens both"""
+    key = Fernet.generate_key()
+    write_synthetic_vault(workdir, USERNAME, size, key)
+    user_file = write_synthetic_users(workdir / 'users.json', 1, 'password')
+    return PasswordManager(USERNAME, key, log, workdir), UserManager(log, user_file)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Measures vault screen latencies on synthetic vaults of the given sizes"""
+    parser = argparse.ArgumentParser(description='Vault screen latency benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    for size in args.sizes:
+        runs = []
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as workdir:
+                log = AuditLog(Path(workdir) / 'trail.log')
+                pwd_manager, user_manager = open_synthetic_vault(Path(workdir), size, log)
+                runs.append(asyncio.run(measure_vault_screen(pwd_manager, user_manager)))
+
+        print(f'{size} entries:')
+        for step, budget in UI_BUDGETS.items():
+            median = statistics.median(run[step] for run in runs)
+            over_budget |= median > budget
+            print(f'  {step:<12} median {median * 1000:7.0f} ms, '
+                  f'best {min(run[step] for run in runs) * 1000:7.0f} ms '
+                  f'(budget {budget * 1000:.0f} ms)')
+
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
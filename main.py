@@ -1,9 +1,10 @@
 """Main module"""
 
+import sys
+
 from src.logging.logging import AuditLog
-from src.user.user_manager import UserManager
-from src.ui.ui import PasswordManagerApp
-from src.common.config import APP_DATA_DIR
+from src.common.config import APP_DATA_DIR, METRICS_ENABLED
+from src.metrics.metrics import METRICS
 
 def main():
     """Main function"""
@@ -11,11 +12,20 @@ def main():
     if not APP_DATA_DIR.exists():
         APP_DATA_DIR.mkdir()
 
+    METRICS.enabled = METRICS_ENABLED
     audit_log = AuditLog(APP_DATA_DIR / 'trail.log')
-    usr_mgr = UserManager(audit_log, APP_DATA_DIR / 'users.json')
 
-    app = PasswordManagerApp(usr_mgr, audit_log)
+    # Only the code path that runs is imported, the TUI starts faster without the CLI and vice versa
+    if len(sys.argv) > 1:
+        import src.cli.cli as cli
+        sys.exit(cli.main(sys.argv[1:], audit_log))
+
+    from src.common.clipboard import CLIPBOARD
+    from src.ui.ui import PasswordManagerApp
+
+    app = PasswordManagerApp(APP_DATA_DIR / 'users.json', audit_log)
     app.run()
+    CLIPBOARD.close()
 
 
 if __name__ == "__main__":
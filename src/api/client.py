@@ -0,0 +1,122 @@
+"""
+Minimal asyncio client of the local API, keeping one connection alive across requests
+"""
+import asyncio
+import json
+from pathlib import Path
+
+from src.manager.password_manager import LoginEntry
+
+
+class ApiClientError(Exception):
+    """
+    ApiClientError is raised when the API answers with an error status
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(f'{status}: {message}')
+        self.status = status
+
+
+class ApiClient:
+    """
+    Sends requests over a single keep-alive connection, reconnecting when the server
+    closed it. Requests on one client are sent one at a time.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, socket_path: Path | None = None):
+        self.__host = host
+        self.__port = port
+        self.__socket_path = socket_path
+        self.__reader: asyncio.StreamReader | None = None
+        self.__writer: asyncio.StreamWriter | None = None
+        self.__lock = asyncio.Lock()
+        self.token: str | None = None
+
+    async def __aenter__(self) -> 'ApiClient':
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    async def login(self, username: str, password: str) -> None:
+        """ Opens a session, later requests use its token """
+        response = await self.request('POST', '/session', {'username': username, 'password': password})
+        self.token = response['token']
+
+    async def logout(self) -> None:
+        """ Ends the session """
+        await self.request('DELETE', '/session')
+        self.token = None
+
+    async def list_entries(self, **params: str | int) -> list[dict]:
+        """ Returns entries without passwords, params as accepted by GET /entries """
+        query = '&'.join(f'{k}={v}' for k, v in params.items())
+        response = await self.request('GET', f'/entries?{query}' if query else '/entries')
+        return response['entries']
+
+    async def get(self, entry_id: str) -> LoginEntry:
+        """ Returns one entry with its password """
+        return LoginEntry(**await self.request('GET', f'/entries/{entry_id}'))
+
+    async def get_many(self, entry_ids: list[str]) -> list[LoginEntry]:
+        """ Returns several entries with their passwords in one request """
+        response = await self.request('POST', '/entries/get_many', {'ids': entry_ids})
+        return [LoginEntry(**e) for e in response['entries']]
+
+    async def close(self) -> None:
+        """ Closes the connection """
+        if self.__writer is not None:
+            writer, self.__reader, self.__writer = self.__writer, None, None
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def request(self, method: str, path: str, payload: dict | None = None) -> dict:
+        """ Sends a request and returns the JSON response, raises ApiClientError on errors """
+        body = b'' if payload is None else json.dumps(payload).encode()
+        headers = f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n'
+        if self.token is not None:
+            headers += f'Authorization: Bearer {self.token}\r\n'
+
+        async with self.__lock:
+            for attempt in range(2):
+                if self.__writer is None:
+                    await self.__connect()
+                try:
+                    self.__writer.write(headers.encode('latin-1') + b'\r\n' + body)
+                    await self.__writer.drain()
+                    status, keep_alive, data = await self.__read_response()
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    await self.close()
+                    if attempt:
+                        raise
+
+            if not keep_alive:
+                await self.close()
+
+        response = json.loads(data or b'{}')
+        if status >= 400:
+            raise ApiClientError(status, response.get('error', ''))
+        return response
+
+    async def __connect(self) -> None:
+        if self.__socket_path is not None:
+            self.__reader, self.__writer = await asyncio.open_unix_connection(str(self.__socket_path))
+        else:
+            self.__reader, self.__writer = await asyncio.open_connection(self.__host, self.__port)
+
+    async def __read_response(self) -> tuple[int, bool, bytes]:
+        status_line = await self.__reader.readline()
+        if not status_line:
+            raise ConnectionResetError('The server closed the connection')
+
+        headers = {}
+        while (line := await self.__reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = await self.__reader.readexactly(int(headers.get('content-length', 0)))
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        return int(status_line.split()[1]), keep_alive, body
@@ -0,0 +1,316 @@
+"""
+Local HTTP API serving vault entries to scripts, on top of PasswordManager and UserManager
+"""
+import asyncio
+import json
+import os
+import secrets
+import time
+from dataclasses import asdict, dataclass
+from http import HTTPStatus
+from pathlib import Path
+from typing import Callable
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from src.common.config import API_IDLE_TIMEOUT, API_SESSION_TTL, ENCRYPT_METADATA, VAULT_FORMAT
+from src.common.exceptions import UserInvalidLoginException
+from src.logging.logging import AuditLog, Category, Level
+from src.manager.password_manager import LoginEntry, PasswordManager
+from src.user.user_manager import UserManager
+
+MAX_HEADERS = 100
+MAX_BODY = 1 << 20
+MAX_BATCH = 1000
+
+VaultOpener = Callable[[str, bytes], PasswordManager]
+
+
+class HttpError(Exception):
+    """
+    HttpError ends a request with the given status and message
+    """
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Session:
+    """
+    Session ties an API token to the unlocked vault of a user until it expires
+    """
+    username: str
+    expires_at: float
+
+
+@dataclass
+class Request:
+    """
+    Request is a parsed HTTP request
+    """
+    method: str
+    path: str
+    query: dict[str, str]
+    headers: dict[str, str]
+    body: bytes
+
+    def json(self) -> dict:
+        """ Returns the body parsed as a JSON object """
+        try:
+            data = json.loads(self.body or b'{}')
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'The body is not valid JSON') from e
+        if not isinstance(data, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'The body must be a JSON object')
+        return data
+
+
+def entry_to_json(entry: LoginEntry, with_password: bool) -> dict:
+    """ Returns the API representation of an entry """
+    data = asdict(entry)
+    if not with_password:
+        del data['password']
+    return data
+
+
+class ApiServer:
+    """
+    Answers HTTP/1.1 requests with JSON. A client logs in once with POST /session and
+    sends the returned token as 'Authorization: Bearer <token>'; sessions of a user share
+    the vault unlocked at login, so later requests don't derive the key again.
+    Connections are kept alive between requests.
+
+        POST   /session               {"username", "password"} -> {"token", "expires_in"}
+        DELETE /session               ends the session
+        GET    /entries               ?query=&group=&sort=&desc=&offset=&limit=, no passwords
+        GET    /entries/<id>          one entry with its password
+        POST   /entries/get_many      {"ids": [...]} -> entries with passwords
+    """
+    def __init__(self, user_manager: UserManager, log: AuditLog,
+                 open_vault: VaultOpener | None = None,
+                 session_ttl: float = API_SESSION_TTL, idle_timeout: float = API_IDLE_TIMEOUT):
+        self.__user_manager = user_manager
+        self.__logger = log
+        self.__open_vault = open_vault or self.__default_open_vault
+        self.__session_ttl = session_ttl
+        self.__idle_timeout = idle_timeout
+        self.__sessions: dict[str, Session] = {}
+        self.__vaults: dict[str, PasswordManager] = {}
+        self.__login_lock = asyncio.Lock()
+
+    async def start(self, host: str, port: int) -> asyncio.Server:
+        """ Starts listening on a TCP address """
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def start_unix(self, path: Path) -> asyncio.Server:
+        """ Starts listening on a Unix socket, accessible only to the current user """
+        # The socket is created with the right mode, so there's no window where others can connect
+        umask = os.umask(0o177)
+        try:
+            return await asyncio.start_unix_server(self.handle_connection, str(path))
+        finally:
+            os.umask(umask)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """ Serves the requests of one connection until the client closes it or goes idle """
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.__read_request(reader), self.__idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except HttpError as e:
+                    self.__write_response(writer, e.status, {'error': str(e)}, False)
+                    await writer.drain()
+                    return
+                if request is None:
+                    return
+
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                try:
+                    status, payload = await self.dispatch(request)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    # The details stay in the audit log, clients only learn that it failed
+                    self.__logger.log(
+                        f'API request {request.method} {request.path} failed: {e!r}', Level.ERROR)
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {'error': 'Internal server error'}
+
+                self.__write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def dispatch(self, request: Request) -> tuple[HTTPStatus, dict]:
+        """ Routes a request, returns the status and the JSON payload of the response """
+        if request.path == '/session':
+            if request.method == 'POST':
+                return await self.__login(request)
+            if request.method == 'DELETE':
+                return self.__logout(request)
+
+        if request.path == '/entries/get_many' and request.method == 'POST':
+            return self.__get_many(request)
+        if request.path == '/entries' and request.method == 'GET':
+            return self.__list(request)
+        if request.path.startswith('/entries/') and request.method == 'GET':
+            return self.__get(request, request.path.removeprefix('/entries/'))
+
+        raise HttpError(HTTPStatus.NOT_FOUND, f'No route for {request.method} {request.path}')
+
+    async def __login(self, request: Request) -> tuple[HTTPStatus, dict]:
+        data = request.json()
+        username, password = data.get('username'), data.get('password')
+        if not isinstance(username, str) or not isinstance(password, str):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'username and password are required')
+
+        async with self.__login_lock:
+            try:
+                key = await asyncio.to_thread(self.__user_manager.login_user, username, password)
+            except UserInvalidLoginException as e:
+                raise HttpError(HTTPStatus.UNAUTHORIZED, 'Invalid username or password') from e
+
+            if username not in self.__vaults:
+                self.__vaults[username] = await asyncio.to_thread(self.__open_vault, username, key)
+
+        self.__expire_sessions()
+        token = secrets.token_urlsafe(32)
+        self.__sessions[token] = Session(username, time.monotonic() + self.__session_ttl)
+
+        self.__logger.log_with_user('API session opened', username, category=Category.SECURITY)
+        return HTTPStatus.CREATED, {'token': token, 'expires_in': self.__session_ttl}
+
+    def __logout(self, request: Request) -> tuple[HTTPStatus, dict]:
+        token, session = self.__session(request)
+        del self.__sessions[token]
+        self.__release_vault(session.username)
+
+        self.__logger.log_with_user(
+            'API session closed', session.username, category=Category.SECURITY)
+        return HTTPStatus.OK, {}
+
+    def __list(self, request: Request) -> tuple[HTTPStatus, dict]:
+        vault = self.__vault(request)
+        query = request.query
+        try:
+            offset = int(query.get('offset', 0))
+            limit = int(query['limit']) if 'limit' in query else None
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'offset and limit must be integers') from e
+
+        if query.get('query'):
+            entries = vault.fuzzy_search(query['query'], limit or 20)
+        else:
+            try:
+                entries = vault.list_passwords(
+                    sort_by=query.get('sort'), descending=query.get('desc') == '1',
+                    offset=offset, limit=limit, group=query.get('group'))
+            except ValueError as e:
+                raise HttpError(HTTPStatus.BAD_REQUEST, str(e)) from e
+
+        return HTTPStatus.OK, {'entries': [entry_to_json(e, False) for e in entries]}
+
+    def __get(self, request: Request, entry_id: str) -> tuple[HTTPStatus, dict]:
+        entries = self.__vault(request).fetch_entries([unquote(entry_id)])
+        if not entries:
+            raise HttpError(HTTPStatus.NOT_FOUND, 'No such entry')
+        return HTTPStatus.OK, entry_to_json(entries[0], True)
+
+    def __get_many(self, request: Request) -> tuple[HTTPStatus, dict]:
+        vault = self.__vault(request)
+        entry_ids = request.json().get('ids')
+        if not isinstance(entry_ids, list) or not all(isinstance(e, str) for e in entry_ids):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'ids must be a list of entry ids')
+        if len(entry_ids) > MAX_BATCH:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f'At most {MAX_BATCH} ids per request')
+
+        entries = vault.fetch_entries(entry_ids)
+        return HTTPStatus.OK, {'entries': [entry_to_json(e, True) for e in entries]}
+
+    def __session(self, request: Request) -> tuple[str, Session]:
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        session = self.__sessions.get(token) if scheme.lower() == 'bearer' else None
+        if session is not None and session.expires_at <= time.monotonic():
+            del self.__sessions[token]
+            self.__release_vault(session.username)
+            session = None
+        if session is None:
+            raise HttpError(HTTPStatus.UNAUTHORIZED, 'A valid session token is required')
+        return token, session
+
+    def __vault(self, request: Request) -> PasswordManager:
+        _, session = self.__session(request)
+        return self.__vaults[session.username]
+
+    def __expire_sessions(self) -> None:
+        now = time.monotonic()
+        for token, session in list(self.__sessions.items()):
+            if session.expires_at <= now:
+                del self.__sessions[token]
+                self.__release_vault(session.username)
+
+    def __release_vault(self, username: str) -> None:
+        if all(s.username != username for s in self.__sessions.values()):
+            self.__vaults.pop(username, None)
+
+    def __default_open_vault(self, username: str, key: bytes) -> PasswordManager:
+        return PasswordManager(username, key, self.__logger,
+                               encrypt_metadata=ENCRYPT_METADATA, vault_format=VAULT_FORMAT)
+
+    async def __read_request(self, reader: asyncio.StreamReader) -> Request | None:
+        line = await self.__readline(reader, HTTPStatus.BAD_REQUEST, 'The request line is too long')
+        if not line:
+            return None
+
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Malformed request line') from e
+
+        headers = {}
+        while True:
+            line = await self.__readline(
+                reader, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'A header is too long')
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'Too many headers')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length') from e
+        if length < 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+        if length > MAX_BODY:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'The body is too large')
+        body = await reader.readexactly(length) if length else b''
+
+        url = urlsplit(target)
+        return Request(method.upper(), url.path.rstrip('/') or '/',
+                       dict(parse_qsl(url.query)), headers, body)
+
+    @staticmethod
+    async def __readline(reader: asyncio.StreamReader, status: HTTPStatus, message: str) -> bytes:
+        # readline() raises ValueError for lines over the limit of the stream
+        try:
+            return await reader.readline()
+        except ValueError as e:
+            raise HttpError(status, message) from e
+
+    def __write_response(self, writer: asyncio.StreamWriter, status: HTTPStatus,
+                         payload: dict, keep_alive: bool) -> None:
+        body = json.dumps(payload).encode()
+        writer.write(
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1')
+            + body)
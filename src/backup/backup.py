@@ -0,0 +1,298 @@
+"""
+Point-in-time snapshots of the application data, stored as content-defined,
+deduplicated chunks so that every backup after the first only writes what changed
+"""
+import json
+import os
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from src.common.config import TIME_FORMAT
+
+MIN_CHUNK = 2 * 1024
+AVG_CHUNK = 8 * 1024
+MAX_CHUNK = 64 * 1024
+# Normalized chunking: a stricter mask before the average size and a looser one after
+# it keeps chunk sizes close to AVG_CHUNK
+MASK_SMALL = (1 << 15) - 1
+MASK_LARGE = (1 << 11) - 1
+GEAR = tuple(int.from_bytes(sha256(bytes([i])).digest()[:8], 'big') for i in range(256))
+MASK_64 = (1 << 64) - 1
+READ_SIZE = 1 << 20
+
+
+def chunk_boundaries(data: bytes) -> Iterator[tuple[int, int]]:
+    """
+    Yields (start, end) of the chunks of data. Boundaries are placed where a rolling
+    gear hash of the content matches a mask, so an insertion only changes the chunks
+    around it instead of shifting every chunk after it.
+    """
+    view = memoryview(data)
+    start = 0
+    while start < len(view):
+        end = _cut(view, start)
+        yield start, end
+        start = end
+
+
+def read_chunks(file: BinaryIO) -> Iterator[bytes]:
+    """
+    Yields the chunks of a file as chunk_boundaries would cut its whole content,
+    reading it READ_SIZE bytes at a time
+    """
+    buffer = bytearray()
+    start = 0
+    eof = False
+    while True:
+        if not eof and len(buffer) - start < MAX_CHUNK:
+            del buffer[:start]
+            start = 0
+            block = file.read(READ_SIZE)
+            eof = not block
+            buffer += block
+            continue
+        if start >= len(buffer):
+            return
+
+        with memoryview(buffer) as view:
+            end = _cut(view, start)
+        yield bytes(buffer[start:end])
+        start = end
+
+
+def _cut(view: memoryview, start: int) -> int:
+    """
+    Returns the end of the chunk starting at start. view must hold MAX_CHUNK bytes
+    after start or end with the content
+    """
+    size = len(view)
+    if size - start <= MIN_CHUNK:
+        return size
+
+    end = min(start + MAX_CHUNK, size)
+    normal = min(start + AVG_CHUNK, end)
+    gear = GEAR
+    h = 0
+    i = start + MIN_CHUNK
+    for byte in view[i:normal]:
+        h = ((h << 1) + gear[byte]) & MASK_64
+        i += 1
+        if not h & MASK_SMALL:
+            return i
+    for byte in view[i:end]:
+        h = ((h << 1) + gear[byte]) & MASK_64
+        i += 1
+        if not h & MASK_LARGE:
+            return i
+    return end
+
+
+@dataclass
+class FileRecord:
+    """
+    FileRecord describes one file of a snapshot: its stat at backup time, the hash of
+    the whole content and the hashes of its chunks in order
+    """
+    size: int
+    mtime_ns: int
+    digest: str
+    chunks: list[str]
+
+
+@dataclass
+class Snapshot:
+    """
+    Snapshot is the catalog entry of one backup
+    """
+    id: str
+    sequence: int
+    created_at: str
+    files: dict[str, FileRecord] = field(default_factory=dict)
+    label: str = ''
+
+    @property
+    def size(self) -> int:
+        """ Total size of the files in the snapshot """
+        return sum(f.size for f in self.files.values())
+
+
+@dataclass
+class BackupResult:
+    """
+    BackupResult summarizes the work done by one backup
+    """
+    snapshot: Snapshot
+    files_chunked: int
+    chunks_written: int
+    bytes_written: int
+
+
+class BackupRepository:
+    """
+    A backup repository holds compressed chunks addressed by their SHA-256 under
+    chunks/ and one JSON catalog file per snapshot under snapshots/. Files whose size
+    and modification time match the previous snapshot are not read again, and chunks
+    already in the repository are never written twice.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.__chunks = path / 'chunks'
+        self.__snapshots = path / 'snapshots'
+        self.__chunks.mkdir(parents=True, exist_ok=True)
+        self.__snapshots.mkdir(parents=True, exist_ok=True)
+
+    def snapshots(self) -> list[Snapshot]:
+        """ Returns the catalog, oldest snapshot first """
+        snapshots = [self.__read_snapshot(p) for p in self.__snapshots.glob('*.json')]
+        return sorted(snapshots, key=lambda s: s.sequence)
+
+    def snapshot(self, snapshot_id: str) -> Snapshot:
+        """ Returns the snapshot with the given id or unique id prefix """
+        matches = [p for p in self.__snapshots.glob(f'{snapshot_id}*.json')]
+        if len(matches) != 1:
+            raise KeyError(f'No unique snapshot matches {snapshot_id}')
+        return self.__read_snapshot(matches[0])
+
+    def backup(self, source: Path, label: str = '', exclude: tuple[Path, ...] = ()) -> BackupResult:
+        """ Takes a snapshot of every file under source """
+        previous = self.snapshots()
+        known = previous[-1].files if previous else {}
+        excluded = [p.resolve() for p in (self.path, *exclude)]
+
+        snapshot = Snapshot(str(uuid.uuid4()), previous[-1].sequence + 1 if previous else 1,
+                            datetime.now().strftime(TIME_FORMAT), label=label)
+        files_chunked = chunks_written = bytes_written = 0
+
+        for file in sorted(source.rglob('*')):
+            if not file.is_file() or file.suffix == '.tmp' \
+                    or any(file.resolve().is_relative_to(p) for p in excluded):
+                continue
+
+            name = file.relative_to(source).as_posix()
+            stat = file.stat()
+            record = known.get(name)
+            if record is not None and (record.size, record.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                snapshot.files[name] = record
+                continue
+
+            chunks = []
+            content = sha256()
+            size = 0
+            with file.open('rb') as f:
+                for chunk in read_chunks(f):
+                    content.update(chunk)
+                    size += len(chunk)
+                    digest = sha256(chunk).hexdigest()
+                    chunks.append(digest)
+                    written = self.__put_chunk(digest, chunk)
+                    if written:
+                        chunks_written += 1
+                        bytes_written += written
+
+            snapshot.files[name] = FileRecord(size, stat.st_mtime_ns, content.hexdigest(), chunks)
+            files_chunked += 1
+
+        self.__write_snapshot(snapshot)
+        return BackupResult(snapshot, files_chunked, chunks_written, bytes_written)
+
+    def restore(self, snapshot_id: str, target: Path, paths: list[str] | None = None) -> int:
+        """
+        Restores the files of a snapshot into target, returns the number of files written.
+        Files already identical to the snapshot are left untouched.
+        """
+        snapshot = self.snapshot(snapshot_id)
+        restored = 0
+        for name, record in snapshot.files.items():
+            if paths is not None and name not in paths:
+                continue
+
+            file = target / name
+            if file.exists() and file.stat().st_size == record.size and _file_digest(file) == record.digest:
+                continue
+
+            file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = file.with_name(file.name + '.tmp')
+            content = sha256()
+            with tmp.open('wb') as out:
+                for digest in record.chunks:
+                    chunk = self.__get_chunk(digest)
+                    content.update(chunk)
+                    out.write(chunk)
+
+            if content.hexdigest() != record.digest:
+                tmp.unlink()
+                raise ValueError(f'Restored content of {name} does not match the snapshot')
+
+            tmp.replace(file)
+            os.utime(file, ns=(record.mtime_ns, record.mtime_ns))
+            restored += 1
+
+        return restored
+
+    def delete(self, snapshot_id: str) -> int:
+        """ Removes a snapshot from the catalog, returns the number of chunks freed """
+        snapshot = self.snapshot(snapshot_id)
+        (self.__snapshots / f'{snapshot.id}.json').unlink()
+        return self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        """ Deletes chunks that no snapshot refers to, returns how many were deleted """
+        referenced = {d for s in self.snapshots() for f in s.files.values() for d in f.chunks}
+        removed = 0
+        for chunk in self.__chunks.glob('*/*'):
+            if chunk.name not in referenced:
+                chunk.unlink()
+                removed += 1
+        return removed
+
+    def __chunk_path(self, digest: str) -> Path:
+        return self.__chunks / digest[:2] / digest
+
+    def __put_chunk(self, digest: str, chunk: bytes) -> int:
+        path = self.__chunk_path(digest)
+        if path.exists():
+            return 0
+
+        path.parent.mkdir(exist_ok=True)
+        compressed = zlib.compress(chunk)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(compressed)
+        tmp.replace(path)
+        return len(compressed)
+
+    def __get_chunk(self, digest: str) -> bytes:
+        chunk = zlib.decompress(self.__chunk_path(digest).read_bytes())
+        if sha256(chunk).hexdigest() != digest:
+            raise ValueError(f'Chunk {digest} is corrupted')
+        return chunk
+
+    def __read_snapshot(self, path: Path) -> Snapshot:
+        data = json.loads(path.read_text(encoding='utf-8'))
+        files = {name: FileRecord(**record) for name, record in data.pop('files').items()}
+        return Snapshot(files=files, **data)
+
+    def __write_snapshot(self, snapshot: Snapshot) -> None:
+        data = {
+            'id': snapshot.id,
+            'sequence': snapshot.sequence,
+            'created_at': snapshot.created_at,
+            'label': snapshot.label,
+            'files': {name: vars(record) for name, record in snapshot.files.items()},
+        }
+        path = self.__snapshots / f'{snapshot.id}.json'
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(json.dumps(data), encoding='utf-8')
+        tmp.replace(path)
+
+
+def _file_digest(path: Path) -> str:
+    digest = sha256()
+    with path.open('rb') as file:
+        while block := file.read(READ_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
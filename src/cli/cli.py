@@ -0,0 +1,559 @@
+"""Command line interface for maintenance tasks that don't need the TUI"""
+
+import argparse
+import asyncio
+import getpass
+import time
+from pathlib import Path
+
+from src.api.server import ApiServer
+from src.backup.backup import BackupRepository
+from src.common.config import API_HOST, API_PORT, APP_DATA_DIR, BACKUP_DIR, BREACH_INDEX_PATH, \
+    ENCRYPT_METADATA, KDF_MAX_MEMORY, KDF_UNLOCK_SECONDS, VAULT_FORMAT
+from src.common.exceptions import CorruptedVaultException, GroupNameTakenException, \
+    InvalidAttachmentException, InvalidEntryException, UserInvalidLoginException, \
+    VaultAccessException
+from src.logging.chain import verify_log
+from src.logging.logging import AuditLog
+from src.manager.keyring import rewrap_member, drop_previous_wraps
+from src.manager.password_manager import PasswordManager
+from src.manager.sort_index import SORT_KEYS
+from src.security.breach import BreachIndex, build_breach_index
+from src.security.kdf import calibrate, derive
+from src.sync.sync import VaultReplica, DirectoryTransport
+from src.user.user_manager import UserManager
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the argument parser with all supported commands"""
+    parser = argparse.ArgumentParser(prog='main.py', description='Password manager tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    breach_import = commands.add_parser(
+        'breach-import', help='Build the offline breach index from a SHA-1 dump')
+    breach_import.add_argument('dump', type=Path, help='HIBP style file of HASH:COUNT lines')
+    breach_import.add_argument('--index', type=Path, default=BREACH_INDEX_PATH)
+    breach_import.set_defaults(handler=_breach_import)
+
+    audit = commands.add_parser('audit', help='Report weak, reused and breached passwords')
+    audit.add_argument('username')
+    audit.add_argument('--index', type=Path, default=BREACH_INDEX_PATH)
+    audit.add_argument('--vault', default=None, help='A shared vault the user is a member of')
+    audit.set_defaults(handler=_audit)
+
+    listing = commands.add_parser('list', help='Print a page of vault entries')
+    listing.add_argument('username')
+    listing.add_argument('--sort', choices=SORT_KEYS, default=None)
+    listing.add_argument('--desc', action='store_true')
+    listing.add_argument('--group', default=None)
+    listing.add_argument('--offset', type=int, default=0)
+    listing.add_argument('--limit', type=int, default=50)
+    listing.add_argument('--vault', default=None, help='A shared vault the user is a member of')
+    listing.set_defaults(handler=_list)
+
+    rename_group = commands.add_parser(
+        'rename-group', help='Rename a group, moving the entries of the user\'s vault to it')
+    rename_group.add_argument('username')
+    rename_group.add_argument('group')
+    rename_group.add_argument('new_name')
+    rename_group.set_defaults(handler=_rename_group)
+
+    delete_group = commands.add_parser(
+        'delete-group', help='Delete a group, clearing it on the entries of the user\'s vault')
+    delete_group.add_argument('username')
+    delete_group.add_argument('group')
+    delete_group.set_defaults(handler=_delete_group)
+
+    passwd = commands.add_parser(
+        'passwd', help='Change a master password, rewrapping the keys of the user\'s vaults')
+    passwd.add_argument('username')
+    passwd.set_defaults(handler=_passwd)
+
+    share = commands.add_parser('share', help='Let another user open a vault')
+    share.add_argument('username', help='A member of the vault')
+    share.add_argument('member', help='The user to share it with')
+    share.add_argument('--vault', default=None, help='Vault to share, the user\'s own by default')
+    share.set_defaults(handler=_share)
+
+    unshare = commands.add_parser('unshare', help='Remove a user from a vault')
+    unshare.add_argument('username', help='A member of the vault')
+    unshare.add_argument('member', help='The user to remove')
+    unshare.add_argument('--vault', default=None, help='Vault to change, the user\'s own by default')
+    unshare.set_defaults(handler=_unshare)
+
+    attach = commands.add_parser('attach', help='Attach an encrypted file to an entry')
+    attach.add_argument('username')
+    attach.add_argument('entry_id')
+    attach.add_argument('file', type=Path)
+    attach.add_argument('--vault', default=None, help='A shared vault the user is a member of')
+    attach.set_defaults(handler=_attach)
+
+    attachments = commands.add_parser('attachments', help='List the files and notes of an entry')
+    attachments.add_argument('username')
+    attachments.add_argument('entry_id')
+    attachments.add_argument('--vault', default=None, help='A shared vault the user is a member of')
+    attachments.set_defaults(handler=_attachments)
+
+    extract = commands.add_parser('extract', help='Decrypt an attachment to a file')
+    extract.add_argument('username')
+    extract.add_argument('attachment_id')
+    extract.add_argument('target', type=Path)
+    extract.add_argument('--vault', default=None, help='A shared vault the user is a member of')
+    extract.set_defaults(handler=_extract)
+
+    rotation = commands.add_parser('rotation', help='Report passwords due for rotation')
+    rotation.add_argument('username')
+    rotation.add_argument('--vault', default=None, help='A shared vault the user is a member of')
+    rotation.set_defaults(handler=_rotation)
+
+    dedupe = commands.add_parser(
+        'dedupe', help='Merge entries for the same site and username into the newest one')
+    dedupe.add_argument('username')
+    dedupe.add_argument('--dry-run', action='store_true', help='Only list the duplicates')
+    dedupe.add_argument('--vault', default=None, help='A shared vault the user is a member of')
+    dedupe.set_defaults(handler=_dedupe)
+
+    migrate = commands.add_parser(
+        'migrate-vault', help='Convert a JSON vault to the binary format')
+    migrate.add_argument('username')
+    migrate.set_defaults(handler=_migrate_vault)
+
+    sync = commands.add_parser(
+        'sync', help='Exchange changes with a peer serving the shared directory')
+    sync.add_argument('username')
+    sync.add_argument('directory', type=Path)
+    sync.set_defaults(handler=_sync)
+
+    sync_serve = commands.add_parser(
+        'sync-serve', help='Answer sync requests dropped into the shared directory')
+    sync_serve.add_argument('username')
+    sync_serve.add_argument('directory', type=Path)
+    sync_serve.add_argument('--interval', type=float, default=1.0)
+    sync_serve.set_defaults(handler=_sync_serve)
+
+    calibrate = commands.add_parser(
+        'kdf-calibrate', help='Show the Scrypt cost this host reaches within an unlock budget')
+    calibrate.add_argument('--seconds', type=float, default=KDF_UNLOCK_SECONDS)
+    calibrate.add_argument('--max-memory', type=int, default=KDF_MAX_MEMORY)
+    calibrate.set_defaults(handler=_kdf_calibrate)
+
+    serve_api = commands.add_parser(
+        'serve-api', help='Serve vault entries to scripts over a local HTTP API')
+    serve_api.add_argument('--host', default=API_HOST)
+    serve_api.add_argument('--port', type=int, default=API_PORT)
+    serve_api.add_argument('--socket', type=Path, default=None,
+                           help='Listen on this Unix socket instead of TCP')
+    serve_api.set_defaults(handler=_serve_api)
+
+    verify_log = commands.add_parser(
+        'verify-log', help='Check the audit log chain from the last verified checkpoint')
+    verify_log.add_argument('--full', action='store_true', help='Check the whole log')
+    verify_log.set_defaults(handler=_verify_log)
+
+    backup = commands.add_parser('backup', help='Take a deduplicated snapshot of all vaults and users')
+    backup.add_argument('--label', default='')
+    backup.add_argument('--repository', type=Path, default=BACKUP_DIR)
+    backup.set_defaults(handler=_backup)
+
+    snapshots = commands.add_parser('snapshots', help='List the snapshots in the backup repository')
+    snapshots.add_argument('--repository', type=Path, default=BACKUP_DIR)
+    snapshots.set_defaults(handler=_snapshots)
+
+    restore = commands.add_parser('restore', help='Restore the data directory from a snapshot')
+    restore.add_argument('snapshot', help='Snapshot id or a unique prefix of it')
+    restore.add_argument('paths', nargs='*', help='Only restore these files')
+    restore.add_argument('--target', type=Path, default=APP_DATA_DIR)
+    restore.add_argument('--repository', type=Path, default=BACKUP_DIR)
+    restore.set_defaults(handler=_restore)
+
+    return parser
+
+
+def main(argv: list[str], log: AuditLog) -> int:
+    """Runs the command given in argv, returns the process exit code"""
+    args = build_parser().parse_args(argv)
+    return args.handler(args, log)
+
+
+def open_vault(username: str, log: AuditLog, vault_format: str = VAULT_FORMAT,
+               vault: str | None = None) -> PasswordManager | None:
+    """
+    Prompts for the master password and opens the vault of the given user,
+    or a shared vault they are a member of
+    """
+    usr_mgr = user_manager(log)
+    try:
+        master_key = usr_mgr.login_user(username, getpass.getpass('Password: '))
+        return PasswordManager(username, master_key, log, encrypt_metadata=ENCRYPT_METADATA,
+                               vault_format=vault_format, vault=vault)
+    except UserInvalidLoginException:
+        print('Invalid username or password')
+    except VaultAccessException:
+        print(f'{username} is not a member of vault {vault}')
+    return None
+
+
+def user_manager(log: AuditLog) -> UserManager:
+    """Opens the user store, upgrading master keys on login across the stored vaults"""
+    return UserManager(log, APP_DATA_DIR / 'users.json', vault_dir=APP_DATA_DIR / 'user_passwords')
+
+
+def _breach_import(args: argparse.Namespace, log: AuditLog) -> int:
+    with args.dump.open('r', encoding='utf-8') as dump:
+        count = build_breach_index(dump, args.index)
+
+    log.log(f'Imported breach index with {count} hashes')
+    print(f'Indexed {count} hashes into {args.index}')
+    return 0
+
+
+def _audit(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    report = pwd_manager.audit()
+    breached = []
+    if args.index.exists():
+        with BreachIndex(args.index) as index:
+            breached = pwd_manager.check_breaches(index)
+
+    entries = {e.id: e for e in pwd_manager.list_passwords()}
+
+    def describe(entry_id: str) -> str:
+        return f'{entries[entry_id].address} ({entries[entry_id].username})'
+
+    for entry_id in report.weak:
+        print(f'weak: {describe(entry_id)}, score {report.scores[entry_id].score}/4')
+    for entry_ids in report.reused:
+        print('reused: ' + ', '.join(describe(e) for e in entry_ids))
+    for entry_id in breached:
+        print(f'breached: {describe(entry_id)}')
+
+    print(f'{len(report.weak)} weak, {len(report.reused)} reused, {len(breached)} breached')
+    return 1 if report.weak or report.reused or breached else 0
+
+
+def _list(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    entries = pwd_manager.list_passwords(
+        sort_by=args.sort, descending=args.desc, offset=args.offset,
+        limit=args.limit, group=args.group)
+    for entry in entries:
+        print(f'{entry.address:<40} {entry.username:<30} {entry.updated_at}  {entry.group}')
+
+    total = pwd_manager.count_entries(args.group)
+    print(f'{args.offset + 1 if entries else 0}-{args.offset + len(entries)} of {total}')
+    return 0
+
+
+def _rename_group(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log)
+    if pwd_manager is None:
+        return 1
+
+    try:
+        user_manager(log).rename_group(
+            args.username, args.group, args.new_name, pwd_manager.rename_group)
+    except ValueError as e:
+        print(e)
+        return 1
+    except GroupNameTakenException:
+        print(f'{args.username} already has a group {args.new_name}')
+        return 1
+
+    print(f'Renamed group {args.group} to {args.new_name} '
+          f'({pwd_manager.count_by_group(args.new_name)} entries)')
+    return 0
+
+
+def _delete_group(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log)
+    if pwd_manager is None:
+        return 1
+
+    try:
+        user_manager(log).delete_group(args.username, args.group, pwd_manager.delete_group)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    print(f'Deleted group {args.group}')
+    return 0
+
+
+def _passwd(args: argparse.Namespace, log: AuditLog) -> int:
+    old_password = getpass.getpass('Current password: ')
+    new_password = getpass.getpass('New password: ')
+    if new_password != getpass.getpass('Repeat new password: '):
+        print('Passwords do not match')
+        return 1
+
+    vault_dir = APP_DATA_DIR / 'user_passwords'
+
+    def rekey(old_key: bytes, new_key: bytes) -> None:
+        # Opening the own vault creates its keyring if it predates keyrings
+        PasswordManager(args.username, old_key, log,
+                        encrypt_metadata=ENCRYPT_METADATA, vault_format=VAULT_FORMAT)
+        rewrap_member(vault_dir, args.username, old_key, new_key)
+
+    usr_mgr = user_manager(log)
+    try:
+        usr_mgr.change_password(args.username, old_password, new_password, rekey)
+    except UserInvalidLoginException:
+        print('Invalid username or password')
+        return 1
+    drop_previous_wraps(vault_dir, args.username)
+
+    print('Master password changed')
+    return 0
+
+
+def _share(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    usr_mgr = user_manager(log)
+    try:
+        member_key = usr_mgr.login_user(args.member, getpass.getpass(f'Password of {args.member}: '))
+    except UserInvalidLoginException:
+        print('Invalid username or password')
+        return 1
+
+    pwd_manager.add_member(args.member, member_key)
+    print(f'Members: {", ".join(pwd_manager.members())}')
+    return 0
+
+
+def _unshare(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    try:
+        pwd_manager.remove_member(args.member)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    print(f'Members: {", ".join(pwd_manager.members())}')
+    return 0
+
+
+def _attach(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    try:
+        with args.file.open('rb') as source:
+            attachment = pwd_manager.attach_file(args.entry_id, args.file.name, source)
+    except InvalidEntryException:
+        print(f'No entry {args.entry_id}')
+        return 1
+
+    print(f'Attached {attachment.name} ({attachment.size} bytes) as {attachment.id}')
+    return 0
+
+
+def _attachments(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    try:
+        attachments = pwd_manager.list_attachments(args.entry_id)
+    except InvalidEntryException:
+        print(f'No entry {args.entry_id}')
+        return 1
+
+    for attachment in attachments:
+        print(f'{attachment.id}  {attachment.kind:<4} {attachment.size:>10}  '
+              f'{attachment.created_at}  {attachment.name}')
+    print(f'{len(attachments)} attachments')
+    return 0
+
+
+def _extract(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    try:
+        with args.target.open('xb') as target:
+            size = pwd_manager.read_attachment(args.attachment_id, target)
+    except FileExistsError:
+        print(f'{args.target} already exists')
+        return 1
+    except InvalidAttachmentException:
+        args.target.unlink()
+        print(f'No attachment {args.attachment_id}')
+        return 1
+    except CorruptedVaultException as e:
+        args.target.unlink()
+        print(e)
+        return 1
+
+    print(f'Wrote {size} bytes to {args.target}')
+    return 0
+
+
+def _rotation(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    due = pwd_manager.rotation_due()
+    for due_at, entry in due:
+        print(f'due since {due_at}: {entry.address} ({entry.username}), '
+              f'every {entry.max_age_days} days')
+
+    upcoming = pwd_manager.next_rotation()
+    if not due and upcoming is not None:
+        print(f'next rotation on {upcoming[0]}: {upcoming[1].address} ({upcoming[1].username})')
+
+    print(f'{len(due)} passwords due for rotation')
+    return 1 if due else 0
+
+
+def _dedupe(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault=args.vault)
+    if pwd_manager is None:
+        return 1
+
+    groups = pwd_manager.duplicate_groups()
+    for group in groups:
+        print(f'{group[0].address} ({group[0].username}): {len(group)} entries')
+
+    if args.dry_run or not groups:
+        print(f'{len(groups)} sets of duplicates')
+        return 0
+
+    merged = pwd_manager.merge_duplicates()
+    print(f'Merged {sum(map(len, merged.values()))} entries into {len(merged)}')
+    return 0
+
+
+def _migrate_vault(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log, vault_format='binary')
+    if pwd_manager is None:
+        return 1
+
+    print(f'Vault of {args.username} uses the binary format '
+          f'({len(pwd_manager.list_passwords())} entries)')
+    return 0
+
+
+def _replica(pwd_manager: PasswordManager, username: str) -> VaultReplica:
+    return VaultReplica(pwd_manager, APP_DATA_DIR / 'user_passwords' / f'{username}.sync.json')
+
+
+def _sync(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log)
+    if pwd_manager is None:
+        return 1
+
+    result = _replica(pwd_manager, args.username).sync(DirectoryTransport(args.directory))
+
+    log.log_with_user(f'Synced with replica {result.peer}', args.username)
+    print(f'Synced with {result.peer}: {result.received} received, {result.sent} sent, '
+          f'{result.conflicts} conflicts')
+    return 0
+
+
+def _sync_serve(args: argparse.Namespace, log: AuditLog) -> int:
+    pwd_manager = open_vault(args.username, log)
+    if pwd_manager is None:
+        return 1
+
+    replica = _replica(pwd_manager, args.username)
+    transport = DirectoryTransport(args.directory)
+    print(f'Serving sync requests in {args.directory}, Ctrl+C to stop')
+    try:
+        while True:
+            transport.serve_pending(replica.handle)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+def _kdf_calibrate(args: argparse.Namespace, log: AuditLog) -> int:
+    params = calibrate(args.seconds / 2, args.max_memory)
+    start = time.perf_counter()
+    derive('calibration', b'calibration-salt', params)
+    elapsed = time.perf_counter() - start
+
+    print(f'n=2**{params.n.bit_length() - 1} r={params.r} p={params.p}: '
+          f'{params.memory // (1024 * 1024)} MiB, {elapsed * 1000:.0f} ms per derivation, '
+          f'about {elapsed * 2000:.0f} ms per unlock')
+    return 0
+
+
+def _serve_api(args: argparse.Namespace, log: AuditLog) -> int:
+    server = ApiServer(user_manager(log), log)
+
+    async def serve() -> None:
+        if args.socket is not None:
+            listener = await server.start_unix(args.socket)
+            print(f'Serving the API on {args.socket}, Ctrl+C to stop')
+        else:
+            listener = await server.start(args.host, args.port)
+            print(f'Serving the API on http://{args.host}:{args.port}, Ctrl+C to stop')
+        async with listener:
+            await listener.serve_forever()
+
+    log.log('API server started')
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _verify_log(args: argparse.Namespace, log: AuditLog) -> int:
+    result = verify_log(APP_DATA_DIR / 'trail.log', args.full)
+    print(f'Checked {result.records} records from byte {result.start_offset}, '
+          f'last good checkpoint after record {result.checkpoint}')
+    if not result.ok:
+        print(f'Tampering found: {result.error}')
+        return 1
+
+    print('The audit log is intact')
+    return 0
+
+
+def _backup(args: argparse.Namespace, log: AuditLog) -> int:
+    # The breach index and the metadata caches of vaults are rebuilt when missing
+    vault_dir = APP_DATA_DIR / 'user_passwords'
+    exclude = (BREACH_INDEX_PATH, *vault_dir.glob('*.index'), *vault_dir.glob('*.rotation'))
+    result = BackupRepository(args.repository).backup(APP_DATA_DIR, args.label, exclude)
+
+    log.log(f'Created snapshot {result.snapshot.id}')
+    print(f'Snapshot {result.snapshot.id}: {len(result.snapshot.files)} files, '
+          f'{result.files_chunked} changed, {result.chunks_written} new chunks '
+          f'({result.bytes_written} bytes written)')
+    return 0
+
+
+def _snapshots(args: argparse.Namespace, log: AuditLog) -> int:
+    for snapshot in BackupRepository(args.repository).snapshots():
+        print(f'{snapshot.id[:8]}  {snapshot.created_at}  {len(snapshot.files):>5} files  '
+              f'{snapshot.size:>12} bytes  {snapshot.label}')
+    return 0
+
+
+def _restore(args: argparse.Namespace, log: AuditLog) -> int:
+    repository = BackupRepository(args.repository)
+    try:
+        restored = repository.restore(args.snapshot, args.target, args.paths or None)
+    except KeyError as e:
+        print(e.args[0])
+        return 1
+
+    log.log(f'Restored {restored} files from snapshot {args.snapshot}')
+    print(f'Restored {restored} files into {args.target}')
+    return 0
@@ -0,0 +1,121 @@
+"""
+Clipboard access on a background thread, with automatic clearing of copied secrets
+"""
+import hashlib
+import queue
+import threading
+import time
+from contextlib import suppress
+from concurrent.futures import Future
+from typing import Callable
+
+import pyperclip
+
+from src.common.config import CLIPBOARD_CLEAR_SECONDS
+
+Backend = tuple[Callable[[str], None], Callable[[], str]]
+
+
+class ClipboardService:
+    """
+    Performs clipboard operations on a single worker thread, so the UI never waits for
+    the clipboard helper process. The backend is detected once and reused. A copied value
+    is cleared after clear_after seconds, unless something else was copied in the meantime.
+    Only a hash of it is kept to tell whether it is still there.
+    """
+    def __init__(self, clear_after: float | None = CLIPBOARD_CLEAR_SECONDS,
+                 backend: Backend | None = None):
+        self.clear_after = clear_after
+        self.__backend = backend
+        self.__jobs: queue.Queue[tuple[str, str | bytearray, Future]] = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__thread: threading.Thread | None = None
+        self.__owned: bytes | None = None
+        self.__clear_at: float | None = None
+
+    def copy(self, text: str | bytearray) -> Future:
+        """
+        Copies text to the clipboard in the background, the future completes once it's done.
+        UTF-8 text in a bytearray is zeroed once it has been handed to the clipboard
+        """
+        return self.__submit('copy', text)
+
+    def clear(self) -> Future:
+        """ Clears the clipboard now, if it still holds the last copied value """
+        return self.__submit('clear')
+
+    def close(self) -> None:
+        """ Clears our value from the clipboard and stops the worker """
+        with self.__lock:
+            thread = self.__thread
+        if thread is None or not thread.is_alive():
+            return
+
+        self.__submit('close')
+        thread.join()
+
+    def __submit(self, operation: str, text: str | bytearray = '') -> Future:
+        future: Future = Future()
+        with self.__lock:
+            if self.__thread is None or not self.__thread.is_alive():
+                self.__thread = threading.Thread(
+                    target=self.__run, name='clipboard', daemon=True)
+                self.__thread.start()
+            self.__jobs.put((operation, text, future))
+        return future
+
+    def __run(self) -> None:
+        while True:
+            timeout = None
+            if self.__clear_at is not None:
+                timeout = max(0.0, self.__clear_at - time.monotonic())
+
+            try:
+                operation, text, future = self.__jobs.get(timeout=timeout)
+            except queue.Empty:
+                # Nobody waits on a timed clear, a failure leaves the value in place
+                with suppress(pyperclip.PyperclipException, OSError):
+                    self.__clear_owned()
+                continue
+
+            try:
+                if operation == 'copy':
+                    self.__copy(text)
+                else:
+                    self.__clear_owned()
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+
+            if operation == 'close':
+                return
+
+    def __functions(self) -> Backend:
+        if self.__backend is None:
+            self.__backend = pyperclip.determine_clipboard()
+        return self.__backend
+
+    def __copy(self, text: str | bytearray) -> None:
+        if isinstance(text, bytearray):
+            raw, text = text, text.decode('utf-8')
+            raw[:] = bytes(len(raw))
+        copy, _ = self.__functions()
+        copy(text)
+        self.__owned = _digest(text)
+        self.__clear_at = None if self.clear_after is None else time.monotonic() + self.clear_after
+
+    def __clear_owned(self) -> None:
+        owned, self.__owned, self.__clear_at = self.__owned, None, None
+        if owned is None:
+            return
+
+        copy, paste = self.__functions()
+        if _digest(paste()) == owned:
+            copy('')
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+CLIPBOARD = ClipboardService()
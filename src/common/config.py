@@ -1,3 +1,54 @@
+import os
 from pathlib import Path
 
-APP_DATA_DIR = Path.home() / 'pwd_manager_python'
\ No newline at end of file
+APP_DATA_DIR = Path.home() / 'pwd_manager_python'
+
+# Format of the timestamps stored in vaults, histories and backup snapshots, sortable as strings
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Unlock latency budget: the login verifier and the master key derivation each get half of it.
+# Scrypt cost for new users and for upgrades on login is calibrated to it, capped by KDF_MAX_MEMORY
+KDF_UNLOCK_SECONDS = 0.5
+KDF_MAX_MEMORY = 128 * 1024 * 1024
+
+# Encrypt address, username and group of entries along with the password
+ENCRYPT_METADATA = False
+
+# Vault file format, 'json' or 'binary'. Existing JSON vaults are migrated on first unlock
+VAULT_FORMAT = 'json'
+
+# Previous values kept per entry, and for how many days (None keeps them forever)
+HISTORY_MAX_VERSIONS = 20
+HISTORY_MAX_AGE_DAYS: int | None = 365
+
+# Seconds after which a copied password is cleared from the clipboard (None keeps it)
+CLIPBOARD_CLEAR_SECONDS: float | None = 30
+
+# Local API started with `python main.py serve-api`, sessions expire after API_SESSION_TTL seconds
+API_HOST = '127.0.0.1'
+API_PORT = 8787
+API_SESSION_TTL = 15 * 60
+API_IDLE_TIMEOUT = 60
+
+# Repository of the deduplicated snapshots taken by `python main.py backup`
+BACKUP_DIR = Path.home() / 'pwd_manager_python_backups'
+
+# Index built by `python main.py breach-import`, used by the vault audit when present
+BREACH_INDEX_PATH = APP_DATA_DIR / 'breaches.idx'
+
+# Audit log policy: events below LOG_MIN_LEVEL ('DEBUG', 'INFO', 'WARNING' or 'ERROR') and of
+# the categories in LOG_DISABLED_CATEGORIES ('write', 'read', 'system') are dropped, security
+# events are always kept. Read events keep 1 of every LOG_READ_SAMPLE_EVERY and at most
+# LOG_READ_PER_SECOND per second (None for no limit)
+LOG_MIN_LEVEL = 'INFO'
+LOG_DISABLED_CATEGORIES: tuple[str, ...] = ()
+LOG_READ_SAMPLE_EVERY = 1
+LOG_READ_PER_SECOND: float | None = 20
+
+# Every line of the audit log is chained to the previous one by an HMAC, with a signed
+# checkpoint every LOG_CHECKPOINT_EVERY lines. `python main.py verify-log` checks the chain
+LOG_CHECKPOINT_EVERY = 1000
+
+# Operation metrics, enabled with PWD_MANAGER_METRICS=1 and exported from the metrics screen
+METRICS_ENABLED = os.environ.get('PWD_MANAGER_METRICS', '') == '1'
+METRICS_EXPORT_DIR = APP_DATA_DIR
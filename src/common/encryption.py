@@ -1,29 +1,130 @@
 """ Helper file for encryption related tasks"""
 import base64
+import hmac
+import os
+import struct
+import time
+from hashlib import sha256
 
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
-def password_to_fernet_key(password: str, salt: bytes) -> bytes:
+from src.metrics.metrics import timed
+from src.security.kdf import KdfParams, LEGACY_PARAMS, derive
+
+Buffer = bytes | bytearray | memoryview
+
+# Layout of a Fernet token: version, timestamp, IV, AES-128-CBC ciphertext, HMAC-SHA256
+VERSION = 0x80
+BLOCK_SIZE = 16
+IV_START, CIPHERTEXT_START = 9, 25
+MAC_SIZE = 32
+
+@timed('crypto.derive_key')
+def password_to_fernet_key(password: str, salt: bytes,
+                           params: KdfParams = LEGACY_PARAMS) -> bytes:
     """ Derives a Fernet key from a password and salt using Scrypt KDF """
-    kdf = Scrypt(
-        salt=salt,
-        length=32,
-        n=2**14,
-        r=8,
-        p=1,
-    )
-    key = kdf.derive(password.encode())
-    return base64.urlsafe_b64encode(key)
+    return base64.urlsafe_b64encode(derive(password, salt, params))
+
+# Keys are not cached: a cache would keep every key used, old member keys included,
+# alive for the life of the process
+def _fernet(key: bytes) -> Fernet:
+    return Fernet(key)
+
+def _split_key(key: bytes) -> tuple[bytes, bytes]:
+    raw = base64.urlsafe_b64decode(key)
+    if len(raw) != 32:
+        raise ValueError('Fernet key must be 32 url-safe base64-encoded bytes.')
+    return raw[:16], raw[16:]
 
+@timed('crypto.encrypt')
 def encrypt(subject: str, key: bytes) -> str:
     """ Encrypts a string using the provided Fernet key """
-    fernet = Fernet(key)
-
-    return fernet.encrypt(subject.encode()).decode()
+    return _fernet(key).encrypt(subject.encode()).decode()
 
+@timed('crypto.decrypt')
 def decrypt(subject: str, key: bytes) -> str:
     """ Decrypts a string using the provided Fernet key """
-    fernet = Fernet(key)
+    return _fernet(key).decrypt(subject).decode()
+
+@timed('crypto.encrypt_many')
+def encrypt_many(subjects: list[str], key: bytes) -> list[str]:
+    """ Encrypts a batch of strings, reusing a single Fernet instance """
+    fernet = _fernet(key)
+
+    return [fernet.encrypt(subject.encode()).decode() for subject in subjects]
+
+@timed('crypto.decrypt_many')
+def decrypt_many(subjects: list[str], key: bytes) -> list[str]:
+    """ Decrypts a batch of strings, reusing a single Fernet instance """
+    fernet = _fernet(key)
+
+    return [fernet.decrypt(subject).decode() for subject in subjects]
+
+@timed('crypto.encrypt_raw')
+def encrypt_raw(plaintext: Buffer, key: bytes) -> bytes:
+    """
+    Encrypts a bytes-like plaintext into a raw Fernet token (not base64 encoded).
+    The plaintext is only copied into a padded buffer which is wiped afterwards
+    """
+    signing_key, encryption_key = _split_key(key)
+    length = len(plaintext)
+    padding = BLOCK_SIZE - length % BLOCK_SIZE
+    padded = bytearray(length + padding)
+    padded[:length] = plaintext
+    padded[length:] = bytes((padding,)) * padding
+
+    iv = os.urandom(BLOCK_SIZE)
+    # update_into wants room for one more block, the MAC's place is overwritten afterwards
+    token = bytearray(CIPHERTEXT_START + len(padded) + max(MAC_SIZE, BLOCK_SIZE))
+    struct.pack_into('>BQ16s', token, 0, VERSION, int(time.time()), iv)
+    encryptor = Cipher(algorithms.AES(encryption_key), modes.CBC(iv)).encryptor()
+    end = CIPHERTEXT_START + encryptor.update_into(padded, memoryview(token)[CIPHERTEXT_START:])
+    encryptor.finalize()
+    wipe(padded)
+
+    token[end:] = hmac.new(signing_key, memoryview(token)[:end], sha256).digest()
+    return bytes(token)
+
+@timed('crypto.decrypt_raw')
+def decrypt_raw(token: Buffer, key: bytes) -> bytearray:
+    """
+    Decrypts a raw Fernet token into a bytearray the caller can wipe() once done with it.
+    Raises InvalidToken like Fernet does
+    """
+    signing_key, encryption_key = _split_key(key)
+    view = memoryview(token)
+    body = len(view) - CIPHERTEXT_START - MAC_SIZE
+    if body <= 0 or body % BLOCK_SIZE or view[0] != VERSION:
+        raise InvalidToken
+    mac = hmac.new(signing_key, view[:-MAC_SIZE], sha256).digest()
+    if not hmac.compare_digest(mac, view[-MAC_SIZE:]):
+        raise InvalidToken
+
+    plaintext = bytearray(body + BLOCK_SIZE)
+    decryptor = Cipher(
+        algorithms.AES(encryption_key), modes.CBC(view[IV_START:CIPHERTEXT_START])).decryptor()
+    length = decryptor.update_into(view[CIPHERTEXT_START:-MAC_SIZE], plaintext)
+    decryptor.finalize()
+
+    padding = plaintext[length - 1]
+    if not 1 <= padding <= BLOCK_SIZE \
+            or plaintext.count(padding, length - padding, length) != padding:
+        wipe(plaintext)
+        raise InvalidToken
+    wipe(memoryview(plaintext)[length - padding:])
+    del plaintext[length - padding:]
+    return plaintext
+
+def to_raw(token: str) -> bytes:
+    """ Returns the raw bytes of a base64 Fernet token """
+    return base64.urlsafe_b64decode(token)
+
+def from_raw(token: Buffer) -> str:
+    """ Returns the base64 form of a raw Fernet token """
+    return base64.urlsafe_b64encode(token).decode()
 
-    return fernet.decrypt(subject.encode()).decode()
+def wipe(buffer: bytearray | memoryview) -> None:
+    """ Overwrites a plaintext buffer with zeros """
+    view = memoryview(buffer).cast('B')
+    view[:] = bytes(len(view))
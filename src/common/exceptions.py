@@ -5,6 +5,11 @@ class UsernameTakenException(Exception):
     UsernameTakenException is used when a user tries to register with a taken username
     """
 
+class GroupNameTakenException(Exception):
+    """
+    GroupNameTakenException is used when a group is renamed to the name of another group
+    """
+
 class UserInvalidLoginException(Exception):
     """
     UserInvalidLoginException is used when an invalid username/password combination is used
@@ -14,3 +19,19 @@ class InvalidEntryException(Exception):
     """
     InvalidEntryException is used when an invalid entry id is requested
     """
+
+class CorruptedVaultException(Exception):
+    """
+    CorruptedVaultException is used when a vault file fails its integrity check or can't be parsed
+    """
+
+class VaultAccessException(Exception):
+    """
+    VaultAccessException is used when a user isn't a member of a vault's keyring
+    or their key can't unwrap its data key
+    """
+
+class InvalidAttachmentException(Exception):
+    """
+    InvalidAttachmentException is used when an invalid attachment id is requested
+    """
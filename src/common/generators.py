@@ -1,49 +1,105 @@
 """
-Contains generator functions for salts used in encryption
+Contains generator functions for salts used in encryption, passwords and passphrases.
+All randomness comes from the operating system's CSPRNG.
 """
 
-import random
+import math
+import os
+import secrets
+from functools import lru_cache
 from hashlib import sha256
+from pathlib import Path
 
 ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+LOWERCASE = 'abcdefghijklmnopqrstuvwxyz'
+UPPERCASE = LOWERCASE.upper()
+SYMBOLS = '!@#$%^&*()'
+NUMBERS = '0123456789'
+
+# EFF large wordlist (https://www.eff.org/dice, CC BY 3.0 US): 7776 words,
+# log2(7776) ≈ 12.9 bits each
+WORDLIST_PATH = Path(__file__).with_name('eff_large_wordlist.txt')
+PASSPHRASE_WORDS = 6
 
 def generate_salt() -> str:
     """ Generates a random salt string of length 8 """
-    chars = []
-    for _ in range(8):
-        chars.append(random.choice(ALPHABET))
-
-    return "".join(chars)
+    return random_string(8, ALPHABET)
 
 def generate_hashed_password(password: str, salt: str) -> str:
     """ Hashes password using sha256 with the given salt """
     return sha256((password + salt).encode('utf-8')).hexdigest()
 
-def generate_password(length: int, use_caps: bool, use_symbols: bool, use_number: bool) -> str:
-    """ Generates a random password of given length with options for caps, symbols and numbers """
-    alphabet = 'abcdefghijklmnopqrstuvwxyz'
-    caps = alphabet.upper()
-    symbols = '!@#$%^&*()'
-    numbers = '0123456789'
-    all_symbols = alphabet
+@lru_cache(maxsize=32)
+def _translation(alphabet: str) -> tuple[bytes, bytes, int]:
+    bound = len(alphabet)
+    limit = 256 - 256 % bound
+    table = bytes(ord(alphabet[b % bound]) if b < limit else 0 for b in range(256))
 
-    password = [random.choice(alphabet)]
-    offset = 1
+    return table, bytes(range(limit, 256)), limit
 
+def random_string(length: int, alphabet: str) -> str:
+    """
+    Returns a uniformly random string over an ASCII alphabet of at most 256 characters.
+    Random bytes are mapped to characters in bulk, dropping the bytes above the largest
+    multiple of the alphabet size so that no character is favoured
+    """
+    table, rejected, limit = _translation(alphabet)
+
+    chars = b''
+    while len(chars) < length:
+        missing = length - len(chars)
+        chars += os.urandom(missing * 256 // limit + 16).translate(table, rejected)
+
+    return chars[:length].decode('ascii')
+
+def generate_passwords(count: int, length: int, use_caps: bool,
+                       use_symbols: bool, use_number: bool) -> list[str]:
+    """
+    Generates count random passwords of given length with options for caps, symbols and numbers.
+    Every selected character class appears at least once (as far as the length allows)
+    at a random position: candidates missing a class are drawn again
+    """
+    classes = [LOWERCASE]
     if use_caps:
-        all_symbols += caps
-        password.append(random.choice(caps))
-        offset += 1
+        classes.append(UPPERCASE)
     if use_symbols:
-        all_symbols += symbols
-        password.append(random.choice(symbols))
-        offset += 1
+        classes.append(SYMBOLS)
     if use_number:
-        all_symbols += numbers
-        password.append(random.choice(numbers))
-        offset += 1
+        classes.append(NUMBERS)
+
+    if length <= 0:
+        return [''] * count
+
+    pool = ''.join(classes)
+    required = [frozenset(c) for c in classes[:length]]
+
+    passwords: list[str] = []
+    while len(passwords) < count:
+        chars = random_string((count - len(passwords)) * length, pool)
+        for start in range(0, len(chars), length):
+            candidate = chars[start:start + length]
+            used = set(candidate)
+            if all(not used.isdisjoint(c) for c in required):
+                passwords.append(candidate)
+
+    return passwords[:count]
+
+def generate_password(length: int, use_caps: bool, use_symbols: bool, use_number: bool) -> str:
+    """ Generates a random password of given length with options for caps, symbols and numbers """
+    return generate_passwords(1, length, use_caps, use_symbols, use_number)[0]
+
+@lru_cache(maxsize=1)
+def load_wordlist() -> tuple[str, ...]:
+    """ Returns the words passphrases are drawn from, read on first use """
+    return tuple(WORDLIST_PATH.read_text(encoding='utf-8').split())
 
-    for _ in range(length - offset):
-        password.append(random.choice(all_symbols))
+def generate_passphrase(words: int = PASSPHRASE_WORDS, separator: str = '-',
+                        wordlist: tuple[str, ...] | list[str] | None = None) -> str:
+    """ Generates a passphrase of randomly chosen words joined by the separator """
+    wordlist = wordlist or load_wordlist()
+    return separator.join(secrets.choice(wordlist) for _ in range(words))
 
-    return ''.join(password)[:length]
+def passphrase_entropy(words: int = PASSPHRASE_WORDS,
+                       wordlist: tuple[str, ...] | list[str] | None = None) -> float:
+    """ Returns the entropy in bits of a passphrase of the given number of words """
+    return words * math.log2(len(wordlist or load_wordlist()))
@@ -0,0 +1,262 @@
+"""
+Tamper evidence for the audit log: every line ends with an HMAC chained to the previous
+line, and signed checkpoints let verification resume where it last stopped
+"""
+import hmac
+import json
+import os
+import secrets
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from hashlib import sha256
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Bytes read from the end of the checkpoint file to find the last checkpoint
+TAIL_BYTES = 4096
+
+
+@dataclass
+class Checkpoint:
+    """
+    Checkpoint pins the chain value after record seq, which ends at byte offset of the log.
+    mac signs the three of them with the log key
+    """
+    seq: int
+    offset: int
+    chain: str
+    mac: str = ''
+
+
+@dataclass
+class Verification:
+    """
+    Verification is the outcome of verify_log: how many records were checked starting
+    at which byte, the last checkpoint they confirmed and the first problem found
+    """
+    records: int
+    start_offset: int
+    checkpoint: int
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        """Whether no tampering was found"""
+        return self.error is None
+
+
+def sidecar(path: Path, suffix: str) -> Path:
+    """Returns the path of a file kept next to the log, e.g. trail.log.checkpoints"""
+    return path.with_name(path.name + suffix)
+
+def load_key(path: Path) -> bytes:
+    """Returns the log key, creating it readable by the owner only on first use"""
+    key_path = sidecar(path, '.key')
+    if not key_path.exists():
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(secrets.token_hex(32))
+    return bytes.fromhex(key_path.read_text(encoding='utf-8').strip())
+
+def link(key: bytes, previous: str, content: str) -> str:
+    """Returns the chain value of a record given the one of the record before it"""
+    return hmac.new(key, f'{previous}{content}'.encode(), sha256).hexdigest()
+
+def sign(key: bytes, checkpoint: Checkpoint, purpose: str = 'checkpoint') -> str:
+    """Returns the MAC of a checkpoint"""
+    message = f'{purpose}:{checkpoint.seq}:{checkpoint.offset}:{checkpoint.chain}'
+    return hmac.new(key, message.encode(), sha256).hexdigest()
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Holds an exclusive lock on <log>.lock, shared by every process writing the log"""
+    with sidecar(path, '.lock').open('a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def read_head(path: Path) -> Checkpoint | None:
+    """Returns the signed head of the log, the position after its last record"""
+    head_path = sidecar(path, '.head')
+    if not head_path.exists():
+        return None
+    return Checkpoint(**json.loads(head_path.read_text(encoding='utf-8')))
+
+
+class LogChain:
+    """
+    Appends chained records to the log. Each line is the record followed by a space and
+    its chain value, HMAC(key, previous chain value + record), and every checkpoint_every
+    records a signed checkpoint is added to <log>.checkpoints.
+
+    Lines already in a log that predates the chain are left out of it: the first checkpoint
+    is placed after them.
+
+    Other processes may write the same log (the TUI next to sync-serve or serve-api), so
+    every append holds a file lock and first reads the records written since its last one.
+    The signed head in <log>.head is moved past every record, letting verify_log notice
+    records removed after the last checkpoint.
+    """
+    def __init__(self, path: Path, checkpoint_every: int = 1000):
+        self.path = path
+        self.__key = load_key(path)
+        self.__checkpoint_every = checkpoint_every
+        self.__checkpoints = sidecar(path, '.checkpoints')
+        self.__head = sidecar(path, '.head')
+        self.__lock = threading.Lock()
+
+        with self.__lock, file_lock(path):
+            if not path.exists():
+                path.write_bytes(b'')
+            last = last_checkpoint(self.__checkpoints)
+            if last is None:
+                last = Checkpoint(0, path.stat().st_size, link(self.__key, '', 'genesis'))
+                self.__add_checkpoint(last)
+
+            self.__seq, self.__offset, self.__chain = last.seq, last.offset, last.chain
+            with path.open('rb') as f:
+                self.__catch_up(f)
+            self.__save_head()
+
+    def append(self, record: str) -> None:
+        """Writes a record to the log, chained to the previous one"""
+        record = record.replace('\n', '\\n')
+        with self.__lock, file_lock(self.path), self.path.open('a+b') as f:
+            self.__catch_up(f)
+            chain = link(self.__key, self.__chain, record)
+            line = f'{record} {chain}\n'.encode('utf-8')
+            f.write(line)
+            f.flush()
+
+            self.__seq += 1
+            self.__offset += len(line)
+            self.__chain = chain
+            if self.__seq % self.__checkpoint_every == 0:
+                self.__add_checkpoint(Checkpoint(self.__seq, self.__offset, chain))
+            self.__save_head()
+
+    def __catch_up(self, f: BinaryIO) -> None:
+        # Records written since the last checkpoint or by other processes
+        f.seek(self.__offset)
+        for line in f:
+            self.__seq += 1
+            self.__offset += len(line)
+            self.__chain = line.rstrip(b'\n').rpartition(b' ')[2].decode()
+
+    def __save_head(self) -> None:
+        head = Checkpoint(self.__seq, self.__offset, self.__chain)
+        head.mac = sign(self.__key, head, 'head')
+        tmp = sidecar(self.path, '.head.tmp')
+        tmp.write_text(json.dumps(asdict(head)), encoding='utf-8')
+        tmp.replace(self.__head)
+
+    def __add_checkpoint(self, checkpoint: Checkpoint) -> None:
+        checkpoint.mac = sign(self.__key, checkpoint)
+        with self.__checkpoints.open('a', encoding='utf-8') as f:
+            f.write(json.dumps(asdict(checkpoint)) + '\n')
+
+
+def last_checkpoint(path: Path) -> Checkpoint | None:
+    """Returns the last checkpoint in a checkpoint file without reading all of it"""
+    if not path.exists():
+        return None
+
+    with path.open('rb') as f:
+        f.seek(max(f.seek(0, os.SEEK_END) - TAIL_BYTES, 0))
+        lines = f.read().splitlines()
+    return Checkpoint(**json.loads(lines[-1])) if lines else None
+
+
+def verify_log(path: Path, full: bool = False) -> Verification:
+    """
+    Checks the chain of the log from the last checkpoint a previous run verified, or
+    from the start when full is set or that checkpoint can't be trusted, up to the signed
+    head. The checkpoint reached is saved to <log>.verified for the next run
+    """
+    key = load_key(path)
+    checkpoints = []
+    checkpoints_path = sidecar(path, '.checkpoints')
+    if checkpoints_path.exists():
+        with checkpoints_path.open('r', encoding='utf-8') as f:
+            for line in f:
+                checkpoint = Checkpoint(**json.loads(line))
+                if not hmac.compare_digest(checkpoint.mac, sign(key, checkpoint)):
+                    return Verification(
+                        0, 0, 0, f'Checkpoint {checkpoint.seq} has an invalid signature')
+                checkpoints.append(checkpoint)
+    if not checkpoints:
+        return Verification(0, 0, 0, 'The checkpoints of the log are missing')
+
+    head = read_head(path)
+    if head is None:
+        return Verification(0, 0, 0, 'The head of the log is missing')
+    if not hmac.compare_digest(head.mac, sign(key, head, 'head')):
+        return Verification(0, 0, 0, 'The head of the log has an invalid signature')
+    if head.seq < checkpoints[-1].seq:
+        return Verification(0, 0, 0, 'The head of the log is behind its last checkpoint')
+
+    start = checkpoints[0]
+    verified_path = sidecar(path, '.verified')
+    if verified_path.exists():
+        verified = Checkpoint(**json.loads(verified_path.read_text(encoding='utf-8')))
+        if hmac.compare_digest(verified.mac, sign(key, verified, 'verified')):
+            if head.seq < verified.seq:
+                return Verification(
+                    0, 0, 0, f'The log was rolled back before record {verified.seq}')
+            if not full and any(c.seq == verified.seq and c.chain == verified.chain
+                                for c in checkpoints):
+                start = verified
+
+    pending = [c for c in checkpoints if c.seq > start.seq]
+    confirmed = start
+    seq, offset, chain = start.seq, start.offset, start.chain
+    error = None
+
+    with path.open('rb') as f:
+        f.seek(start.offset)
+        for line in f:
+            seq += 1
+            record, _, stored = line.rstrip(b'\n').decode('utf-8', 'replace').rpartition(' ')
+            if not hmac.compare_digest(link(key, chain, record), stored):
+                error = f'Record {seq} at byte {offset} was modified, removed or inserted'
+                break
+
+            chain = stored
+            offset += len(line)
+            if pending and pending[0].seq == seq:
+                if pending[0].offset != offset or pending[0].chain != chain:
+                    error = f'Record {seq} does not match its checkpoint'
+                    break
+                confirmed = pending.pop(0)
+            # A record may follow the head if its writer stopped before moving it
+            if seq == head.seq and (head.offset != offset or head.chain != chain):
+                error = f'Record {seq} does not match the head of the log'
+                break
+
+    if error is None and pending:
+        error = f'The log ends before checkpoint {pending[0].seq}, it was truncated'
+    elif error is None and seq < head.seq:
+        error = f'The log ends before record {head.seq}, it was truncated'
+
+    verified = Checkpoint(confirmed.seq, confirmed.offset, confirmed.chain)
+    verified.mac = sign(key, verified, 'verified')
+    verified_path.write_text(json.dumps(asdict(verified)), encoding='utf-8')
+
+    return Verification(seq - start.seq, start.offset, confirmed.seq, error)
@@ -1,9 +1,16 @@
 """Audit logging module."""
 
+import time
+from dataclasses import dataclass
 from enum import Enum
 from pathlib import Path
 from datetime import datetime
 
+from src.common.config import LOG_MIN_LEVEL, LOG_DISABLED_CATEGORIES, \
+    LOG_READ_SAMPLE_EVERY, LOG_READ_PER_SECOND, LOG_CHECKPOINT_EVERY
+from src.logging.chain import LogChain
+from src.metrics.metrics import timed
+
 class Level(Enum):
     """Enum for log levels."""
     DEBUG = 1
@@ -11,20 +18,81 @@ class Level(Enum):
     WARNING = 3
     ERROR = 4
 
+class Category(Enum):
+    """
+    Enum for event categories. Security events (logins, password reveals, key changes)
+    are kept whatever the policy, read events are the high-frequency ones
+    """
+    SECURITY = 'security'
+    WRITE = 'write'
+    READ = 'read'
+    SYSTEM = 'system'
+
+@dataclass(frozen=True)
+class LogPolicy:
+    """
+    LogPolicy decides which events are written: a minimum level, disabled categories,
+    and sampling plus a per-second limit for read events below WARNING
+    """
+    min_level: Level = Level[LOG_MIN_LEVEL]
+    disabled: frozenset[Category] = frozenset(Category(c) for c in LOG_DISABLED_CATEGORIES)
+    read_sample_every: int = LOG_READ_SAMPLE_EVERY
+    read_per_second: float | None = LOG_READ_PER_SECOND
+
 class AuditLog:
-    """Class for audit logging."""
-    def __init__(self, path: Path) -> None:
-        self.__logfile = path
-        if not self.__logfile.exists():
-            self.__logfile.write_text('', encoding='utf-8')
+    """
+    Class for audit logging. Events are checked against the policy before anything
+    is formatted or the log file is opened, written ones are hash-chained (see LogChain)
+    """
+    def __init__(self, path: Path, policy: LogPolicy | None = None,
+                 checkpoint_every: int = LOG_CHECKPOINT_EVERY) -> None:
+        self.__chain = LogChain(path, checkpoint_every)
+        self.policy = policy or LogPolicy()
+        self.__min_level = self.policy.min_level.value
+        self.__muted = self.policy.disabled - {Category.SECURITY}
+        self.__reads = 0
+        self.__window_start = 0.0
+        self.__window_reads = 0
+        self.suppressed = 0
 
-    def log(self, msg: str, lvl: Level = Level.INFO) -> None:
+    def log(self, msg: str, lvl: Level = Level.INFO,
+            category: Category = Category.SYSTEM) -> None:
         """Logs a message with a given level."""
+        if self.__drops(lvl, category):
+            return
+        self.__write(f'{lvl.name} - {msg}')
 
-        with self.__logfile.open('a', encoding='utf-8') as f:
-            f.write(f'{datetime.now().isoformat()} - {lvl.name} - {msg}\n')
-
-    def log_with_user(self, msg: str,  usr: str, lvl: Level = Level.INFO) -> None:
+    def log_with_user(self, msg: str,  usr: str, lvl: Level = Level.INFO,
+                      category: Category = Category.SYSTEM) -> None:
         """Logs a message with a given level and user."""
-        with self.__logfile.open('a', encoding='utf-8') as f:
-            f.write(f'{datetime.now().isoformat()} - {lvl.name} - (User: {usr}) - {msg}\n')
+        if self.__drops(lvl, category):
+            return
+        self.__write(f'{lvl.name} - (User: {usr}) - {msg}')
+
+    def __drops(self, lvl: Level, category: Category) -> bool:
+        if category is Category.SECURITY:
+            return False
+        if lvl.value < self.__min_level or category in self.__muted:
+            self.suppressed += 1
+            return True
+        if category is not Category.READ or lvl.value >= Level.WARNING.value:
+            return False
+
+        self.__reads += 1
+        if self.__reads % self.policy.read_sample_every:
+            self.suppressed += 1
+            return True
+
+        if self.policy.read_per_second is not None:
+            now = time.monotonic()
+            if now - self.__window_start >= 1:
+                self.__window_start, self.__window_reads = now, 0
+            if self.__window_reads >= self.policy.read_per_second:
+                self.suppressed += 1
+                return True
+            self.__window_reads += 1
+        return False
+
+    @timed('log.write')
+    def __write(self, line: str) -> None:
+        self.__chain.append(f'{datetime.now().isoformat()} - {line}')
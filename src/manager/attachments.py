@@ -0,0 +1,179 @@
+"""
+Files and notes attached to vault entries, kept in an encrypted content-addressed chunk store
+"""
+import hmac
+import io
+import json
+import uuid
+from dataclasses import dataclass, asdict, field
+from hashlib import sha256
+from pathlib import Path
+from typing import BinaryIO
+
+from cryptography.fernet import InvalidToken
+
+import src.common.encryption as encryption
+from src.common.exceptions import CorruptedVaultException, InvalidAttachmentException
+
+CHUNK_SIZE = 64 * 1024
+KIND_FILE = 'file'
+KIND_NOTE = 'note'
+
+
+@dataclass
+class Attachment:
+    """
+    Attachment describes a file or note of an entry: its plaintext size and the
+    addresses of its chunks in order
+    """
+    id: str
+    entry_id: str
+    name: str
+    kind: str
+    size: int
+    created_at: str
+    chunks: list[str] = field(default_factory=list)
+
+
+class AttachmentStore:
+    """
+    Splits attachments into fixed-size chunks, each encrypted on its own and stored under
+    <directory>/<address[:2]>/<address[2:]>. The address is an HMAC of the plaintext chunk,
+    so identical chunks are stored once without revealing their content, and a chunk that
+    was swapped or altered is detected on read. Only one chunk is held in memory while
+    an attachment is written or read.
+
+    The catalog of attachments is a single encrypted file read on first use, so opening
+    the vault doesn't depend on the attachments at all.
+    """
+    def __init__(self, directory: Path, key: bytes, chunk_size: int = CHUNK_SIZE):
+        self.directory = directory
+        self.__key = key
+        self.__address_key = hmac.new(key, b'attachment-address', sha256).digest()
+        self.__chunk_size = chunk_size
+        self.__catalog_path = directory / 'catalog'
+        self.__catalog: dict[str, Attachment] | None = None
+
+    def add(self, entry_id: str, name: str, source: BinaryIO, created_at: str,
+            kind: str = KIND_FILE) -> Attachment:
+        """ Stores the content of a binary stream read chunk by chunk, returns its attachment """
+        attachment = Attachment(str(uuid.uuid4()), entry_id, name, kind, 0, created_at)
+        buffer = bytearray(self.__chunk_size)
+        view = memoryview(buffer)
+        try:
+            while read := source.readinto(buffer):
+                attachment.chunks.append(self.__put_chunk(view[:read]))
+                attachment.size += read
+        finally:
+            encryption.wipe(buffer)
+
+        self.__entries()[attachment.id] = attachment
+        self.__save_catalog()
+        return attachment
+
+    def add_note(self, entry_id: str, title: str, text: str, created_at: str) -> Attachment:
+        """ Stores a secure note """
+        return self.add(entry_id, title, io.BytesIO(text.encode('utf-8')), created_at, KIND_NOTE)
+
+    def get(self, attachment_id: str) -> Attachment:
+        """ Returns an attachment, raises InvalidAttachmentException if it doesn't exist """
+        attachment = self.__entries().get(attachment_id)
+        if attachment is None:
+            raise InvalidAttachmentException(attachment_id)
+        return attachment
+
+    def for_entry(self, entry_id: str) -> list[Attachment]:
+        """ Returns the attachments of an entry, oldest first """
+        return [a for a in self.__entries().values() if a.entry_id == entry_id]
+
+    def read(self, attachment_id: str, target: BinaryIO) -> int:
+        """ Writes the decrypted content to a binary stream chunk by chunk, returns its size """
+        written = 0
+        for address in self.get(attachment_id).chunks:
+            chunk = self.__get_chunk(address)
+            try:
+                written += target.write(chunk)
+            finally:
+                encryption.wipe(chunk)
+        return written
+
+    def read_note(self, attachment_id: str) -> str:
+        """ Returns the text of a note """
+        target = io.BytesIO()
+        self.read(attachment_id, target)
+        return target.getvalue().decode('utf-8')
+
+    def delete(self, attachment_id: str) -> None:
+        """ Removes an attachment and the chunks no other attachment uses """
+        self.__remove([self.get(attachment_id)])
+
+    def delete_entry(self, entry_id: str) -> int:
+        """ Removes all attachments of an entry, returns their number """
+        if not self.__catalog_path.exists():
+            return 0
+        attachments = self.for_entry(entry_id)
+        if attachments:
+            self.__remove(attachments)
+        return len(attachments)
+
+    def move_entry(self, entry_id: str, target_id: str) -> int:
+        """ Moves all attachments of an entry to another one, returns their number """
+        if not self.__catalog_path.exists():
+            return 0
+        attachments = self.for_entry(entry_id)
+        for attachment in attachments:
+            attachment.entry_id = target_id
+        if attachments:
+            self.__save_catalog()
+        return len(attachments)
+
+    def __remove(self, attachments: list[Attachment]) -> None:
+        entries = self.__entries()
+        for attachment in attachments:
+            del entries[attachment.id]
+        self.__save_catalog()
+
+        used = {address for a in entries.values() for address in a.chunks}
+        for address in {address for a in attachments for address in a.chunks} - used:
+            self.__chunk_path(address).unlink(missing_ok=True)
+
+    def __put_chunk(self, plaintext: memoryview) -> str:
+        address = hmac.new(self.__address_key, plaintext, sha256).hexdigest()
+        path = self.__chunk_path(address)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_bytes(encryption.encrypt_raw(plaintext, self.__key))
+            tmp.replace(path)
+        return address
+
+    def __get_chunk(self, address: str) -> bytearray:
+        try:
+            chunk = encryption.decrypt_raw(self.__chunk_path(address).read_bytes(), self.__key)
+        except (OSError, InvalidToken) as e:
+            raise CorruptedVaultException(f'Attachment chunk {address} is missing or damaged') from e
+
+        expected = hmac.new(self.__address_key, chunk, sha256).hexdigest()
+        if not hmac.compare_digest(expected, address):
+            encryption.wipe(chunk)
+            raise CorruptedVaultException(f'Attachment chunk {address} was replaced')
+        return chunk
+
+    def __chunk_path(self, address: str) -> Path:
+        return self.directory / address[:2] / address[2:]
+
+    def __entries(self) -> dict[str, Attachment]:
+        if self.__catalog is None:
+            self.__catalog = {}
+            if self.__catalog_path.exists():
+                catalog = json.loads(encryption.decrypt(
+                    self.__catalog_path.read_text(encoding='utf-8'), self.__key))
+                self.__catalog = {k: Attachment(**v) for k, v in catalog.items()}
+        return self.__catalog
+
+    def __save_catalog(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        catalog = {k: asdict(v) for k, v in self.__entries().items()}
+        tmp = self.__catalog_path.with_suffix('.tmp')
+        tmp.write_text(encryption.encrypt(json.dumps(catalog), self.__key), encoding='utf-8')
+        tmp.replace(self.__catalog_path)
@@ -0,0 +1,178 @@
+"""
+Ranked fuzzy matching of vault entries on address, username and group
+"""
+import heapq
+import re
+from collections import Counter
+
+GRAM_SIZE = 2
+# Candidates scored per query, picked by the number of grams they share with it
+CANDIDATES_PER_RESULT = 20
+MIN_CANDIDATES = 200
+FIELD_WEIGHTS = (1.0, 0.8, 0.6)
+
+_SCHEME = re.compile(r'^[a-z][a-z0-9+.-]*://')
+
+
+def normalize_address(address: str) -> str:
+    """
+    Reduces an address to the part people remember:
+    'https://www.GitHub.com/login/' becomes 'github.com/login'
+    """
+    address = _SCHEME.sub('', address.strip().lower())
+    host, _, path = address.partition('/')
+    host = host.rpartition('@')[2].partition(':')[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    path = path.partition('?')[0].partition('#')[0].strip('/')
+    return f'{host}/{path}' if path else host
+
+
+def grams(text: str) -> set[str]:
+    """ Returns the set of overlapping character pairs of text """
+    if len(text) < GRAM_SIZE:
+        return {text} if text else set()
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def max_typos(query: str) -> int:
+    """ Number of edits tolerated for a query, none for very short ones """
+    if len(query) < 4:
+        return 0
+    return 1 if len(query) < 8 else 2
+
+
+def substring_distance(query: str, text: str) -> int:
+    """
+    Smallest edit distance between query and any substring of text. Insertions,
+    deletions, substitutions and swaps of adjacent characters count as one edit each
+    """
+    before = None
+    previous = list(range(len(query) + 1))
+    previous_char = ''
+    best = previous[-1]
+    for char in text:
+        current = [0]
+        for i, query_char in enumerate(query, 1):
+            cost = min(
+                previous[i] + 1,
+                current[i - 1] + 1,
+                previous[i - 1] + (query_char != char),
+            )
+            if before is not None and i > 1 and query_char == previous_char \
+                    and query[i - 2] == char:
+                cost = min(cost, before[i - 2] + 1)
+            current.append(cost)
+        best = min(best, current[-1])
+        before, previous, previous_char = previous, current, char
+    return best
+
+
+def match_score(query: str, text: str) -> float:
+    """
+    Scores how well query matches text, from 0 (no match) to 1 (equal).
+    Exact, prefix and substring matches rank above subsequences, which rank above
+    matches that need edits. Within a tier, matches covering more of text rank higher.
+    """
+    if not query or not text:
+        return 0.0
+    if text == query:
+        return 1.0
+    coverage = len(query) / len(text)
+    if text.startswith(query):
+        return 0.85 + 0.05 * coverage
+    if query in text:
+        return 0.75 + 0.05 * coverage
+
+    position = -1
+    start = text.find(query[0])
+    if start != -1:
+        position = start
+        for char in query[1:]:
+            position = text.find(char, position + 1)
+            if position == -1:
+                break
+    if position != -1:
+        return 0.5 + 0.2 * len(query) / (position - start + 1)
+
+    allowed = max_typos(query)
+    if allowed:
+        distance = substring_distance(query, text)
+        if distance <= allowed:
+            return 0.5 * (1 - distance / (len(query) + 1))
+    return 0.0
+
+
+class FuzzyIndex:
+    """
+    Keeps the normalized address, username and group of every entry and a gram index
+    over them, so a query only scores the entries sharing the most grams with it
+    instead of the whole vault.
+    """
+    def __init__(self):
+        self.__fields: dict[str, tuple[str, str, str]] = {}
+        self.__postings: dict[str, dict[str, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__fields)
+
+    def add(self, entry_id: str, address: str, username: str, group: str) -> None:
+        """ Indexes an entry, replacing its previous values """
+        self.remove(entry_id)
+        values = (normalize_address(address), username.strip().lower(), group.strip().lower())
+        self.__fields[entry_id] = values
+        for gram in set().union(*map(grams, values)):
+            self.__postings.setdefault(gram, {})[entry_id] = None
+
+    def remove(self, entry_id: str) -> None:
+        """ Removes an entry from the index """
+        values = self.__fields.pop(entry_id, None)
+        if values is None:
+            return
+
+        for gram in set().union(*map(grams, values)):
+            posting = self.__postings[gram]
+            del posting[entry_id]
+            if not posting:
+                del self.__postings[gram]
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[float, str]]:
+        """
+        Returns up to limit (score, entry id) pairs, best match first.
+        Every word of the query has to match one of the fields of the entry.
+        """
+        words = query.strip().lower().split()
+        if not words or limit <= 0:
+            return []
+
+        if min(map(len, words)) < GRAM_SIZE:
+            # A single character has no gram in the index, every entry is scored
+            candidates = self.__fields
+        else:
+            shared: Counter[str] = Counter()
+            for gram in set().union(*map(grams, words)):
+                shared.update(self.__postings.get(gram, {}).keys())
+
+            budget = max(limit * CANDIDATES_PER_RESULT, MIN_CANDIDATES)
+            candidates = heapq.nlargest(budget, shared, key=shared.__getitem__)
+
+        scored = []
+        for entry_id in candidates:
+            score = self.__score(words, self.__fields[entry_id])
+            if score > 0:
+                scored.append((score, entry_id))
+
+        return heapq.nlargest(limit, scored, key=lambda pair: pair[0])
+
+    @staticmethod
+    def __score(words: list[str], values: tuple[str, str, str]) -> float:
+        total = 0.0
+        for word in words:
+            best = max(
+                weight * match_score(word, value)
+                for weight, value in zip(FIELD_WEIGHTS, values)
+            )
+            if best == 0:
+                return 0.0
+            total += best
+        return total / len(words)
@@ -0,0 +1,157 @@
+"""
+Append-only store of previous entry values, kept apart from the vault file
+"""
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+COMPACT_SLACK = 256
+
+
+@dataclass
+class HistoryRecord:
+    """
+    HistoryRecord holds the values an entry had before one change, only for the changed fields.
+    The password is stored encrypted, like in the vault
+    """
+    entry_id: str
+    changed_at: str
+    changes: dict[str, str]
+
+
+class EntryHistory:
+    """
+    Keeps previous values of entries as one JSON line per change. The file is only read
+    when history is first needed, building an index of line offsets per entry, and is
+    rewritten without expired records once enough versions pile up, or as soon as it
+    holds records older than max_age_days: those contain old password ciphertexts.
+    """
+    def __init__(self, path: Path, max_versions: int = 20, max_age_days: int | None = None,
+                 time_format: str = '%Y-%m-%d %H:%M:%S'):
+        self.__path = path
+        self.__max_versions = max_versions
+        self.__max_age_days = max_age_days
+        self.__time_format = time_format
+        self.__offsets: dict[str, list[int]] | None = None
+        self.__expired = 0
+        self.__aged = 0
+
+    def record(self, entry_id: str, changes: dict[str, str], changed_at: str) -> None:
+        """ Appends the previous values of the changed fields of an entry """
+        if not changes:
+            return
+
+        offsets = self.__index()
+        line = json.dumps({'id': entry_id, 'at': changed_at, 'changes': changes}) + '\n'
+        with self.__path.open('ab') as f:
+            offset = f.tell()
+            f.write(line.encode('utf-8'))
+
+        versions = offsets.setdefault(entry_id, [])
+        versions.append(offset)
+        if len(versions) > self.__max_versions:
+            self.__expired += 1
+        cutoff = self.__cutoff()
+        if cutoff is not None and changed_at < cutoff:
+            self.__aged += 1
+
+        self.__compact_if_needed()
+
+    def history(self, entry_id: str) -> list[HistoryRecord]:
+        """ Returns the retained changes of an entry, newest first """
+        self.__compact_if_needed()
+        offsets = self.__index().get(entry_id, [])[-self.__max_versions:]
+        if not offsets or not self.__path.exists():
+            return []
+        cutoff = self.__cutoff()
+
+        records = []
+        with self.__path.open('rb') as f:
+            for offset in reversed(offsets):
+                f.seek(offset)
+                record = self.__parse(f.readline())
+                if cutoff is not None and record.changed_at < cutoff:
+                    break
+                records.append(record)
+
+        return records
+
+    def compact(self) -> None:
+        """ Rewrites the file with only the records allowed by the retention settings """
+        if not self.__path.exists():
+            return
+
+        cutoff = self.__cutoff()
+        kept = {
+            entry_id: offsets[-self.__max_versions:]
+            for entry_id, offsets in self.__index().items()
+        }
+        wanted = sorted(offset for offsets in kept.values() for offset in offsets)
+
+        tmp = self.__path.with_suffix('.tmp')
+        offsets: dict[str, list[int]] = {}
+        with self.__path.open('rb') as source, tmp.open('wb') as target:
+            for offset in wanted:
+                source.seek(offset)
+                line = source.readline()
+                record = self.__parse(line)
+                if cutoff is not None and record.changed_at < cutoff:
+                    continue
+                offsets.setdefault(record.entry_id, []).append(target.tell())
+                target.write(line)
+
+        tmp.replace(self.__path)
+        self.__offsets = offsets
+        self.__expired = 0
+        self.__aged = 0
+
+    def export(self, target: Path, convert_password: Callable[[str], str]) -> None:
+        """
+        Writes every record to target with its password passed through convert_password,
+        used to re-encrypt the history under another key
+        """
+        with self.__path.open('rb') as source, target.open('wb') as f:
+            for line in source:
+                data = json.loads(line)
+                if 'password' in data['changes']:
+                    data['changes']['password'] = convert_password(data['changes']['password'])
+                f.write((json.dumps(data) + '\n').encode('utf-8'))
+        self.__offsets = None
+
+    def __index(self) -> dict[str, list[int]]:
+        if self.__offsets is not None:
+            return self.__offsets
+
+        self.__offsets = {}
+        self.__aged = 0
+        cutoff = self.__cutoff()
+        if self.__path.exists():
+            with self.__path.open('rb') as f:
+                offset = 0
+                for line in f:
+                    data = json.loads(line)
+                    self.__offsets.setdefault(data['id'], []).append(offset)
+                    offset += len(line)
+                    if cutoff is not None and data['at'] < cutoff:
+                        self.__aged += 1
+
+        self.__expired = sum(
+            max(len(offsets) - self.__max_versions, 0) for offsets in self.__offsets.values())
+        return self.__offsets
+
+    def __compact_if_needed(self) -> None:
+        self.__index()
+        if self.__aged or self.__expired > COMPACT_SLACK:
+            self.compact()
+
+    def __cutoff(self) -> str | None:
+        if self.__max_age_days is None:
+            return None
+        return (datetime.now() - timedelta(days=self.__max_age_days)).strftime(self.__time_format)
+
+    @staticmethod
+    def __parse(line: bytes) -> HistoryRecord:
+        data = json.loads(line)
+        return HistoryRecord(data['id'], data['at'], data['changes'])
@@ -0,0 +1,131 @@
+"""
+Per-vault data keys, wrapped with the master key of every member of the vault
+"""
+import json
+from pathlib import Path
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from src.common.exceptions import VaultAccessException
+
+KEYRING_SUFFIX = '.keyring'
+
+
+class VaultKeyring:
+    """
+    Entries of a vault are encrypted with a random data key, which the keyring keeps
+    encrypted (wrapped) once per member with the key derived from their master password.
+    Changing a master password or adding a member only rewraps the 32-byte data key,
+    whatever the size of the vault.
+
+    While a master password is being changed a member holds two wraps, the new one first,
+    so the vault still opens with the old password if the change doesn't get saved.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.__members: dict[str, list[str]] = {}
+        self.__pending: list[str] = []
+        if path.exists():
+            keyring = json.loads(path.read_text(encoding='utf-8'))
+            self.__members = keyring['members']
+            self.__pending = keyring.get('pending', [])
+
+    def exists(self) -> bool:
+        """ Returns whether the keyring has been created """
+        return self.path.exists()
+
+    def members(self) -> list[str]:
+        """ Returns the usernames able to open the vault """
+        return list(self.__members)
+
+    def create(self, username: str, member_key: bytes, data_key: bytes | None = None,
+               pending: list[str] = ()) -> bytes:
+        """
+        Creates the keyring with its first member, returns the data key. pending names
+        files already encrypted with the data key that are yet to replace the vault's
+        own, written when a vault older than keyrings is re-encrypted
+        """
+        data_key = data_key or Fernet.generate_key()
+        self.__members = {username: [wrap(data_key, member_key)]}
+        self.__pending = list(pending)
+        self.__save()
+        return data_key
+
+    def pending(self) -> list[str]:
+        """ Returns the files still to be moved in place after the keyring was created """
+        return list(self.__pending)
+
+    def clear_pending(self) -> None:
+        """ Records that the pending files have been moved in place """
+        if self.__pending:
+            self.__pending = []
+            self.__save()
+
+    def unwrap(self, username: str, member_key: bytes) -> bytes:
+        """ Returns the data key, raises VaultAccessException if the member can't open it """
+        for token in self.__members.get(username, ()):
+            try:
+                return Fernet(member_key).decrypt(token.encode())
+            except InvalidToken:
+                continue
+
+        raise VaultAccessException(f'{username} can not open {self.path.stem}')
+
+    def add_member(self, username: str, member_key: bytes, data_key: bytes) -> None:
+        """ Wraps the data key for a member, replacing the wraps they had """
+        self.__members[username] = [wrap(data_key, member_key)]
+        self.__save()
+
+    def remove_member(self, username: str) -> None:
+        """ Removes a member, the last one can't be removed """
+        if username not in self.__members:
+            raise ValueError(f'{username} is not a member of {self.path.stem}')
+        if len(self.__members) == 1:
+            raise ValueError('The last member of a vault can not be removed')
+
+        del self.__members[username]
+        self.__save()
+
+    def rewrap(self, username: str, old_key: bytes, new_key: bytes) -> None:
+        """ Wraps the data key with the new key of a member, keeping the wrap with the old one """
+        data_key = self.unwrap(username, old_key)
+        self.__members[username] = [wrap(data_key, new_key), wrap(data_key, old_key)]
+        self.__save()
+
+    def drop_previous(self, username: str) -> None:
+        """ Forgets all but the newest wrap of a member, once their new key has been saved """
+        if len(self.__members.get(username, ())) > 1:
+            del self.__members[username][1:]
+            self.__save()
+
+    def __save(self) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + '.tmp')
+        keyring = {'version': 1, 'members': self.__members}
+        if self.__pending:
+            keyring['pending'] = self.__pending
+        tmp.write_text(json.dumps(keyring), encoding='utf-8')
+        tmp.replace(self.path)
+
+
+def wrap(data_key: bytes, member_key: bytes) -> str:
+    """ Returns the data key encrypted with the key of a member """
+    return Fernet(member_key).encrypt(data_key).decode()
+
+def rewrap_member(directory: Path, username: str, old_key: bytes, new_key: bytes) -> int:
+    """
+    Rewraps the data key of every vault in directory the user is a member of,
+    returns the number of vaults
+    """
+    rewrapped = 0
+    for path in sorted(directory.glob(f'*{KEYRING_SUFFIX}')):
+        keyring = VaultKeyring(path)
+        if username in keyring.members():
+            keyring.rewrap(username, old_key, new_key)
+            rewrapped += 1
+
+    return rewrapped
+
+def drop_previous_wraps(directory: Path, username: str) -> None:
+    """ Forgets the wraps of the user's old key in every vault in directory """
+    for path in sorted(directory.glob(f'*{KEYRING_SUFFIX}')):
+        VaultKeyring(path).drop_previous(username)
@@ -2,19 +2,41 @@
 Class for managing user passwords
 """
 import copy
+import hmac
 import json
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field, fields
+from hashlib import sha1, sha256
+from typing import BinaryIO, Protocol
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
-import pyperclip
+from concurrent.futures import Future
+from itertools import islice
+
+from cryptography.fernet import Fernet, InvalidToken
 
 import src.common.encryption as encryption
-from src.common.config import APP_DATA_DIR
-from src.common.exceptions import InvalidEntryException
-from src.logging.logging import AuditLog, Level
+from src.common.clipboard import CLIPBOARD
+from src.common.config import APP_DATA_DIR, HISTORY_MAX_VERSIONS, HISTORY_MAX_AGE_DAYS, \
+    TIME_FORMAT
+from src.common.exceptions import InvalidEntryException, VaultAccessException
+from src.logging.logging import AuditLog, Category, Level
+from src.manager.attachments import AttachmentStore, Attachment
+from src.manager.fuzzy import FuzzyIndex, normalize_address
+from src.manager.rotation import RotationSchedule
+from src.manager.history import EntryHistory, HistoryRecord
+from src.manager.keyring import VaultKeyring, KEYRING_SUFFIX, wrap
+from src.manager.sort_index import SortIndex
+from src.manager.search_index import SearchIndex, IndexRecord, seal_version
+from src.manager.storage import JsonVaultStore, BinaryVaultStore, migrate_json_to_binary
+from src.metrics.metrics import timed
+from src.security.strength import PasswordStrength, score_passwords
 
-TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+SEALED_FIELD = 'sealed'
+UNSEAL_BATCH_SIZE = 256
+HISTORY_FIELDS = ('address', 'username', 'group')
+TOKEN_FIELDS = ('password', SEALED_FIELD)
+REKEY_SUFFIX = '.rekey'
 
 @dataclass
 class LoginEntry:
@@ -28,38 +50,113 @@ class LoginEntry:
     group: str
     created_at: str
     updated_at: str
+    max_age_days: int | None = None
+    password_changed_at: str | None = None
+
+def rotation_due_date(entry: LoginEntry) -> str | None:
+    """
+    Returns when the password of the entry should be changed, None if it has no maximum age
+    """
+    if entry.max_age_days is None:
+        return None
+
+    changed_at = datetime.strptime(entry.password_changed_at or entry.created_at, TIME_FORMAT)
+    return (changed_at + timedelta(days=entry.max_age_days)).strftime(TIME_FORMAT)
+
+def duplicate_key(address: str, username: str) -> tuple[str, str]:
+    """
+    Returns the key under which entries count as duplicates: the host of the address
+    without scheme, 'www.' or port, and the case-folded username
+    """
+    return normalize_address(address).partition('/')[0], username.strip().casefold()
+
+class BreachChecker(Protocol):
+    """Anything able to look up a batch of SHA-1 digests in a breach corpus"""
+    def contains_many(self, digests: list[bytes]) -> list[bool]:
+        """Returns whether each digest is part of the corpus"""
+
+@dataclass
+class AuditReport:
+    """
+    AuditReport contains the strength of every entry's password and the weak or reused ones
+    """
+    scores: dict[str, PasswordStrength] = field(default_factory=dict)
+    weak: list[str] = field(default_factory=list)
+    reused: list[list[str]] = field(default_factory=list)
 
 class PasswordManager:
     """Class for managing user password entries, with CRUD operations and search functionality"""
-    def __init__(self, username: str, master_password: bytes, log: AuditLog, storage_path: Path | str = None):
+    def __init__(self, username: str, master_password: bytes, log: AuditLog,
+                 storage_path: Path | str = None, encrypt_metadata: bool = False,
+                 vault_format: str = 'json', history_versions: int = HISTORY_MAX_VERSIONS,
+                 history_max_age_days: int | None = HISTORY_MAX_AGE_DAYS,
+                 vault: str | None = None):
+        """
+        master_password is the key derived from the user's master password, which unwraps
+        the data key of the vault. vault names a shared vault the user is a member of,
+        by default the user's own vault is opened
+        """
         self.__logger = log
         self.__username = username
-        self.__master_password = master_password
+        self.__vault = vault or username
+        self.__member_key = master_password
+        self.__encrypt_metadata = encrypt_metadata
+        self.__vault_format = vault_format
         self.__path = self.__init_dirs(storage_path)
+        self.__keyring = VaultKeyring(self.__path / f'{self.__vault}{KEYRING_SUFFIX}')
+        self.__data_key = self.__open_keyring()
+        self.__store = self.__open_store(vault_format)
+        self.__history = EntryHistory(
+            self.__history_path(), history_versions,
+            history_max_age_days, TIME_FORMAT)
+        self.__sealed: dict[str, str] = {}
+        self.__audit_cache: dict[str, tuple[str, str, PasswordStrength, bytes]] = {}
+        self.__index = SearchIndex(self.__path / f'{self.__vault}.index', self.__data_key)
         self.__user_passwords = self.__load_passwords()
+        self.__group_index: dict[str, dict[str, None]] = {}
+        self.__fuzzy_index: FuzzyIndex | None = None
+        self.__sort_indexes: dict[str, SortIndex] = {}
+        self.__duplicate_index: dict[tuple[str, str], dict[str, None]] | None = None
+        for entry_id, entry in self.__user_passwords.items():
+            self.__group_index.setdefault(entry.group, {})[entry_id] = None
+        self.__rotation = self.__load_rotation()
+        self.__attachments: AttachmentStore | None = None
+        if not self.__keyring.exists():
+            self.__rekey_legacy()
 
+    @timed('vault.create_entry')
     def create_entry(
             self, address: str, username: str,
-            password: str, group: str = '') -> LoginEntry:
+            password: str, group: str = '', max_age_days: int | None = None) -> LoginEntry:
         """
-        Creates a new login entry
+        Creates a new login entry, max_age_days sets how often its password should be rotated
         """
         entry = LoginEntry(
             id=str(uuid.uuid4()),
             username=username,
-            password=encryption.encrypt(password, self.__master_password),
+            password=encryption.encrypt(password, self.__data_key),
             address=address,
             group=group,
             created_at=datetime.now().strftime(TIME_FORMAT),
             updated_at=datetime.now().strftime(TIME_FORMAT),
+            max_age_days=max_age_days,
         )
+        entry.password_changed_at = entry.created_at
 
+        duplicates = len(self.__duplicates().get(duplicate_key(address, username), ()))
         self.__user_passwords[entry.id] = entry
+        self.__index_entry(entry.id, entry)
         self.__save_passwords()
 
-        self.__logger.log_with_user('A new password has been saved', self.__username)
+        self.__logger.log_with_user(
+            'A new password has been saved', self.__username, category=Category.WRITE)
+        if duplicates:
+            self.__logger.log_with_user(
+                f'Entry {entry.id} duplicates {duplicates} existing entries', self.__username,
+                Level.WARNING, category=Category.WRITE)
         return entry
 
+    @timed('vault.fetch_entry')
     def fetch_entry_by_id(self, entry_id: str) -> LoginEntry | None:
         """
         Fetch entry by id, returns None if the entry does not exist
@@ -70,11 +167,48 @@ class PasswordManager:
             return None
 
         entry = copy.deepcopy(self.__user_passwords[entry_id])
-        entry.password = encryption.decrypt(entry.password, self.__master_password)
+        entry.password = encryption.decrypt(entry.password, self.__data_key)
 
-        self.__logger.log_with_user(f'Fetched password entry {entry_id}', self.__username)
+        self.__logger.log_with_user(
+            f'Fetched password entry {entry_id}', self.__username, category=Category.SECURITY)
         return entry
 
+    @timed('vault.fetch_password_raw')
+    def fetch_password_raw(self, entry_id: str) -> bytearray:
+        """
+        Returns the UTF-8 password of an entry in a bytearray the caller wipes once done
+        with it, no str copy of the password is made. Raises InvalidEntryException
+        """
+        self.__check_entry(entry_id)
+        password = encryption.decrypt_raw(
+            encryption.to_raw(self.__user_passwords[entry_id].password), self.__data_key)
+
+        self.__logger.log_with_user(
+            f'Revealed the password of entry {entry_id}', self.__username,
+            category=Category.SECURITY)
+        return password
+
+    @timed('vault.fetch_entries')
+    def fetch_entries(self, entry_ids: list[str]) -> list[LoginEntry]:
+        """
+        Fetch several entries with their passwords decrypted in one batch,
+        ids of entries that don't exist are skipped
+        """
+        entries = [
+            copy.copy(self.__user_passwords[entry_id])
+            for entry_id in dict.fromkeys(entry_ids) if entry_id in self.__user_passwords
+        ]
+        passwords = encryption.decrypt_many(
+            [entry.password for entry in entries], self.__data_key)
+        for entry, password in zip(entries, passwords):
+            entry.password = password
+
+        self.__logger.log_with_user(
+            f'Fetched {len(entries)} password entries', self.__username,
+            category=Category.SECURITY)
+        return entries
+
+    @timed('vault.edit_entry')
     def edit_entry(self, entry_id: str, entry: LoginEntry) -> None:
         """
         Edit entry by id, the function accepts the new entry and sets it to the existing id
@@ -83,14 +217,30 @@ class PasswordManager:
             self.__logger.log_with_user('Invalid input entry on edit', self.__username, Level.ERROR)
             raise InvalidEntryException
 
-        entry.password = encryption.encrypt(entry.password, self.__master_password)
+        previous = self.__user_passwords[entry_id]
+        changes = {
+            name: getattr(previous, name) for name in HISTORY_FIELDS
+            if getattr(previous, name) != getattr(entry, name)
+        }
+        if encryption.decrypt(previous.password, self.__data_key) != entry.password:
+            changes['password'] = previous.password
+
+        entry.password = encryption.encrypt(entry.password, self.__data_key)
         entry.updated_at = datetime.now().strftime(TIME_FORMAT)
+        entry.password_changed_at = \
+            entry.updated_at if 'password' in changes else previous.password_changed_at
+        self.__history.record(entry_id, changes, entry.updated_at)
 
+        self.__unindex_entry(entry_id, previous)
+        self.__sealed.pop(entry_id, None)
         self.__user_passwords[entry_id] = entry
+        self.__index_entry(entry_id, entry)
         self.__save_passwords()
 
-        self.__logger.log_with_user(f'Edited password entry {entry_id}', self.__username)
+        self.__logger.log_with_user(
+            f'Edited password entry {entry_id}', self.__username, category=Category.WRITE)
 
+    @timed('vault.delete_entry')
     def delete_entry(self, entry_id: str) -> LoginEntry | None:
         """
         Delete entry by id, returns None if the entry does not exist
@@ -102,23 +252,81 @@ class PasswordManager:
 
         entry = self.__user_passwords[entry_id]
         del self.__user_passwords[entry_id]
+        self.__history.record(
+            entry_id,
+            {name: getattr(entry, name) for name in HISTORY_FIELDS + ('password',)},
+            datetime.now().strftime(TIME_FORMAT))
+        self.__unindex_entry(entry_id, entry)
+        self.__sealed.pop(entry_id, None)
+        self.__index.remove(entry_id)
         self.__save_passwords()
+        self.__attachment_store().delete_entry(entry_id)
 
-        self.__logger.log_with_user(f'Deleted password entry {entry_id}', self.__username)
+        self.__logger.log_with_user(
+            f'Deleted password entry {entry_id}', self.__username, category=Category.WRITE)
         return entry
 
-    def list_passwords(self) -> list[LoginEntry]:
+    @timed('vault.history')
+    def entry_history(self, entry_id: str) -> list[HistoryRecord]:
+        """
+        Returns the previous values of an entry, newest first, with passwords decrypted
+        """
+        records = self.__history.history(entry_id)
+        changed = [r for r in records if 'password' in r.changes]
+        passwords = encryption.decrypt_many(
+            [r.changes['password'] for r in changed], self.__data_key)
+        for record, password in zip(changed, passwords):
+            record.changes['password'] = password
+
+        self.__logger.log_with_user(
+            f'Fetched history of entry {entry_id}', self.__username, category=Category.SECURITY)
+        return records
+
+    @timed('vault.list')
+    def list_passwords(self, sort_by: str | None = None, descending: bool = False,
+                       offset: int = 0, limit: int | None = None,
+                       group: str | None = None) -> list[LoginEntry]:
+        """
+        Returns a page of the entries, in creation order or sorted by one of
+        address, username, group, created_at or updated_at, optionally only those of a group.
+        Sorting uses an index kept up to date on every change, so a page costs its size
+        rather than a sort of the whole vault
+        """
+        self.__logger.log_with_user('Listing passwords', self.__username, category=Category.READ)
+        offset = max(offset, 0)
+        stop = None if limit is None else offset + max(limit, 0)
+
+        if group is not None:
+            entry_ids = self.__group_index.get(group, {})
+            if sort_by is not None:
+                key = self.__sort_index(sort_by).key
+                entry_ids = sorted(
+                    entry_ids, key=lambda e: (key(self.__user_passwords[e]), e), reverse=descending)
+            return [self.__user_passwords[e] for e in islice(entry_ids, offset, stop)]
+
+        if sort_by is None:
+            return list(islice(self.__user_passwords.values(), offset, stop))
+
+        return [
+            self.__user_passwords[entry_id]
+            for entry_id in self.__sort_index(sort_by).page(offset, limit, descending)
+        ]
+
+    def count_entries(self, group: str | None = None) -> int:
         """
-        Returns a list of all passwords
+        Returns the number of entries, or of entries in the given group
         """
-        self.__logger.log_with_user('Listing passwords', self.__username)
-        return [entry for entry in self.__user_passwords.values()]
+        if group is None:
+            return len(self.__user_passwords)
+        return self.count_by_group(group)
 
+    @timed('vault.search_by_username')
     def search_by_username(self, username_match: str) -> list[LoginEntry]:
         """
         Returns a list of all password entries containing the input username
         """
-        self.__logger.log_with_user('Searching passwords by username', self.__username)
+        self.__logger.log_with_user(
+            'Searching passwords by username', self.__username, category=Category.READ)
         return list(
             filter(
                 lambda entry: username_match in entry.username,
@@ -126,11 +334,13 @@ class PasswordManager:
                 )
             )
 
+    @timed('vault.search_by_address')
     def search_by_address(self, address_match: str) -> list[LoginEntry]:
         """
         Returns a list of all password entries containing the input address
         """
-        self.__logger.log_with_user('Searching passwords by address', self.__username)
+        self.__logger.log_with_user(
+            'Searching passwords by address', self.__username, category=Category.READ)
         return list(
             filter(
                 lambda entry: address_match in entry.address,
@@ -138,27 +348,489 @@ class PasswordManager:
                 )
             )
 
+    @timed('vault.search_by_groups')
     def search_by_groups(self, *groups_match: str) -> list[LoginEntry]:
         """
         Returns a list of all passwords, where the entry group matches one of the input groups
         """
-        self.__logger.log_with_user('Searching passwords by group', self.__username)
-        return list(
-            filter(
-                lambda entry: entry.group in groups_match,
-                self.__user_passwords.values()
-                )
-            )
+        self.__logger.log_with_user(
+            'Searching passwords by group', self.__username, category=Category.READ)
+        return [
+            self.__user_passwords[entry_id]
+            for group in dict.fromkeys(groups_match)
+            for entry_id in self.__group_index.get(group, ())
+        ]
+
+    @timed('vault.fuzzy_search')
+    def fuzzy_search(self, query: str, limit: int = 20) -> list[LoginEntry]:
+        """
+        Returns up to limit entries whose address, username or group match the query
+        approximately, best match first. Addresses are compared without their scheme,
+        'www.' and trailing slashes
+        """
+        if self.__fuzzy_index is None:
+            self.__fuzzy_index = FuzzyIndex()
+            for entry_id, entry in self.__user_passwords.items():
+                self.__fuzzy_index.add(entry_id, entry.address, entry.username, entry.group)
+
+        self.__logger.log_with_user(
+            'Fuzzy searching passwords', self.__username, category=Category.READ)
+        return [
+            self.__user_passwords[entry_id]
+            for _, entry_id in self.__fuzzy_index.search(query, limit)
+        ]
+
+    def rotation_due(self, moment: datetime | None = None) -> list[tuple[str, LoginEntry]]:
+        """
+        Returns (due date, entry) for every entry whose password is due for rotation
+        at moment (now by default), the longest overdue first
+        """
+        moment = (moment or datetime.now()).strftime(TIME_FORMAT)
+        return [
+            (due, self.__user_passwords[entry_id])
+            for due, entry_id in self.__rotation.due_before(moment)
+        ]
+
+    def next_rotation(self) -> tuple[str, LoginEntry] | None:
+        """
+        Returns the (due date, entry) of the next password rotation, None if no entry has a maximum age
+        """
+        upcoming = self.__rotation.next_due()
+        if upcoming is None:
+            return None
+        return upcoming[0], self.__user_passwords[upcoming[1]]
+
+    def find_duplicates(self, address: str, username: str) -> list[LoginEntry]:
+        """
+        Returns the entries for the same site and username, compared by duplicate_key
+        """
+        return [
+            self.__user_passwords[entry_id]
+            for entry_id in self.__duplicates().get(duplicate_key(address, username), ())
+        ]
+
+    def duplicate_groups(self) -> list[list[LoginEntry]]:
+        """
+        Returns every set of two or more entries for the same site and username
+        """
+        return [
+            [self.__user_passwords[entry_id] for entry_id in entry_ids]
+            for entry_ids in self.__duplicates().values() if len(entry_ids) > 1
+        ]
+
+    @timed('vault.merge_duplicates')
+    def merge_duplicates(self) -> dict[str, list[str]]:
+        """
+        Merges every group of duplicates into its most recently updated entry with a single
+        save. The survivor takes the group of the first entry that has one and the shortest
+        rotation period; the merged entries are recorded in their history like a delete.
+        Passwords of merged entries that differ from the survivor's are recorded as previous
+        passwords of the survivor, so they stay reachable from its history.
+        Returns the merged entry ids per surviving entry id
+        """
+        merged: dict[str, list[str]] = {}
+        now = datetime.now().strftime(TIME_FORMAT)
+        for group in self.duplicate_groups():
+            group.sort(key=lambda e: e.updated_at, reverse=True)
+            survivor, others = group[0], group[1:]
+
+            passwords = encryption.decrypt_many([e.password for e in group], self.__data_key)
+            dropped = {}
+            for entry, password in zip(reversed(others), reversed(passwords[1:])):
+                if password != passwords[0]:
+                    dropped.setdefault(password, entry.password)
+            for token in dropped.values():
+                self.__history.record(survivor.id, {'password': token}, now)
+
+            self.__unindex_entry(survivor.id, survivor)
+            survivor.group = survivor.group or next((e.group for e in others if e.group), '')
+            max_ages = [e.max_age_days for e in group if e.max_age_days is not None]
+            survivor.max_age_days = min(max_ages, default=None)
+            self.__sealed.pop(survivor.id, None)
+            self.__index_entry(survivor.id, survivor)
+
+            for entry in others:
+                del self.__user_passwords[entry.id]
+                self.__history.record(
+                    entry.id,
+                    {name: getattr(entry, name) for name in HISTORY_FIELDS + ('password',)},
+                    now)
+                self.__unindex_entry(entry.id, entry)
+                self.__sealed.pop(entry.id, None)
+                self.__index.remove(entry.id)
+                self.__attachment_store().move_entry(entry.id, survivor.id)
+
+            merged[survivor.id] = [entry.id for entry in others]
+
+        if merged:
+            self.__save_passwords()
+
+        self.__logger.log_with_user(
+            f'Merged {sum(map(len, merged.values()))} duplicate entries', self.__username,
+            category=Category.WRITE)
+        return merged
+
+    def count_by_group(self, group: str) -> int:
+        """
+        Returns the number of entries in the given group
+        """
+        return len(self.__group_index.get(group, ()))
+
+    def group_counts(self) -> dict[str, int]:
+        """
+        Returns the number of entries for every group that has at least one entry
+        """
+        return {group: len(ids) for group, ids in self.__group_index.items()}
+
+    @timed('vault.rename_group')
+    def rename_group(self, old_group: str, new_group: str) -> int:
+        """
+        Moves every entry of old_group to new_group with a single save,
+        returns the number of updated entries
+        """
+        moved = self.__move_group(old_group, new_group)
+
+        self.__logger.log_with_user(
+            f'Renamed group {old_group} to {new_group} ({moved} entries)', self.__username,
+            category=Category.WRITE)
+        return moved
+
+    @timed('vault.delete_group')
+    def delete_group(self, group: str) -> int:
+        """
+        Removes the group from every entry it is set on with a single save,
+        returns the number of updated entries
+        """
+        moved = self.__move_group(group, '')
+
+        self.__logger.log_with_user(
+            f'Removed group {group} from {moved} entries', self.__username,
+            category=Category.WRITE)
+        return moved
+
+    @timed('vault.audit')
+    def audit(self) -> AuditReport:
+        """
+        Scores every password and groups entries sharing the same password.
+        Results are cached per entry, so only entries changed since the last audit
+        are decrypted and scored again
+        """
+        changed = [
+            (entry_id, entry) for entry_id, entry in self.__user_passwords.items()
+            if self.__audit_cache.get(entry_id, ('', ''))[:2] != (entry.updated_at, entry.password)
+        ]
+
+        plaintexts = encryption.decrypt_many(
+            [entry.password for _, entry in changed], self.__data_key)
+        strengths = score_passwords(plaintexts)
+
+        for (entry_id, entry), plain, strength in zip(changed, plaintexts, strengths):
+            digest = hmac.new(self.__data_key, plain.encode(), sha256).digest()
+            self.__audit_cache[entry_id] = (entry.updated_at, entry.password, strength, digest)
+
+        for entry_id in [e for e in self.__audit_cache if e not in self.__user_passwords]:
+            del self.__audit_cache[entry_id]
+
+        report = AuditReport()
+        by_digest: dict[bytes, list[str]] = {}
+        for entry_id, (_, _, strength, digest) in self.__audit_cache.items():
+            report.scores[entry_id] = strength
+            if strength.weak:
+                report.weak.append(entry_id)
+            by_digest.setdefault(digest, []).append(entry_id)
+
+        report.reused = [ids for ids in by_digest.values() if len(ids) > 1]
+
+        self.__logger.log_with_user(
+            f'Audited {len(report.scores)} passwords ({len(changed)} rescored)', self.__username,
+            category=Category.READ)
+        return report
+
+    @timed('vault.check_breaches')
+    def check_breaches(self, checker: BreachChecker) -> list[str]:
+        """
+        Returns the ids of all entries whose password appears in the breach corpus
+        """
+        entry_ids = list(self.__user_passwords)
+        digests = []
+        for entry_id in entry_ids:
+            # Plaintexts only live in a buffer that is wiped once hashed
+            plain = encryption.decrypt_raw(
+                encryption.to_raw(self.__user_passwords[entry_id].password), self.__data_key)
+            digests.append(sha1(plain).digest())
+            encryption.wipe(plain)
+
+        found = checker.contains_many(digests)
+        breached = [entry_id for entry_id, hit in zip(entry_ids, found) if hit]
+
+        self.__logger.log_with_user(
+            f'Checked passwords against breach corpus, {len(breached)} found', self.__username,
+            Level.WARNING if breached else Level.INFO, category=Category.SECURITY)
+        return breached
+
+    def export_records(self, entry_ids: list[str] | None = None) -> list[dict]:
+        """
+        Returns entries in their stored, encrypted form, all of them if entry_ids is None
+        """
+        if entry_ids is None:
+            entry_ids = list(self.__user_passwords)
+
+        return [
+            self.__to_record(entry_id, self.__user_passwords[entry_id])
+            for entry_id in entry_ids if entry_id in self.__user_passwords
+        ]
+
+    @timed('vault.import_records')
+    def import_records(self, records: list[dict], deleted_ids: list[str] = ()) -> None:
+        """
+        Adds or replaces entries given in their stored, encrypted form and deletes
+        deleted_ids, with a single save
+        """
+        sealed = [r for r in records if SEALED_FIELD in r]
+        metadata = encryption.decrypt_many(
+            [r[SEALED_FIELD] for r in sealed], self.__data_key)
+        unsealed = {r['id']: json.loads(plain) for r, plain in zip(sealed, metadata)}
+
+        for record in records:
+            values = {f.name: record.get(f.name) for f in fields(LoginEntry)}
+            values.update(unsealed.get(record['id'], {}))
+            entry = LoginEntry(**values)
+
+            previous = self.__user_passwords.get(entry.id)
+            if previous is not None:
+                self.__unindex_entry(entry.id, previous)
+            self.__sealed.pop(entry.id, None)
+            if SEALED_FIELD in record:
+                self.__sealed[entry.id] = record[SEALED_FIELD]
+                self.__index.put(entry.id, IndexRecord(
+                    seal_version(record[SEALED_FIELD]), entry.address, entry.username, entry.group))
+            self.__user_passwords[entry.id] = entry
+            self.__index_entry(entry.id, entry)
+
+        for entry_id in deleted_ids:
+            entry = self.__user_passwords.pop(entry_id, None)
+            if entry is None:
+                continue
+            self.__unindex_entry(entry_id, entry)
+            self.__sealed.pop(entry_id, None)
+            self.__index.remove(entry_id)
+            self.__attachment_store().delete_entry(entry_id)
+
+        self.__save_passwords()
+
+        self.__logger.log_with_user(
+            f'Imported {len(records)} entries, removed {len(deleted_ids)}', self.__username,
+            category=Category.WRITE)
+
+    @timed('vault.attach_file')
+    def attach_file(self, entry_id: str, name: str, source: BinaryIO) -> Attachment:
+        """
+        Attaches the content of a binary stream to an entry, e.g. an SSH key or certificate.
+        It is encrypted in chunks as it is read, so files of any size use little memory
+        """
+        self.__check_entry(entry_id)
+        attachment = self.__attachment_store().add(
+            entry_id, name, source, datetime.now().strftime(TIME_FORMAT))
+        self.__logger.log_with_user(
+            f'Attached {attachment.id} to entry {entry_id}', self.__username,
+            category=Category.WRITE)
+        return attachment
+
+    @timed('vault.attach_note')
+    def attach_note(self, entry_id: str, title: str, text: str) -> Attachment:
+        """Attaches a secure note to an entry, e.g. recovery codes"""
+        self.__check_entry(entry_id)
+        attachment = self.__attachment_store().add_note(
+            entry_id, title, text, datetime.now().strftime(TIME_FORMAT))
+        self.__logger.log_with_user(
+            f'Attached note {attachment.id} to entry {entry_id}', self.__username,
+            category=Category.WRITE)
+        return attachment
+
+    def list_attachments(self, entry_id: str) -> list[Attachment]:
+        """Returns the files and notes attached to an entry"""
+        self.__check_entry(entry_id)
+        return self.__attachment_store().for_entry(entry_id)
+
+    @timed('vault.read_attachment')
+    def read_attachment(self, attachment_id: str, target: BinaryIO) -> int:
+        """Writes the decrypted content of an attachment to a binary stream, returns its size"""
+        written = self.__attachment_store().read(attachment_id, target)
+        self.__logger.log_with_user(
+            f'Read attachment {attachment_id}', self.__username, category=Category.SECURITY)
+        return written
+
+    def read_note(self, attachment_id: str) -> str:
+        """Returns the text of a note attached to an entry"""
+        text = self.__attachment_store().read_note(attachment_id)
+        self.__logger.log_with_user(
+            f'Read attachment {attachment_id}', self.__username, category=Category.SECURITY)
+        return text
+
+    @timed('vault.delete_attachment')
+    def delete_attachment(self, attachment_id: str) -> None:
+        """Removes an attachment, raises InvalidAttachmentException if it doesn't exist"""
+        self.__attachment_store().delete(attachment_id)
+        self.__logger.log_with_user(
+            f'Deleted attachment {attachment_id}', self.__username, category=Category.WRITE)
 
     def get_username(self) -> str:
         """Returns the username of the current user"""
         return self.__username
 
+    def members(self) -> list[str]:
+        """Returns the users able to open the vault"""
+        return self.__keyring.members()
+
+    def add_member(self, username: str, member_key: bytes) -> None:
+        """
+        Shares the vault with a user, given the key derived from their master password.
+        Only the data key is wrapped again, no entry is re-encrypted
+        """
+        self.__keyring.add_member(username, member_key, self.__data_key)
+        self.__logger.log_with_user(
+            f'Shared vault {self.__vault} with {username}', self.__username,
+            category=Category.SECURITY)
+
+    def remove_member(self, username: str) -> None:
+        """
+        Stops sharing the vault with a user. Their copy of the data key still opens
+        entries they could have saved before, rotate the passwords that matter
+        """
+        self.__keyring.remove_member(username)
+        self.__logger.log_with_user(
+            f'Removed {username} from vault {self.__vault}', self.__username,
+            category=Category.SECURITY)
+
+    def wrapped_key(self) -> str:
+        """Returns the data key wrapped with the current user's key, for other replicas"""
+        return wrap(self.__data_key, self.__member_key)
+
+    def agree_data_key(self, wrapped: str) -> bool:
+        """
+        Compares the data key of a replica of this vault, given as returned by its
+        wrapped_key(), with this one's. A vault without entries or history takes the
+        replica's key, so a new replica can sync with an existing one.
+        Returns whether both now use the same data key
+        """
+        try:
+            data_key = encryption.decrypt(wrapped, self.__member_key).encode()
+        except InvalidToken:
+            return False
+        if data_key == self.__data_key:
+            return True
+        if self.__user_passwords or self.__history_path().exists() \
+                or self.__keyring.members() != [self.__username]:
+            return False
+
+        self.__keyring.add_member(self.__username, self.__member_key, data_key)
+        self.__data_key = data_key
+        self.__store = self.__open_store(self.__vault_format)
+        self.__index = SearchIndex(self.__path / f'{self.__vault}.index', data_key)
+        self.__attachments = None
+        self.__save_passwords()
+
+        self.__logger.log_with_user(
+            f'Vault {self.__vault} adopted the data key of a replica', self.__username,
+            category=Category.SECURITY)
+        return True
+
+
+    def copy_entry_password(self, entry_id: str) -> Future:
+        """
+        Copies the password of an entry to the clipboard like copy_password_to_clipboard,
+        passing it as a bytearray wiped once the clipboard has it
+        """
+        return CLIPBOARD.copy(self.fetch_password_raw(entry_id))
 
     @staticmethod
-    def copy_password_to_clipboard(password: str) -> None:
-        """Copies the given password to the clipboard"""
-        pyperclip.copy(password)
+    def copy_password_to_clipboard(password: str) -> Future:
+        """
+        Copies the given password to the clipboard in the background,
+        it is cleared after CLIPBOARD_CLEAR_SECONDS if still there
+        """
+        return CLIPBOARD.copy(password)
+
+    def __move_group(self, old_group: str, new_group: str) -> int:
+        if old_group == new_group or old_group not in self.__group_index:
+            return 0
+
+        by_group = self.__sort_indexes.get('group')
+        entry_ids = self.__group_index.pop(old_group)
+        for entry_id in entry_ids:
+            entry = self.__user_passwords[entry_id]
+            if by_group is not None:
+                by_group.remove(entry_id, entry)
+            entry.group = new_group
+            if by_group is not None:
+                by_group.add(entry_id, entry)
+            self.__sealed.pop(entry_id, None)
+            if self.__fuzzy_index is not None:
+                self.__fuzzy_index.add(entry_id, entry.address, entry.username, new_group)
+        self.__group_index.setdefault(new_group, {}).update(entry_ids)
+        self.__save_passwords()
+
+        return len(entry_ids)
+
+    def __sort_index(self, field: str) -> SortIndex:
+        if field not in self.__sort_indexes:
+            self.__sort_indexes[field] = SortIndex(field, self.__user_passwords)
+        return self.__sort_indexes[field]
+
+    def __duplicates(self) -> dict[tuple[str, str], dict[str, None]]:
+        if self.__duplicate_index is None:
+            self.__duplicate_index = {}
+            for entry_id, entry in self.__user_passwords.items():
+                self.__duplicate_index.setdefault(
+                    duplicate_key(entry.address, entry.username), {})[entry_id] = None
+        return self.__duplicate_index
+
+    def __index_entry(self, entry_id: str, entry: LoginEntry) -> None:
+        self.__group_index.setdefault(entry.group, {})[entry_id] = None
+        if self.__duplicate_index is not None:
+            self.__duplicate_index.setdefault(
+                duplicate_key(entry.address, entry.username), {})[entry_id] = None
+        self.__rotation.schedule(entry_id, rotation_due_date(entry))
+        for sort_index in self.__sort_indexes.values():
+            sort_index.add(entry_id, entry)
+        if self.__fuzzy_index is not None:
+            self.__fuzzy_index.add(entry_id, entry.address, entry.username, entry.group)
+
+    def __unindex_entry(self, entry_id: str, entry: LoginEntry) -> None:
+        self.__rotation.remove(entry_id)
+        if self.__duplicate_index is not None:
+            key = duplicate_key(entry.address, entry.username)
+            duplicates = self.__duplicate_index.get(key, {})
+            duplicates.pop(entry_id, None)
+            if not duplicates:
+                self.__duplicate_index.pop(key, None)
+        if self.__fuzzy_index is not None:
+            self.__fuzzy_index.remove(entry_id)
+        for sort_index in self.__sort_indexes.values():
+            sort_index.remove(entry_id, entry)
+
+        entry_ids = self.__group_index.get(entry.group)
+        if entry_ids is None:
+            return
+
+        entry_ids.pop(entry_id, None)
+        if not entry_ids:
+            del self.__group_index[entry.group]
+
+    def __vault_stamp(self) -> list:
+        stat = self.__store.path.stat()
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def __load_rotation(self) -> RotationSchedule:
+        rotation = RotationSchedule(self.__path / f'{self.__vault}.rotation')
+        if not rotation.load(self.__vault_stamp()):
+            rotation.rebuild({
+                entry_id: rotation_due_date(entry)
+                for entry_id, entry in self.__user_passwords.items()
+                if entry.max_age_days is not None
+            })
+            rotation.save(self.__vault_stamp())
+        return rotation
 
     def __init_dirs(self, storage_path: Path | str | None) -> Path:
         self.__logger.log_with_user('Initializing password manager', self.__username)
@@ -172,26 +844,190 @@ class PasswordManager:
 
         return base_dir
 
+    def __open_keyring(self) -> bytes:
+        if self.__keyring.exists():
+            data_key = self.__keyring.unwrap(self.__username, self.__member_key)
+            self.__finish_rekey()
+            return data_key
+        if self.__vault != self.__username:
+            raise VaultAccessException(f'Vault {self.__vault} does not exist')
+
+        # Files of a re-encryption that stopped before the keyring was written
+        for suffix in ('.json', '.vault', '.history'):
+            (self.__path / f'{self.__vault}{suffix}{REKEY_SUFFIX}').unlink(missing_ok=True)
+
+        # Entries of vaults older than keyrings are encrypted with the member key itself.
+        # They are loaded with it and re-encrypted with a new data key by __rekey_legacy,
+        # sharing the vault must never hand out the member's own key
+        if any((self.__path / f'{self.__vault}{suffix}').exists()
+               for suffix in ('.json', '.vault')):
+            return self.__member_key
+
+        data_key = self.__keyring.create(self.__username, self.__member_key)
+        self.__logger.log_with_user(
+            f'Created the keyring of vault {self.__vault}', self.__username,
+            category=Category.SECURITY)
+        return data_key
+
+    def __rekey_legacy(self) -> None:
+        old_key, data_key = self.__data_key, Fernet.generate_key()
+        entries = list(self.__user_passwords.values())
+        passwords = encryption.decrypt_many([entry.password for entry in entries], old_key)
+        for entry, token in zip(entries, encryption.encrypt_many(passwords, data_key)):
+            entry.password = token
+
+        self.__data_key = data_key
+        self.__sealed.clear()
+        self.__index.clear()
+        self.__index = SearchIndex(self.__path / f'{self.__vault}.index', data_key)
+
+        # The re-encrypted files are written next to the vault's and only moved in place
+        # once the keyring holding the new key exists, see __finish_rekey
+        store_path = self.__store.path
+        rekeyed = store_path.with_name(store_path.name + REKEY_SUFFIX)
+        store = JsonVaultStore(rekeyed) if isinstance(self.__store, JsonVaultStore) \
+            else BinaryVaultStore(rekeyed, data_key, token_fields=TOKEN_FIELDS)
+        store.write([self.__to_record(k, entry) for k, entry in self.__user_passwords.items()])
+        pending = [store_path.name]
+
+        history_path = self.__history_path()
+        if history_path.exists():
+            self.__history.export(
+                history_path.with_name(history_path.name + REKEY_SUFFIX),
+                lambda token: encryption.encrypt(encryption.decrypt(token, old_key), data_key))
+            pending.append(history_path.name)
+
+        self.__keyring.create(self.__username, self.__member_key, data_key, pending)
+        self.__finish_rekey()
+        self.__store = self.__open_store(self.__vault_format)
+        self.__index.flush()
+        self.__rotation.save(self.__vault_stamp())
+
+        self.__logger.log_with_user(
+            f'Created the keyring of vault {self.__vault} and re-encrypted '
+            f'{len(entries)} entries with its data key', self.__username,
+            category=Category.SECURITY)
+
+    def __finish_rekey(self) -> None:
+        for name in self.__keyring.pending():
+            rekeyed = self.__path / f'{name}{REKEY_SUFFIX}'
+            if rekeyed.exists():
+                rekeyed.replace(self.__path / name)
+        self.__keyring.clear_pending()
+
+    def __check_entry(self, entry_id: str) -> None:
+        if entry_id not in self.__user_passwords:
+            raise InvalidEntryException(entry_id)
+
+    def __attachment_store(self) -> AttachmentStore:
+        if self.__attachments is None:
+            self.__attachments = AttachmentStore(
+                self.__path / f'{self.__vault}.attachments', self.__data_key)
+        return self.__attachments
+
+    def __history_path(self) -> Path:
+        return self.__path / f'{self.__vault}.history'
+
+    def __open_store(self, vault_format: str) -> JsonVaultStore | BinaryVaultStore:
+        if vault_format not in ('json', 'binary'):
+            raise ValueError(f'Unknown vault format: {vault_format}')
+
+        json_store = JsonVaultStore(self.__path / f'{self.__vault}.json')
+        store = BinaryVaultStore(
+            self.__path / f'{self.__vault}.vault', self.__data_key, token_fields=TOKEN_FIELDS)
+        # A vault migrated to the binary format stays in it whatever format is configured
+        if vault_format == 'json' and not store.exists():
+            return json_store
+        if not store.exists() and json_store.exists():
+            migrated = migrate_json_to_binary(
+                json_store.path, store.path, self.__data_key, token_fields=TOKEN_FIELDS)
+            self.__logger.log_with_user(
+                f'Migrated {migrated} entries to the binary vault format', self.__username)
+
+        return store
+
+    @timed('vault.load')
     def __load_passwords(self) -> dict[str, LoginEntry]:
         # TODO: file exceptions
-        user_file = self.__path / f'{self.__username}.json'
+        if not self.__store.exists():
+            self.__store.create()
 
-        if not user_file.exists():
-            user_file.write_text(
-                json.dumps({}),
-                encoding='utf-8'
-            )
+        columns = self.__store.read_columns()
+        entry_ids = columns.get('id', [])
+        missing = [None] * len(entry_ids)
+        entries = dict(zip(entry_ids, map(
+            LoginEntry, *(columns.get(f.name, missing) for f in fields(LoginEntry)))))
 
-        passwords = json.loads(user_file.read_text(encoding='utf-8'))
+        stale = []
+        for entry_id, sealed in zip(entry_ids, columns.get(SEALED_FIELD, ())):
+            if sealed is None:
+                continue
+
+            self.__sealed[entry_id] = sealed
+            cached = self.__index.get(entry_id)
+            if cached is None or cached.version != seal_version(sealed):
+                stale.append((entry_id, sealed))
+            else:
+                self.__unseal(entries[entry_id], cached)
+
+        for start in range(0, len(stale), UNSEAL_BATCH_SIZE):
+            batch = stale[start:start + UNSEAL_BATCH_SIZE]
+            metadata = encryption.decrypt_many([sealed for _, sealed in batch], self.__data_key)
+
+            for (entry_id, sealed), plain in zip(batch, metadata):
+                values = json.loads(plain)
+                cached = IndexRecord(
+                    seal_version(sealed), values['address'], values['username'], values['group'])
+                self.__index.put(entry_id, cached)
+                self.__unseal(entries[entry_id], cached)
+
+        self.__index.retain(set(entries))
+        self.__index.flush()
 
         self.__logger.log_with_user('Loaded passwords', self.__username)
-        return {entry['id']:LoginEntry(**entry) for entry in passwords}
+        return entries
 
-    def __save_passwords(self) -> None:
-        user_file = self.__path / f'{self.__username}.json'
+    @staticmethod
+    def __unseal(entry: LoginEntry, cached: IndexRecord) -> None:
+        entry.address = cached.address
+        entry.username = cached.username
+        entry.group = cached.group
+
+    def __seal(self, entry_id: str, entry: LoginEntry) -> dict:
+        sealed = self.__sealed.get(entry_id)
+        if sealed is None:
+            values = {'address': entry.address, 'username': entry.username, 'group': entry.group}
+            sealed = encryption.encrypt(json.dumps(values), self.__data_key)
+            self.__sealed[entry_id] = sealed
+            self.__index.put(entry_id, IndexRecord(
+                seal_version(sealed), entry.address, entry.username, entry.group))
+
+        record = {
+            'id': entry.id,
+            'password': entry.password,
+            SEALED_FIELD: sealed,
+            'created_at': entry.created_at,
+            'updated_at': entry.updated_at,
+            'max_age_days': entry.max_age_days,
+            'password_changed_at': entry.password_changed_at,
+        }
+        return {name: value for name, value in record.items() if value is not None}
 
-        passwords = json.dumps([asdict(ent) for ent in self.__user_passwords.values()])
+    def __to_record(self, entry_id: str, entry: LoginEntry) -> dict:
+        if self.__encrypt_metadata:
+            return self.__seal(entry_id, entry)
+        return {name: value for name, value in asdict(entry).items() if value is not None}
+
+    @timed('vault.save')
+    def __save_passwords(self) -> None:
+        records = [self.__to_record(k, ent) for k, ent in self.__user_passwords.items()]
+        if not self.__encrypt_metadata:
+            if len(self.__index) > 0:
+                self.__sealed.clear()
+                self.__index.clear()
 
-        user_file.write_text(passwords, encoding='utf-8')
+        self.__store.write(records)
+        self.__index.flush()
+        self.__rotation.save(self.__vault_stamp())
 
         self.__logger.log_with_user('Saved passwords', self.__username)
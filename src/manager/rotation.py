@@ -0,0 +1,116 @@
+"""
+Persistent schedule of password rotations, a min-heap of due dates
+"""
+import heapq
+import json
+from pathlib import Path
+from typing import Iterator
+
+# Stale heap items tolerated before the heap is rebuilt
+COMPACT_SLACK = 64
+
+
+class RotationSchedule:
+    """
+    Keeps (due date, entry id) pairs in a binary heap, so the next due rotation is found
+    without looking at every entry. Rescheduling pushes a new pair and leaves the old one
+    behind until the heap is compacted; a pair is only valid while it matches the current
+    due date of its entry, and is never pushed twice. Due dates are strings in a sortable
+    timestamp format.
+
+    The heap is saved with the due date per entry and a stamp of the vault file it belongs
+    to, and only trusted on load when the stamp still matches.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.__due: dict[str, str] = {}
+        self.__heap: list[tuple[str, str]] = []
+        self.__pairs: set[tuple[str, str]] = set()
+
+    def __len__(self) -> int:
+        return len(self.__due)
+
+    def load(self, stamp: list) -> bool:
+        """ Loads the saved schedule, returns False when it's missing or out of date """
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False
+        if data.get('stamp') != stamp:
+            return False
+
+        self.__heap = [tuple(item) for item in data['heap']]
+        self.__pairs = set(self.__heap)
+        # Schedules saved without due dates were always compacted
+        self.__due = data.get('due') or {entry_id: due for due, entry_id in self.__heap}
+        return True
+
+    def save(self, stamp: list) -> None:
+        """ Writes the schedule, stamped with the state of the vault file """
+        self.__compact_if_needed()
+        tmp = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp.write_text(json.dumps({'stamp': stamp, 'due': self.__due, 'heap': self.__heap}),
+                       encoding='utf-8')
+        tmp.replace(self.path)
+
+    def rebuild(self, due_dates: dict[str, str]) -> None:
+        """ Replaces the schedule with the given due date per entry id """
+        self.__due = dict(due_dates)
+        self.__compact()
+
+    def schedule(self, entry_id: str, due: str | None) -> None:
+        """ Sets the due date of an entry, None removes it from the schedule """
+        if due is None:
+            self.remove(entry_id)
+            return
+        if self.__due.get(entry_id) == due:
+            return
+
+        self.__due[entry_id] = due
+        # A pair left behind by remove() is valid again instead of being pushed twice
+        if (due, entry_id) not in self.__pairs:
+            self.__pairs.add((due, entry_id))
+            heapq.heappush(self.__heap, (due, entry_id))
+        self.__compact_if_needed()
+
+    def remove(self, entry_id: str) -> None:
+        """ Removes an entry from the schedule """
+        self.__due.pop(entry_id, None)
+
+    def next_due(self) -> tuple[str, str] | None:
+        """ Returns the earliest (due date, entry id), dropping stale pairs on the way """
+        heap = self.__heap
+        while heap and self.__due.get(heap[0][1]) != heap[0][0]:
+            self.__pairs.discard(heapq.heappop(heap))
+        return heap[0] if heap else None
+
+    def due_before(self, moment: str) -> list[tuple[str, str]]:
+        """
+        Returns every (due date, entry id) due at or before moment, earliest first.
+        Walks only the part of the heap above moment, so it costs O(k log n) for k results
+        """
+        heap = self.__heap
+        result = []
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            (due, entry_id), position = heapq.heappop(frontier)
+            if due > moment:
+                continue
+            if self.__due.get(entry_id) == due:
+                result.append((due, entry_id))
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return result
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        return iter(sorted((due, entry_id) for entry_id, due in self.__due.items()))
+
+    def __compact_if_needed(self) -> None:
+        if len(self.__heap) - len(self.__due) > len(self.__due) + COMPACT_SLACK:
+            self.__compact()
+
+    def __compact(self) -> None:
+        self.__heap = [(due, entry_id) for entry_id, due in self.__due.items()]
+        heapq.heapify(self.__heap)
+        self.__pairs = set(self.__heap)
@@ -0,0 +1,118 @@
+"""
+Encrypted index of entry metadata, used to unlock fully encrypted vaults
+without decrypting every entry
+"""
+import json
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+
+from cryptography.fernet import InvalidToken
+
+import src.common.encryption as encryption
+
+
+@dataclass
+class IndexRecord:
+    """
+    IndexRecord holds the plaintext metadata of a single sealed entry
+    """
+    version: str
+    address: str
+    username: str
+    group: str
+
+
+def seal_version(sealed: str) -> str:
+    """ Returns a short fingerprint of a sealed token, which changes on every re-encryption """
+    return sha256(sealed.encode()).hexdigest()[:16]
+
+
+class SearchIndex:
+    """
+    In-memory index of sealed entry metadata, persisted as an encrypted file.
+    The file holds one snapshot token followed by one delta token per flush,
+    and is rewritten as a single snapshot once too many deltas pile up.
+    """
+    def __init__(self, path: Path, key: bytes, compact_after: int = 64):
+        self.__path = path
+        self.__key = key
+        self.__compact_after = compact_after
+        self.__records: dict[str, IndexRecord] = {}
+        self.__pending: dict[str, IndexRecord | None] = {}
+        self.__deltas = 0
+        self.__load()
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    def get(self, entry_id: str) -> IndexRecord | None:
+        """ Returns the indexed metadata of an entry, None if it is not indexed """
+        return self.__records.get(entry_id)
+
+    def put(self, entry_id: str, record: IndexRecord) -> None:
+        """ Adds or replaces the metadata of an entry """
+        self.__records[entry_id] = record
+        self.__pending[entry_id] = record
+
+    def remove(self, entry_id: str) -> None:
+        """ Removes an entry from the index """
+        if self.__records.pop(entry_id, None) is not None:
+            self.__pending[entry_id] = None
+
+    def retain(self, entry_ids: set[str]) -> None:
+        """ Drops every indexed entry that is not part of entry_ids """
+        for entry_id in [e for e in self.__records if e not in entry_ids]:
+            self.remove(entry_id)
+
+    def clear(self) -> None:
+        """ Empties the index and removes its file """
+        self.__records.clear()
+        self.__pending.clear()
+        self.__deltas = 0
+        self.__path.unlink(missing_ok=True)
+
+    def flush(self) -> None:
+        """ Persists pending changes as an encrypted delta, compacting when needed """
+        if not self.__pending:
+            return
+
+        if self.__deltas >= self.__compact_after or not self.__path.exists():
+            payload = {k: self.__to_row(v) for k, v in self.__records.items()}
+            self.__path.write_text(
+                encryption.encrypt(json.dumps(payload), self.__key) + '\n', encoding='utf-8')
+            self.__deltas = 0
+        else:
+            payload = {k: self.__to_row(v) for k, v in self.__pending.items()}
+            with self.__path.open('a', encoding='utf-8') as f:
+                f.write(encryption.encrypt(json.dumps(payload), self.__key) + '\n')
+            self.__deltas += 1
+
+        self.__pending.clear()
+
+    def __load(self) -> None:
+        if not self.__path.exists():
+            return
+
+        tokens = self.__path.read_text(encoding='utf-8').split()
+        try:
+            chunks = encryption.decrypt_many(tokens, self.__key)
+        except InvalidToken:
+            # the index is only a cache, a damaged one is rebuilt from the vault
+            self.__path.unlink()
+            return
+
+        for chunk in chunks:
+            for entry_id, row in json.loads(chunk).items():
+                if row is None:
+                    self.__records.pop(entry_id, None)
+                else:
+                    self.__records[entry_id] = IndexRecord(*row)
+
+        self.__deltas = max(len(tokens) - 1, 0)
+
+    @staticmethod
+    def __to_row(record: IndexRecord | None) -> list[str] | None:
+        if record is None:
+            return None
+        return [record.version, record.address, record.username, record.group]
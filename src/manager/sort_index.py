@@ -0,0 +1,60 @@
+"""
+Sorted views of vault entries, kept up to date as entries change
+"""
+from bisect import bisect_left, insort
+from typing import Any, Callable
+
+# Text fields sort case-insensitively, timestamps already sort as strings
+SORT_KEYS: dict[str, Callable[[str], str]] = {
+    'address': str.casefold,
+    'username': str.casefold,
+    'group': str.casefold,
+    'created_at': str,
+    'updated_at': str,
+}
+
+
+class SortIndex:
+    """
+    Keeps (key, entry id) pairs of one field in sorted order, so a page of sorted
+    entries is a slice instead of a sort of the whole vault. Insertions and removals
+    are a binary search and a shift of the underlying list.
+    """
+    def __init__(self, field: str, entries: dict[str, Any]):
+        if field not in SORT_KEYS:
+            raise ValueError(f'Entries can not be sorted by {field}')
+
+        self.field = field
+        self.__key = SORT_KEYS[field]
+        self.__items = sorted((self.key(entry), entry_id) for entry_id, entry in entries.items())
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def key(self, entry: Any) -> str:
+        """ Returns the sort key of an entry """
+        return self.__key(getattr(entry, self.field))
+
+    def add(self, entry_id: str, entry: Any) -> None:
+        """ Inserts an entry at its sorted position """
+        insort(self.__items, (self.key(entry), entry_id))
+
+    def remove(self, entry_id: str, entry: Any) -> None:
+        """ Removes an entry, entry must hold the values it was added with """
+        item = (self.key(entry), entry_id)
+        position = bisect_left(self.__items, item)
+        if position < len(self.__items) and self.__items[position] == item:
+            del self.__items[position]
+
+    def page(self, offset: int = 0, limit: int | None = None, descending: bool = False) -> list[str]:
+        """ Returns the ids of the entries at [offset, offset + limit) in sort order """
+        size = len(self.__items)
+        offset = max(offset, 0)
+        end = size if limit is None else min(size, offset + max(limit, 0))
+        if offset >= end:
+            return []
+        if descending:
+            items = self.__items[size - end:size - offset][::-1]
+        else:
+            items = self.__items[offset:end]
+        return [entry_id for _, entry_id in items]
@@ -0,0 +1,328 @@
+"""
+Storage backends for vault files: the original JSON array and a compact binary format
+"""
+import base64
+import binascii
+import hmac
+import json
+import struct
+import sys
+import zlib
+from array import array
+from hashlib import sha256
+from itertools import accumulate, repeat
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from src.common.exceptions import CorruptedVaultException
+
+MAGIC = b'PMVT'
+VERSION = 2
+# Version 1 files lack token columns and read the same
+READABLE_VERSIONS = (1, 2)
+HEADER = struct.Struct('<4sBBHI')
+DIGEST_SIZE = 32
+
+FLAG_ZLIB = 1
+FLAG_ZSTD = 2
+FLAG_HMAC = 4
+
+KIND_STR = 0
+KIND_INT = 1
+KIND_STR_SEPARATED = 2
+KIND_TOKEN = 3
+SEPARATOR = '\0'
+BASE64_INDEX = {c: i for i, c in enumerate(
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_')}
+
+
+class JsonVaultStore:
+    """
+    Stores vault records as a JSON array of dicts
+    """
+    def __init__(self, path: Path):
+        self.path = path
+
+    def exists(self) -> bool:
+        """ Returns whether the vault file exists """
+        return self.path.exists()
+
+    def create(self) -> None:
+        """ Creates an empty vault file """
+        self.path.write_text(json.dumps({}), encoding='utf-8')
+
+    def read(self) -> list[dict]:
+        """ Returns all records of the vault """
+        return list(json.loads(self.path.read_text(encoding='utf-8')))
+
+    def read_columns(self) -> dict[str, list]:
+        """
+        Returns the values of every field in record order, None where a record lacks the field
+        """
+        records = self.read()
+        names = dict.fromkeys(name for record in records for name in record)
+
+        return {name: [record.get(name) for record in records] for name in names}
+
+    def write(self, records: list[dict]) -> None:
+        """ Replaces the vault with the given records """
+        self.path.write_text(json.dumps(records), encoding='utf-8')
+
+
+class BinaryVaultStore:
+    """
+    Stores vault records column by column: every field is written once as a name,
+    a presence mask and either the packed integers or one UTF-8 blob of all values,
+    separated by NUL characters (or preceded by their lengths if a value contains NUL),
+    so a column is parsed with a single split. The body is optionally compressed and the file
+    ends with an HMAC-SHA256 (SHA-256 without a key) of everything before it,
+    so corruption is detected before any record is parsed.
+
+    Fields listed in token_fields hold Fernet tokens, which are stored as their raw
+    bytes (preceded by their lengths) rather than base64 text.
+    """
+    def __init__(self, path: Path, key: bytes | None = None, compression: str = 'zlib',
+                 token_fields: tuple[str, ...] = ()):
+        if compression not in ('none', 'zlib', 'zstd'):
+            raise ValueError(f'Unknown compression: {compression}')
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError('zstd compression requires the zstandard package')
+
+        self.path = path
+        self.__key = None if key is None else hmac.new(key, b'vault-integrity', sha256).digest()
+        self.__compression = compression
+        self.__token_fields = token_fields
+
+    def exists(self) -> bool:
+        """ Returns whether the vault file exists """
+        return self.path.exists()
+
+    def create(self) -> None:
+        """ Creates an empty vault file """
+        self.write([])
+
+    def read(self) -> list[dict]:
+        """ Returns all records of the vault, raising CorruptedVaultException on damage """
+        columns = self.read_columns()
+        names = list(columns)
+        rows = zip(*columns.values())
+
+        if all(None not in values for values in columns.values()):
+            return list(map(dict, map(zip, repeat(names), rows)))
+
+        return [
+            {name: value for name, value in zip(names, row) if value is not None}
+            for row in rows
+        ]
+
+    def read_columns(self) -> dict[str, list]:
+        """
+        Returns the values of every field in record order, None where a record lacks
+        the field. Raises CorruptedVaultException on damage
+        """
+        data = self.path.read_bytes()
+        if len(data) < HEADER.size + DIGEST_SIZE:
+            raise CorruptedVaultException(f'{self.path} is truncated')
+
+        magic, version, flags, field_count, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version not in READABLE_VERSIONS:
+            raise CorruptedVaultException(f'{self.path} is not a vault file')
+
+        # The digest type comes from the store, the header flag only has to agree with it:
+        # clearing the flag must not turn the HMAC into a plain hash anyone can recompute
+        if self.__key is not None and not flags & FLAG_HMAC:
+            raise CorruptedVaultException(f'{self.path} is not authenticated with the vault key')
+        if self.__key is None and flags & FLAG_HMAC:
+            raise CorruptedVaultException('The vault is authenticated, a key is required')
+
+        content, digest = data[:-DIGEST_SIZE], data[-DIGEST_SIZE:]
+        if not hmac.compare_digest(self.__digest(content), digest):
+            raise CorruptedVaultException(f'{self.path} failed its integrity check')
+
+        body = content[HEADER.size:]
+        if flags & FLAG_ZSTD:
+            if zstandard is None:
+                raise CorruptedVaultException('zstd compressed vault, zstandard is not installed')
+            body = zstandard.ZstdDecompressor().decompress(body)
+        elif flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+
+        columns = {}
+        offset = 0
+        for _ in range(field_count):
+            name, values, present, offset = self.__read_column(body, offset, count)
+            if present is not None:
+                stored = iter(values)
+                values = [next(stored) if has else None for has in present]
+            columns[name] = values
+
+        return columns
+
+    def write(self, records: list[dict]) -> None:
+        """ Replaces the vault with the given records """
+        names = list(dict.fromkeys(name for record in records for name in record))
+
+        body = bytearray()
+        for name in names:
+            self.__write_column(body, name, records, name in self.__token_fields)
+
+        flags = FLAG_HMAC if self.__key is not None else 0
+        if self.__compression == 'zlib':
+            flags |= FLAG_ZLIB
+            body = zlib.compress(body)
+        elif self.__compression == 'zstd':
+            flags |= FLAG_ZSTD
+            body = zstandard.ZstdCompressor().compress(bytes(body))
+
+        content = HEADER.pack(MAGIC, VERSION, flags, len(names), len(records)) + bytes(body)
+
+        tmp = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp.write_bytes(content + self.__digest(content))
+        tmp.replace(self.path)
+
+    def __digest(self, content: bytes) -> bytes:
+        if self.__key is None:
+            return sha256(content).digest()
+        return hmac.new(self.__key, content, sha256).digest()
+
+    @staticmethod
+    def __write_column(body: bytearray, name: str, records: list[dict], tokens: bool) -> None:
+        missing = object()
+        values = [record.get(name, missing) for record in records]
+        present = bytes(v is not missing for v in values)
+        values = [v for v in values if v is not missing]
+
+        raw = _raw_tokens(values) if tokens else None
+        if raw is not None:
+            kind = KIND_TOKEN
+        elif all(isinstance(v, int) and not isinstance(v, bool) for v in values) and values:
+            kind = KIND_INT
+        elif all(isinstance(v, str) for v in values):
+            kind = KIND_STR if any(SEPARATOR in v for v in values) else KIND_STR_SEPARATED
+        else:
+            raise TypeError(f'Field {name} must hold only strings or only integers')
+
+        encoded_name = name.encode('utf-8')
+        body += struct.pack('<B', len(encoded_name)) + encoded_name
+        body += struct.pack('<BB', kind, 0 if all(present) else 1)
+        if not all(present):
+            body += present
+
+        if kind == KIND_INT:
+            body += _little_endian(array('q', values)).tobytes()
+            return
+
+        if kind == KIND_TOKEN:
+            blob = b''.join(raw)
+            body += _little_endian(array('I', map(len, raw))).tobytes()
+        elif kind == KIND_STR_SEPARATED:
+            blob = SEPARATOR.join(values).encode('utf-8')
+        else:
+            blob = ''.join(values).encode('utf-8')
+            body += _little_endian(array('I', map(len, values))).tobytes()
+        body += struct.pack('<Q', len(blob)) + blob
+
+    @staticmethod
+    def __read_column(body: bytes, offset: int, count: int):
+        try:
+            name_length = body[offset]
+            name = body[offset + 1:offset + 1 + name_length].decode('utf-8')
+            offset += 1 + name_length
+
+            kind, sparse = struct.unpack_from('<BB', body, offset)
+            offset += 2
+
+            present = None
+            stored = count
+            if sparse:
+                present = body[offset:offset + count]
+                stored = sum(present)
+                offset += count
+
+            if kind == KIND_INT:
+                values = _from_little_endian('q', body[offset:offset + stored * 8])
+                return name, values.tolist(), present, offset + stored * 8
+
+            if kind in (KIND_STR, KIND_TOKEN):
+                lengths = _from_little_endian('I', body[offset:offset + stored * 4])
+                offset += stored * 4
+            (blob_length,) = struct.unpack_from('<Q', body, offset)
+            offset += 8
+            if kind == KIND_TOKEN:
+                blob = memoryview(body)[offset:offset + blob_length]
+                ends = list(accumulate(lengths))
+                if ends and ends[-1] != blob_length:
+                    raise ValueError('Token lengths do not match the blob')
+                tokens = [base64.urlsafe_b64encode(blob[s:e]).decode()
+                          for s, e in zip([0] + ends[:-1], ends)]
+                return name, tokens, present, offset + blob_length
+            text = body[offset:offset + blob_length].decode('utf-8')
+        except (IndexError, struct.error, ValueError) as e:
+            raise CorruptedVaultException('Malformed vault body') from e
+
+        if kind == KIND_STR_SEPARATED:
+            values = text.split(SEPARATOR) if stored else []
+            if len(values) != stored:
+                raise CorruptedVaultException('Malformed vault body')
+            return name, values, present, offset + blob_length
+
+        ends = list(accumulate(lengths))
+        starts = [0] + ends[:-1]
+        return name, [text[s:e] for s, e in zip(starts, ends)], present, offset + blob_length
+
+
+def _raw_tokens(values: list) -> list[bytes] | None:
+    """
+    Returns the raw bytes of url-safe base64 tokens, None unless every value is one
+    that encodes back to the same text
+    """
+    try:
+        raw = [base64.b64decode(v, b'-_', validate=True) for v in values]
+    except (TypeError, binascii.Error):
+        return None
+    if not values or not all(map(_canonical, values)):
+        return None
+    return raw
+
+
+def _canonical(token: str) -> bool:
+    # Before padding, the bits of the last character past the data must be zero
+    if token.endswith('=='):
+        return BASE64_INDEX[token[-3]] & 0b1111 == 0
+    if token.endswith('='):
+        return BASE64_INDEX[token[-2]] & 0b11 == 0
+    return True
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    return _little_endian(values)
+
+
+def migrate_json_to_binary(json_path: Path, binary_path: Path, key: bytes | None,
+                           compression: str = 'zlib', token_fields: tuple[str, ...] = ()) -> int:
+    """
+    Converts a JSON vault into the binary format and keeps the original as <name>.json.bak,
+    returns the number of migrated records
+    """
+    records = JsonVaultStore(json_path).read()
+    binary = BinaryVaultStore(binary_path, key, compression, token_fields)
+    binary.write(records)
+
+    if binary.read() != records:
+        binary_path.unlink()
+        raise CorruptedVaultException(f'Verification of {binary_path} failed')
+
+    json_path.replace(json_path.with_suffix('.json.bak'))
+    return len(records)
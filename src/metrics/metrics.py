@@ -0,0 +1,185 @@
+"""Lightweight metrics for manager operations: call counters, latency histograms and spans."""
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+PROMETHEUS_PREFIX = 'pwd_manager'
+
+SpanCallback = Callable[[str, float, float, BaseException | None], None]
+
+
+class Histogram:
+    """Latency histogram with fixed upper bounds, in seconds."""
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, failed: bool = False) -> None:
+        """Records one observation."""
+        position = 0
+        while position < len(self.buckets) and seconds > self.buckets[position]:
+            position += 1
+
+        self.counts[position] += 1
+        self.count += 1
+        self.errors += failed
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self) -> dict:
+        """Returns the histogram as a JSON serializable dict."""
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'sum': self.total,
+            'max': self.max,
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+class MetricsRegistry:
+    """
+    Collects counters and per-operation latency histograms.
+    While disabled, instrumented code only pays for a single attribute check.
+    """
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.__lock = threading.Lock()
+        self.__counters: dict[str, int] = {}
+        self.__histograms: dict[str, Histogram] = {}
+        self.__span_callbacks: list[SpanCallback] = []
+
+    def add_span_callback(self, callback: SpanCallback) -> None:
+        """Registers a callback receiving (operation, start, end, error) for every span."""
+        self.__span_callbacks.append(callback)
+
+    def remove_span_callback(self, callback: SpanCallback) -> None:
+        """Unregisters a span callback."""
+        self.__span_callbacks.remove(callback)
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        """Increments a counter."""
+        if not self.enabled:
+            return
+
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def observe(self, operation: str, seconds: float, failed: bool = False) -> None:
+        """Records the latency of an operation."""
+        if not self.enabled:
+            return
+
+        with self.__lock:
+            histogram = self.__histograms.get(operation)
+            if histogram is None:
+                histogram = self.__histograms[operation] = Histogram()
+            histogram.observe(seconds, failed)
+
+    @contextmanager
+    def span(self, operation: str) -> Iterator[None]:
+        """Times the enclosed block as one call of the operation."""
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.__finish(operation, start, error)
+
+    def timed(self, operation: str) -> Callable:
+        """Decorator timing every call of the function as the given operation."""
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+
+                start = time.perf_counter()
+                error = None
+                try:
+                    return func(*args, **kwargs)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    self.__finish(operation, start, error)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        """Returns all counters and histograms as a JSON serializable dict."""
+        with self.__lock:
+            return {
+                'counters': dict(self.__counters),
+                'operations': {k: v.to_dict() for k, v in self.__histograms.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_events_total counter')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{PROMETHEUS_PREFIX}_events_total{{event="{name}"}} {value}')
+
+        metric = f'{PROMETHEUS_PREFIX}_operation_seconds'
+        lines.append(f'# TYPE {metric} histogram')
+        for name, histogram in sorted(snapshot['operations'].items()):
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{operation="{name}"}} {histogram["sum"]}')
+            lines.append(f'{metric}_count{{operation="{name}"}} {histogram["count"]}')
+
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_operation_errors_total counter')
+        for name, histogram in sorted(snapshot['operations'].items()):
+            lines.append(
+                f'{PROMETHEUS_PREFIX}_operation_errors_total{{operation="{name}"}} '
+                f'{histogram["errors"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: Path) -> None:
+        """Writes the Prometheus text format atomically, for the node exporter textfile collector."""
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        tmp.write_text(self.to_prometheus(), encoding='utf-8')
+        tmp.replace(path)
+
+    def write_json(self, path: Path) -> None:
+        """Writes a JSON snapshot of all metrics."""
+        path.write_text(json.dumps(self.snapshot(), indent=2), encoding='utf-8')
+
+    def reset(self) -> None:
+        """Drops all recorded values."""
+        with self.__lock:
+            self.__counters.clear()
+            self.__histograms.clear()
+
+    def __finish(self, operation: str, start: float, error: BaseException | None) -> None:
+        end = time.perf_counter()
+        self.observe(operation, end - start, error is not None)
+        for callback in self.__span_callbacks:
+            callback(operation, start, end, error)
+
+
+METRICS = MetricsRegistry()
+timed = METRICS.timed
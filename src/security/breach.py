@@ -0,0 +1,165 @@
+"""
+Offline breach corpus checker, backed by a memory-mapped index of SHA-1 hashes
+"""
+import mmap
+import shutil
+import struct
+import tempfile
+from hashlib import sha1
+from pathlib import Path
+from typing import Iterable, TextIO
+
+MAGIC = b'PMBI'
+VERSION = 1
+DIGEST_SIZE = 20
+PREFIX_SIZE = 2
+SUFFIX_SIZE = DIGEST_SIZE - PREFIX_SIZE
+BUCKETS = 1 << (8 * PREFIX_SIZE)
+HEADER = struct.Struct('<4sB3xQ')
+TABLE = struct.Struct(f'<{BUCKETS + 1}Q')
+DATA_OFFSET = HEADER.size + TABLE.size
+SPILL_FANOUT = 256
+MAX_SORT_RECORDS = 4_000_000
+
+
+class BreachIndex:
+    """
+    Read-only view of an index built by build_breach_index.
+    The file holds a header, a table of record offsets for every 2-byte hash prefix
+    and the sorted remaining 18 bytes of every hash, so a lookup is a binary search
+    inside one small bucket of the memory-mapped file.
+    """
+    def __init__(self, path: Path | str):
+        self.__file = Path(path).open('rb')
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.__count = HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a breach index')
+
+        self.__table = TABLE.unpack_from(self.__map, HEADER.size)
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def __enter__(self) -> 'BreachIndex':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """ Unmaps and closes the index file """
+        self.__map.close()
+        self.__file.close()
+
+    def contains(self, digest: bytes) -> bool:
+        """ Returns whether the SHA-1 digest is part of the corpus """
+        bucket = int.from_bytes(digest[:PREFIX_SIZE], 'big')
+        suffix = digest[PREFIX_SIZE:]
+        low, high = self.__table[bucket], self.__table[bucket + 1]
+
+        while low < high:
+            middle = (low + high) // 2
+            start = DATA_OFFSET + middle * SUFFIX_SIZE
+            current = self.__map[start:start + SUFFIX_SIZE]
+            if current == suffix:
+                return True
+            if current < suffix:
+                low = middle + 1
+            else:
+                high = middle
+
+        return False
+
+    def contains_many(self, digests: list[bytes]) -> list[bool]:
+        """
+        Looks up a batch of SHA-1 digests. The digests are visited in sorted order,
+        so neighbouring lookups touch neighbouring pages of the index
+        """
+        found = [False] * len(digests)
+        for position in sorted(range(len(digests)), key=digests.__getitem__):
+            found[position] = self.contains(digests[position])
+
+        return found
+
+    def check_passwords(self, passwords: list[str]) -> list[bool]:
+        """ Returns whether each of the passwords appears in the corpus """
+        return self.contains_many([sha1(p.encode()).digest() for p in passwords])
+
+
+def parse_digest(line: str) -> bytes | None:
+    """ Parses a 'HASH[:COUNT]' line of a HIBP style dump, None for blank lines """
+    line = line.strip()
+    if not line:
+        return None
+
+    digest = bytes.fromhex(line.split(':', 1)[0])
+    if len(digest) != DIGEST_SIZE:
+        raise ValueError(f'Invalid SHA-1 hash: {line}')
+
+    return digest
+
+
+def build_breach_index(source: TextIO, target: Path | str) -> int:
+    """
+    Builds a breach index from a HIBP style dump of SHA-1 hashes, returns the number
+    of unique hashes. The dump is streamed into spill files partitioned by hash prefix,
+    which are sorted one at a time, so memory stays bounded regardless of its size.
+    """
+    with tempfile.TemporaryDirectory() as spill_dir:
+        spills = _spill(
+            (digest for digest in map(parse_digest, source) if digest is not None),
+            Path(spill_dir), 0)
+
+        counts = [0] * BUCKETS
+        with Path(target).open('wb') as out:
+            out.write(b'\0' * DATA_OFFSET)
+            for spill in spills:
+                _write_sorted(spill, 1, out, counts)
+
+            offsets = [0]
+            for count in counts:
+                offsets.append(offsets[-1] + count)
+
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, VERSION, offsets[-1]))
+            out.write(TABLE.pack(*offsets))
+
+    return offsets[-1]
+
+
+def _spill(digests: Iterable[bytes], directory: Path, depth: int) -> list[Path]:
+    directory.mkdir(exist_ok=True)
+    paths = [directory / f'{i:02x}' for i in range(SPILL_FANOUT)]
+    files = [path.open('wb') for path in paths]
+    try:
+        for digest in digests:
+            files[digest[depth]].write(digest)
+    finally:
+        for f in files:
+            f.close()
+
+    return paths
+
+
+def _write_sorted(spill: Path, depth: int, out, counts: list[int]) -> None:
+    size = spill.stat().st_size
+    if size > MAX_SORT_RECORDS * DIGEST_SIZE and depth < PREFIX_SIZE:
+        with spill.open('rb') as f:
+            chunks = iter(lambda: f.read(DIGEST_SIZE), b'')
+            sub_spills = _spill(chunks, spill.with_suffix('.d'), depth)
+        spill.unlink()
+        for sub_spill in sub_spills:
+            _write_sorted(sub_spill, depth + 1, out, counts)
+        shutil.rmtree(spill.with_suffix('.d'))
+        return
+
+    data = spill.read_bytes()
+    spill.unlink()
+    digests = sorted({data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)})
+
+    for digest in digests:
+        counts[int.from_bytes(digest[:PREFIX_SIZE], 'big')] += 1
+    out.write(b''.join(digest[PREFIX_SIZE:] for digest in digests))
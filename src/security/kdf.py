@@ -0,0 +1,81 @@
+"""
+Scrypt parameters per user, calibration to a latency budget and the login verifier
+"""
+import hmac
+import math
+import time
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+MIN_LOG_N = 14
+MAX_LOG_N = 24
+VERIFIER_LENGTH = 32
+
+
+@dataclass(frozen=True)
+class KdfParams:
+    """
+    KdfParams are the Scrypt cost parameters: CPU/memory cost n, block size r and
+    parallelism p. A derivation needs about 128 * r * n bytes of memory
+    """
+    n: int = 2 ** MIN_LOG_N
+    r: int = 8
+    p: int = 1
+
+    @property
+    def memory(self) -> int:
+        """ Bytes of memory a derivation needs """
+        return 128 * self.r * self.n
+
+    def to_dict(self) -> dict:
+        """ Returns the parameters as stored in a user record """
+        return asdict(self)
+
+    @staticmethod
+    def from_dict(data: dict | None) -> 'KdfParams':
+        """ Reads stored parameters, records without any use the original defaults """
+        return KdfParams(**data) if data else LEGACY_PARAMS
+
+    def weaker_than(self, other: 'KdfParams') -> bool:
+        """ True when other costs more on every parameter that differs """
+        return self != other and self.n <= other.n and self.r <= other.r and self.p <= other.p
+
+
+# Parameters used for every user registered before they were stored per user
+LEGACY_PARAMS = KdfParams()
+
+
+def derive(password: str, salt: bytes, params: KdfParams, length: int = 32) -> bytes:
+    """ Derives length bytes from the password with Scrypt """
+    return Scrypt(salt=salt, length=length, n=params.n, r=params.r, p=params.p) \
+        .derive(password.encode())
+
+
+def hash_password(password: str, salt: str, params: KdfParams) -> str:
+    """ Returns the memory-hard login verifier of a password """
+    return derive(password, salt.encode(), params, VERIFIER_LENGTH).hex()
+
+
+def verify_password(password: str, salt: str, expected: str, params: KdfParams) -> bool:
+    """ Checks a password against its verifier in constant time """
+    return hmac.compare_digest(hash_password(password, salt, params), expected)
+
+
+@lru_cache(maxsize=8)
+def calibrate(target_seconds: float, max_memory: int, r: int = 8, p: int = 1) -> KdfParams:
+    """
+    Picks the largest power of two n for which one derivation takes at most target_seconds
+    on this host and needs at most max_memory bytes, never going below the original cost.
+    Scrypt time grows linearly with n, so a single timed derivation at the minimum cost
+    is enough to extrapolate. Results are cached for the process
+    """
+    base = KdfParams(2 ** MIN_LOG_N, r, p)
+    start = time.perf_counter()
+    derive('calibration', b'calibration-salt', base)
+    elapsed = max(time.perf_counter() - start, 1e-6)
+
+    log_n = MIN_LOG_N + math.floor(math.log2(max(target_seconds / elapsed, 1)))
+    log_n = min(log_n, MAX_LOG_N, math.floor(math.log2(max_memory / (128 * r))))
+    return KdfParams(2 ** max(log_n, MIN_LOG_N), r, p)
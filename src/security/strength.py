@@ -0,0 +1,79 @@
+"""
+Password strength estimation used by the vault audit
+"""
+import math
+import string
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+CHAR_CLASSES = (
+    string.ascii_lowercase,
+    string.ascii_uppercase,
+    string.digits,
+    string.punctuation,
+)
+OTHER_CLASS_SIZE = 32
+SCORE_THRESHOLDS = (28, 36, 60, 80)
+WEAK_SCORE = 2
+PARALLEL_THRESHOLD = 20000
+PARALLEL_CHUNK_SIZE = 4096
+
+
+@dataclass
+class PasswordStrength:
+    """
+    PasswordStrength holds the estimated entropy in bits and a 0-4 score
+    """
+    entropy: float
+    score: int
+
+    @property
+    def weak(self) -> bool:
+        """ True when the score is below the weak threshold """
+        return self.score < WEAK_SCORE
+
+
+def estimate_entropy(password: str) -> float:
+    """
+    Estimates the entropy of a password from the size of the character pool it uses.
+    Repeated characters only count as a choice among the characters already used
+    """
+    if not password:
+        return 0.0
+
+    chars = set(password)
+    pool = 0
+    for char_class in CHAR_CLASSES:
+        if not chars.isdisjoint(char_class):
+            pool += len(char_class)
+    if any(not any(c in cls for cls in CHAR_CLASSES) for c in chars):
+        pool += OTHER_CLASS_SIZE
+
+    return len(chars) * math.log2(pool) + (len(password) - len(chars)) * math.log2(len(chars))
+
+
+def score_password(password: str) -> PasswordStrength:
+    """ Returns the strength of a single password """
+    entropy = estimate_entropy(password)
+    score = sum(1 for threshold in SCORE_THRESHOLDS if entropy >= threshold)
+
+    return PasswordStrength(entropy, score)
+
+
+def _score_chunk(passwords: list[str]) -> list[PasswordStrength]:
+    return [score_password(p) for p in passwords]
+
+
+def score_passwords(passwords: list[str]) -> list[PasswordStrength]:
+    """
+    Scores a batch of passwords, spreading large batches over all cores
+    """
+    if len(passwords) < PARALLEL_THRESHOLD:
+        return _score_chunk(passwords)
+
+    chunks = [
+        passwords[i:i + PARALLEL_CHUNK_SIZE]
+        for i in range(0, len(passwords), PARALLEL_CHUNK_SIZE)
+    ]
+    with ProcessPoolExecutor() as pool:
+        return [strength for chunk in pool.map(_score_chunk, chunks) for strength in chunk]
@@ -0,0 +1,295 @@
+"""
+Replication of a vault between machines by exchanging per-entry deltas
+"""
+import json
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from hashlib import sha256
+from pathlib import Path
+from typing import Callable, Protocol
+
+from src.common.exceptions import VaultAccessException
+from src.manager.password_manager import PasswordManager
+
+Handler = Callable[[dict], dict]
+
+
+@dataclass
+class EntryVersion:
+    """
+    EntryVersion identifies the latest known change of an entry: the replica that made it,
+    that replica's counter at the time and a fingerprint of the stored record
+    """
+    origin: str
+    counter: int
+    updated_at: str
+    fingerprint: str
+    deleted: bool = False
+
+    def wins_over(self, other: 'EntryVersion') -> bool:
+        """ Deterministic resolution of concurrent changes, the same on every replica """
+        return (self.updated_at, self.origin, self.counter) > \
+            (other.updated_at, other.origin, other.counter)
+
+
+@dataclass
+class SyncResult:
+    """
+    SyncResult summarizes one sync session
+    """
+    peer: str
+    received: int
+    sent: int
+    conflicts: int
+
+
+class Transport(Protocol):
+    """Delivers a request to the peer replica and returns its response"""
+    def request(self, message: dict) -> dict:
+        """Sends a message, returns the peer's response"""
+
+
+def fingerprint(record: dict) -> str:
+    """ Returns a stable hash of a stored record """
+    return sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+
+class VaultReplica:
+    """
+    Tracks versions of the entries of one vault on one machine. Every local change
+    found by refresh() gets the next value of the replica's counter, so the highest
+    counter seen per replica (the version vector) tells which changes a peer is missing.
+    """
+    def __init__(self, pwd_manager: PasswordManager, state_path: Path):
+        self.__pwd_manager = pwd_manager
+        self.__state_path = state_path
+
+        if state_path.exists():
+            state = json.loads(state_path.read_text(encoding='utf-8'))
+        else:
+            state = {'replica_id': str(uuid.uuid4()), 'clock': 0, 'vector': {}, 'entries': {}}
+
+        self.replica_id: str = state['replica_id']
+        self.__clock: int = state['clock']
+        self.__vector: dict[str, int] = state['vector']
+        self.__entries = {k: EntryVersion(**v) for k, v in state['entries'].items()}
+
+    def vector(self) -> dict[str, int]:
+        """ Returns the highest counter seen for every replica """
+        return dict(self.__vector)
+
+    def refresh(self) -> int:
+        """ Assigns new versions to entries changed or deleted locally, returns their number """
+        records = {r['id']: r for r in self.__pwd_manager.export_records()}
+        changed = 0
+
+        for entry_id, record in records.items():
+            current = fingerprint(record)
+            known = self.__entries.get(entry_id)
+            if known is None or known.deleted or known.fingerprint != current:
+                self.__entries[entry_id] = self.__next_version(record['updated_at'], current)
+                changed += 1
+
+        for entry_id, known in self.__entries.items():
+            if not known.deleted and entry_id not in records:
+                self.__entries[entry_id] = self.__next_version(known.updated_at, '', deleted=True)
+                changed += 1
+
+        if changed:
+            self.__save()
+        return changed
+
+    def changes_since(self, vector: dict[str, int]) -> list[dict]:
+        """ Returns every change the holder of vector has not seen, with its encrypted record """
+        versions = {
+            entry_id: version for entry_id, version in self.__entries.items()
+            if version.counter > vector.get(version.origin, 0)
+        }
+        records = {r['id']: r for r in self.__pwd_manager.export_records(list(versions))}
+
+        return [
+            {'id': entry_id, 'version': asdict(version), 'record': records.get(entry_id)}
+            for entry_id, version in versions.items()
+        ]
+
+    def apply(self, changes: list[dict], sender_vector: dict[str, int]) -> tuple[int, int]:
+        """
+        Merges changes of a peer whose version vector is sender_vector,
+        returns the number of accepted changes and of conflicts
+        """
+        accepted: dict[str, EntryVersion] = {}
+        records, deleted = [], []
+        conflicts = 0
+
+        for change in changes:
+            remote = EntryVersion(**change['version'])
+            if self.__vector.get(remote.origin, 0) >= remote.counter:
+                continue
+
+            local = self.__entries.get(change['id'])
+            if local is not None and sender_vector.get(local.origin, 0) < local.counter:
+                conflicts += 1
+                if not remote.wins_over(local):
+                    continue
+
+            accepted[change['id']] = remote
+            if remote.deleted:
+                deleted.append(change['id'])
+            else:
+                records.append(change['record'])
+
+        if accepted:
+            self.__pwd_manager.import_records(records, deleted)
+            stored = {r['id']: r for r in self.__pwd_manager.export_records(list(accepted))}
+            for entry_id, version in accepted.items():
+                if entry_id in stored:
+                    version.fingerprint = fingerprint(stored[entry_id])
+                self.__entries[entry_id] = version
+
+        for origin, counter in sender_vector.items():
+            self.__vector[origin] = max(self.__vector.get(origin, 0), counter)
+        self.__save()
+
+        return len(accepted), conflicts
+
+    def handle(self, message: dict) -> dict:
+        """
+        Serves a request of a peer running sync(). A peer whose vault uses another data key
+        is answered with an error and this vault's wrapped key instead of any records
+        """
+        self.refresh()
+        try:
+            self.__check_key(message['key'])
+        except VaultAccessException as e:
+            return {'replica': self.replica_id, 'key': self.__pwd_manager.wrapped_key(),
+                    'error': str(e)}
+
+        if message['op'] == 'hello':
+            return {
+                'replica': self.replica_id,
+                'vector': self.vector(),
+                'key': self.__pwd_manager.wrapped_key(),
+                'changes': self.changes_since(message['vector']),
+            }
+        if message['op'] == 'push':
+            self.apply(message['changes'], message['vector'])
+            return {'replica': self.replica_id, 'vector': self.vector()}
+
+        raise ValueError(f'Unknown sync operation: {message["op"]}')
+
+    def sync(self, transport: Transport) -> SyncResult:
+        """
+        Exchanges changes with a peer: first pulls what this replica is missing,
+        then pushes what the peer is missing
+        """
+        self.refresh()
+
+        hello = transport.request(self.__hello())
+        self.__check_key(hello['key'])
+        if 'error' in hello:
+            # This replica was empty and took on the peer's data key, which the peer now accepts
+            hello = transport.request(self.__hello())
+            self.__check_response(hello)
+        received, conflicts = self.apply(hello['changes'], hello['vector'])
+
+        changes = self.changes_since(hello['vector'])
+        self.__check_response(transport.request({
+            'op': 'push', 'replica': self.replica_id, 'vector': self.vector(),
+            'changes': changes, 'key': self.__pwd_manager.wrapped_key()}))
+
+        return SyncResult(hello['replica'], received, len(changes), conflicts)
+
+    def __check_key(self, wrapped: str) -> None:
+        # Records are exchanged encrypted, both replicas must share the data key
+        if not self.__pwd_manager.agree_data_key(wrapped):
+            raise VaultAccessException('The peer vault is encrypted with a different key')
+
+    def __hello(self) -> dict:
+        return {'op': 'hello', 'replica': self.replica_id, 'vector': self.vector(),
+                'key': self.__pwd_manager.wrapped_key()}
+
+    @staticmethod
+    def __check_response(response: dict) -> None:
+        if 'error' in response:
+            raise VaultAccessException(f'The peer refused to sync: {response["error"]}')
+
+    def __next_version(self, updated_at: str, current: str, deleted: bool = False) -> EntryVersion:
+        self.__clock += 1
+        self.__vector[self.replica_id] = self.__clock
+        return EntryVersion(self.replica_id, self.__clock, updated_at, current, deleted)
+
+    def __save(self) -> None:
+        state = {
+            'replica_id': self.replica_id,
+            'clock': self.__clock,
+            'vector': self.__vector,
+            'entries': {k: asdict(v) for k, v in self.__entries.items()},
+        }
+        tmp = self.__state_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(state), encoding='utf-8')
+        tmp.replace(self.__state_path)
+
+
+class LoopbackTransport:
+    """
+    In-process stand-in for a socket: messages are serialized to JSON bytes both ways
+    """
+    def __init__(self, handler: Handler):
+        self.__handler = handler
+        self.bytes_sent = 0
+
+    def request(self, message: dict) -> dict:
+        """ Sends a message, returns the peer's response """
+        payload = json.dumps(message).encode()
+        response = json.dumps(self.__handler(json.loads(payload))).encode()
+        self.bytes_sent += len(payload) + len(response)
+        return json.loads(response)
+
+
+class DirectoryTransport:
+    """
+    Exchanges messages through a shared directory: requests are dropped into
+    <directory>/requests and answered by the peer calling serve_pending()
+    """
+    def __init__(self, directory: Path, timeout: float = 30.0, poll_interval: float = 0.1):
+        self.__requests = directory / 'requests'
+        self.__responses = directory / 'responses'
+        self.__timeout = timeout
+        self.__poll_interval = poll_interval
+        self.__requests.mkdir(parents=True, exist_ok=True)
+        self.__responses.mkdir(parents=True, exist_ok=True)
+
+    def request(self, message: dict) -> dict:
+        """ Sends a message, waits for the peer's response """
+        name = f'{uuid.uuid4()}.json'
+        _write_atomic(self.__requests / name, message)
+
+        response = self.__responses / name
+        deadline = time.monotonic() + self.__timeout
+        while not response.exists():
+            if time.monotonic() > deadline:
+                (self.__requests / name).unlink(missing_ok=True)
+                raise TimeoutError('The peer did not answer the sync request')
+            time.sleep(self.__poll_interval)
+
+        result = json.loads(response.read_text(encoding='utf-8'))
+        response.unlink()
+        return result
+
+    def serve_pending(self, handler: Handler) -> int:
+        """ Answers all waiting requests, returns their number """
+        served = 0
+        for request in sorted(self.__requests.glob('*.json'), key=lambda p: p.stat().st_mtime):
+            message = json.loads(request.read_text(encoding='utf-8'))
+            _write_atomic(self.__responses / request.name, handler(message))
+            request.unlink()
+            served += 1
+
+        return served
+
+
+def _write_atomic(path: Path, message: dict) -> None:
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(message), encoding='utf-8')
+    tmp.replace(path)
@@ -1,25 +1,50 @@
 """Textual screen for password entry management"""
 
-from textual.app import ComposeResult
-from textual.widgets import Footer, Header, Label
+from concurrent.futures import Future
+from functools import partial
+
+from textual.app import App, ComposeResult
+from textual.widgets import Footer, Header, Label, DataTable
 from textual.containers import Vertical
 from textual.screen import Screen
 
+from src.common.clipboard import CLIPBOARD
+from src.manager.history import HistoryRecord
 from src.manager.password_manager import LoginEntry, PasswordManager
 
 
+def notify_copy(app: App, future: Future) -> None:
+    """
+    Reports the outcome of a background clipboard copy, usually called on the clipboard thread
+    """
+    error = future.exception()
+    if error is None:
+        message, severity = 'Password copied to clipboard', 'information'
+        if CLIPBOARD.clear_after:
+            message += f', it will be cleared in {CLIPBOARD.clear_after:g}s'
+    else:
+        message, severity = f'Could not copy the password: {error}', 'error'
+
+    try:
+        app.call_from_thread(app.notify, message, severity=severity)
+    except RuntimeError:
+        app.notify(message, severity=severity)
+
+
 class EntryScreen(Screen):
     """
     Textual screen for password entry management
     """
-    def __init__(self, entry: LoginEntry):
+    def __init__(self, entry: LoginEntry, pwd_manager: PasswordManager | None = None):
         super().__init__()
         self.__entry = entry
+        self.__pwd_manager = pwd_manager
 
     BINDINGS = [
         ('escape', 'app.pop_screen', 'Return'),
         ('r', 'reveal_pass', 'Reveal password'),
         ('c', 'copy_pass', 'Copy password to clipboard'),
+        ('h', 'show_history', 'History'),
     ]
 
     def compose(self) -> ComposeResult:
@@ -41,5 +66,60 @@ class EntryScreen(Screen):
         label.update(f'Password: {self.__entry.password}')
 
     def action_copy_pass(self) -> None:
-        PasswordManager.copy_password_to_clipboard(self.__entry.password)
-        self.app.notify('Password copied to clipboard')
+        if self.__pwd_manager is not None:
+            copied = self.__pwd_manager.copy_entry_password(self.__entry.id)
+        else:
+            copied = PasswordManager.copy_password_to_clipboard(self.__entry.password)
+        copied.add_done_callback(partial(notify_copy, self.app))
+
+    def action_show_history(self) -> None:
+        if self.__pwd_manager is None:
+            return
+
+        history = self.__pwd_manager.entry_history(self.__entry.id)
+        if not history:
+            self.app.notify('This entry has no previous versions')
+            return
+
+        self.app.push_screen(HistoryScreen(self.__entry, history))
+
+
+class HistoryScreen(Screen):
+    """
+    Textual screen listing the previous values of an entry
+    """
+    BINDINGS = [
+        ('escape', 'app.pop_screen', 'Return'),
+        ('r', 'reveal_pass', 'Reveal passwords'),
+    ]
+
+    def __init__(self, entry: LoginEntry, history: list[HistoryRecord]):
+        super().__init__()
+        self.__entry = entry
+        self.__history = history
+        self.__revealed = False
+
+    def compose(self) -> ComposeResult:
+        yield Header()
+        yield Label(f'History of {self.__entry.address} - {self.__entry.username}')
+        yield DataTable(id='history', cursor_type='row')
+        yield Footer()
+
+    def on_mount(self) -> None:
+        table = self.query_one(DataTable)
+        table.add_columns('Changed at', 'Field', 'Previous value')
+        self.__load_table()
+        table.focus()
+
+    def action_reveal_pass(self) -> None:
+        self.__revealed = not self.__revealed
+        self.__load_table()
+
+    def __load_table(self) -> None:
+        table = self.query_one(DataTable)
+        table.clear()
+        for record in self.__history:
+            for field, value in record.changes.items():
+                if field == 'password' and not self.__revealed:
+                    value = '********'
+                table.add_row(record.changed_at, field, value)
@@ -0,0 +1,49 @@
+"""Textual debug screen showing the collected operation metrics"""
+
+from textual.app import ComposeResult
+from textual.widgets import Footer, Header, DataTable, Label
+from textual.screen import Screen
+
+from src.common.config import METRICS_EXPORT_DIR
+from src.metrics.metrics import METRICS
+
+
+class MetricsScreen(Screen):
+    """
+    Textual screen listing call counts and latencies of manager operations
+    """
+
+    BINDINGS = [
+        ('escape', 'app.pop_screen', 'Return'),
+        ('r', 'refresh_metrics', 'Refresh'),
+        ('x', 'export_metrics', 'Export'),
+    ]
+
+    def compose(self) -> ComposeResult:
+        yield Header()
+        if not METRICS.enabled:
+            yield Label('Metrics are disabled, start the app with PWD_MANAGER_METRICS=1')
+        yield DataTable(id='metrics', cursor_type='row')
+        yield Footer()
+
+    def on_mount(self) -> None:
+        table = self.query_one(DataTable)
+        table.add_columns('Operation', 'Calls', 'Errors', 'Avg (ms)', 'Max (ms)', 'Total (ms)')
+        self.action_refresh_metrics()
+        table.focus()
+
+    def action_refresh_metrics(self) -> None:
+        table = self.query_one(DataTable)
+        table.clear()
+        for name, op in sorted(METRICS.snapshot()['operations'].items()):
+            table.add_row(
+                name, op['count'], op['errors'],
+                f"{op['sum'] / op['count'] * 1000:.3f}",
+                f"{op['max'] * 1000:.3f}",
+                f"{op['sum'] * 1000:.1f}",
+            )
+
+    def action_export_metrics(self) -> None:
+        METRICS.write_textfile(METRICS_EXPORT_DIR / 'metrics.prom')
+        METRICS.write_json(METRICS_EXPORT_DIR / 'metrics.json')
+        self.app.notify(f'Metrics exported to {METRICS_EXPORT_DIR}')
@@ -1,6 +1,7 @@
 """Textual pop-up modals for user / password interactions."""
 
 import copy
+from functools import partial
 
 from textual.app import ComposeResult
 from textual.widgets import Input, Button, Label, Static, Checkbox, Select
@@ -8,6 +9,7 @@ from textual.screen import ModalScreen
 from textual.containers import Vertical, Horizontal
 
 from src.manager.password_manager import PasswordManager, LoginEntry
+from src.ui.entry import notify_copy
 
 import src.common.generators as generators
 
@@ -36,6 +38,8 @@ class EditModal(ModalScreen[LoginEntry | None]):
             Input(id="username"),
             Label("Password:"),
             Input(id="password"),
+            Label("Rotate every (days, empty for never):"),
+            Input(id="max_age", type="integer"),
 
             Label("Group:"),
             Select(
@@ -55,6 +59,8 @@ class EditModal(ModalScreen[LoginEntry | None]):
         self.query_one("#address", Input).value = self.__entry.address
         self.query_one("#username", Input).value = self.__entry.username
         self.query_one("#password", Input).value = self.__entry.password
+        if self.__entry.max_age_days is not None:
+            self.query_one("#max_age", Input).value = str(self.__entry.max_age_days)
         self.query_one("#group", Select).value = self.__entry.group
 
 
@@ -63,6 +69,8 @@ class EditModal(ModalScreen[LoginEntry | None]):
             self.__entry.address = self.query_one("#address",Input).value
             self.__entry.username = self.query_one("#username",Input).value
             self.__entry.password = self.query_one("#password",Input).value
+            max_age = self.query_one("#max_age", Input).value
+            self.__entry.max_age_days = int(max_age) if max_age.isdigit() and int(max_age) > 0 else None
 
             select_value = self.query_one("#group",Select).value
             if select_value == Select.BLANK:
@@ -120,8 +128,15 @@ class PasswordGeneratorModal(ModalScreen[str]):
             Checkbox("Include Uppercase", id="uppercase"),
             Checkbox("Include Numbers", id="numbers"),
             Checkbox("Include Symbols", id="symbols"),
+            Checkbox("Passphrase", id="passphrase"),
+            Horizontal(
+                Label("Passphrase Words:"),
+                Input(placeholder=str(generators.PASSPHRASE_WORDS), id="words_input"),
+                id="words_container"
+            ),
 
             Input(placeholder="Generated Password", id="password_display", disabled=True),
+            Label("", id="entropy"),
 
             Horizontal(
                 Button("Generate Password", id="generate"),
@@ -143,8 +158,8 @@ class PasswordGeneratorModal(ModalScreen[str]):
             self.dismiss("")
         elif button_id == "copy":
             pwd = self.query_one("#password_display", Input).value
-            PasswordManager.copy_password_to_clipboard(pwd)
-            self.app.notify("Password copied to clipboard")
+            PasswordManager.copy_password_to_clipboard(pwd).add_done_callback(
+                partial(notify_copy, self.app))
 
     def generate_password(self) -> None:
         include_upper = self.query_one("#uppercase", Checkbox).value
@@ -157,11 +172,21 @@ class PasswordGeneratorModal(ModalScreen[str]):
         except (ValueError, TypeError):
             length = 12
 
-        generated_password = generators.generate_password(
-            length, include_upper,
-            include_symbols, include_numbers
-        )
+        entropy = ""
+        if self.query_one("#passphrase", Checkbox).value:
+            try:
+                words = max(1, int(self.query_one("#words_input", Input).value))
+            except (ValueError, TypeError):
+                words = generators.PASSPHRASE_WORDS
+            generated_password = generators.generate_passphrase(words)
+            entropy = f"{words} words, about {generators.passphrase_entropy(words):.0f} bits"
+        else:
+            generated_password = generators.generate_password(
+                length, include_upper,
+                include_symbols, include_numbers
+            )
         self.query_one("#password_display", Input).value = generated_password
+        self.query_one("#entropy", Label).update(entropy)
 
     def create_account(self) -> None:
         password = self.query_one("#password_display", Input).value
@@ -205,10 +230,11 @@ class FilterByGroupModal(ModalScreen[str | None]):
     """
     Modal dialog asking the user to filter a group.
     """
-    def __init__(self, groups: list[str]) -> None:
+    def __init__(self, groups: list[str], counts: dict[str, int] | None = None) -> None:
         super().__init__()
         self.__groups = copy.deepcopy(groups)
         self.__groups.insert(0, ALL_FILTER)
+        self.__counts = counts if counts is not None else {}
 
 
     def compose(self):
@@ -216,7 +242,7 @@ class FilterByGroupModal(ModalScreen[str | None]):
             Static("Show entries for group", id="message"),
             Vertical(
                 Select(
-                    options=[(g, g) for g in self.__groups],
+                    options=[(self.__label(g), g) for g in self.__groups],
                     id="group_filter",
                 ),
                 Button("Filter", id="filter"),
@@ -235,3 +261,8 @@ class FilterByGroupModal(ModalScreen[str | None]):
             self.dismiss(str(select_value))
         else:
             self.dismiss(None)
+
+    def __label(self, group: str) -> str:
+        if group == ALL_FILTER:
+            return f"{group} ({sum(self.__counts.values())})"
+        return f"{group} ({self.__counts.get(group, 0)})"
@@ -1,21 +1,41 @@
 """The main UI application for the PasswordManager."""
 
+from concurrent.futures import Future
+from pathlib import Path
+
 from textual.app import App
 
+from src.common.config import APP_DATA_DIR
 from src.logging.logging import AuditLog
 from src.ui.users import LoginScreen
-from src.user.user_manager import UserManager
 
 
 class PasswordManagerApp(App):
-    """The UI component of the PasswordManager"""
+    """
+    The UI component of the PasswordManager. The user store is loaded on a worker
+    thread once the login screen has been drawn, so the first frame doesn't wait for it
+    """
 
     CSS_PATH = 'style.tcss'
 
-    def __init__(self, usr_mgr: UserManager, log: AuditLog):
+    def __init__(self, user_file: Path, log: AuditLog):
         super().__init__()
-        self.__usr_mgr = usr_mgr
+        self.__user_file = user_file
         self.__logger = log
+        self.users: Future = Future()
 
     def on_mount(self) -> None:
-        self.push_screen(LoginScreen(self.__usr_mgr, self.__logger))
+        self.push_screen(LoginScreen(self.users, self.__logger))
+        self.call_after_refresh(
+            self.run_worker, self.__load_users, thread=True, exit_on_error=False)
+
+    def __load_users(self) -> None:
+        # Imported here, the user store pulls in the crypto stack
+        from src.user.user_manager import UserManager
+
+        try:
+            self.users.set_result(UserManager(
+                self.__logger, self.__user_file, vault_dir=APP_DATA_DIR / 'user_passwords'))
+        except Exception as e:
+            self.users.set_exception(e)
+            raise
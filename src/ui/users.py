@@ -1,4 +1,12 @@
-"""Textual UI User registration and login screens"""
+"""
+Textual UI User registration and login screens.
+The vault screen and PasswordManager are imported on the first login, keeping them
+off the start-up path
+"""
+
+import asyncio
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
 
 from textual.app import ComposeResult
 from textual.widgets import Footer, Header, Input, Button, Label
@@ -6,18 +14,25 @@ from textual.containers import Vertical
 from textual.screen import Screen
 
 from src.logging.logging import AuditLog
-from src.manager.password_manager import PasswordManager
-from src.ui.vault import VaultScreen
+from src.common.config import ENCRYPT_METADATA, VAULT_FORMAT
 from src.common.exceptions import UserInvalidLoginException, UsernameTakenException
-from src.user.user_manager import UserManager
+
+if TYPE_CHECKING:
+    from src.user.user_manager import UserManager
+
+
+async def wait_for_users(users: Future) -> 'UserManager':
+    """Returns the user store once the background load has finished"""
+    return await asyncio.wrap_future(users)
+
 
 class RegisterScreen(Screen):
     """
     Textual screen for registering a new user
     """
-    def __init__(self, user_manager: UserManager, log: AuditLog):
+    def __init__(self, users: Future, log: AuditLog):
         super().__init__()
-        self.user_manager = user_manager
+        self.users = users
         self.__logger = log
 
     def compose(self) -> ComposeResult:
@@ -30,22 +45,23 @@ class RegisterScreen(Screen):
             yield Button('Go to login', id="login-btn")
         yield Footer()
 
-    def on_button_pressed(self, btn: Button.Pressed) -> None:
+    async def on_button_pressed(self, btn: Button.Pressed) -> None:
         if btn.button.id == 'login-btn':
-            self.app.push_screen(LoginScreen(self.user_manager, self.__logger))
+            self.app.push_screen(LoginScreen(self.users, self.__logger))
             return
 
         user = self.query_one('#username', Input).value
         pwd = self.query_one('#password', Input).value
+        user_manager = await wait_for_users(self.users)
 
         try:
-            self.user_manager.register_user(user, pwd)
+            user_manager.register_user(user, pwd)
         except UsernameTakenException:
             self.app.notify('This username is already taken!', severity='error')
             return
 
         self.app.notify('Registration successful!', severity="information")
-        self.app.push_screen(LoginScreen(self.user_manager, self.__logger))
+        self.app.push_screen(LoginScreen(self.users, self.__logger))
 
         self.query_one('#username', Input).clear()
         self.query_one('#password', Input).clear()
@@ -54,9 +70,9 @@ class LoginScreen(Screen):
     """
     Textual screen for logging a user in
     """
-    def __init__(self, user_manager: UserManager, log: AuditLog):
+    def __init__(self, users: Future, log: AuditLog):
         super().__init__()
-        self.user_manager = user_manager
+        self.users = users
         self.__logger = log
 
     def compose(self) -> ComposeResult:
@@ -69,22 +85,29 @@ class LoginScreen(Screen):
             yield Button('Go to registration', id="register")
         yield Footer()
 
-    def on_button_pressed(self, btn: Button.Pressed) -> None:
+    async def on_button_pressed(self, btn: Button.Pressed) -> None:
         if btn.button.id == 'register':
-            self.app.push_screen(RegisterScreen(self.user_manager, self.__logger))
+            self.app.push_screen(RegisterScreen(self.users, self.__logger))
             return
 
+        # Imported here, only the login screen is needed for the first frame
+        from src.manager.password_manager import PasswordManager
+        from src.ui.vault import VaultScreen
+
         user = self.query_one('#username', Input).value
         pwd = self.query_one('#password', Input).value
+        user_manager = await wait_for_users(self.users)
 
         try:
-            master_key = self.user_manager.login_user(user, pwd)
+            master_key = user_manager.login_user(user, pwd)
         except UserInvalidLoginException:
             self.app.notify('Invalid username or password', severity='error')
             return
 
-        pwd_manager = PasswordManager(user, master_key, self.__logger)
-        self.app.push_screen(VaultScreen(pwd_manager, self.user_manager))
+        pwd_manager = PasswordManager(
+            user, master_key, self.__logger,
+            encrypt_metadata=ENCRYPT_METADATA, vault_format=VAULT_FORMAT)
+        self.app.push_screen(VaultScreen(pwd_manager, user_manager))
         self.app.notify('Login successful!', severity="information")
 
         self.query_one('#username', Input).clear()
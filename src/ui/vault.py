@@ -1,18 +1,30 @@
 """Main textual screen module for password vault management"""
 
 from textual.app import ComposeResult
-from textual.widgets import Footer, Header, DataTable
+from textual.widgets import Footer, Header, DataTable, Input
 from textual.screen import Screen
 
+from src.common.config import BREACH_INDEX_PATH
 from src.manager.password_manager import PasswordManager, LoginEntry
+from src.security.breach import BreachIndex
 from src.user.user_manager import UserManager
 from src.ui.entry import EntryScreen
+from src.ui.metrics import MetricsScreen
 from src.ui.modals import (
     EditModal, DeleteModal,
     PasswordGeneratorModal, CreateGroupModal,
     FilterByGroupModal
 )
 
+SEARCH_RESULTS = 100
+COLUMNS = (
+    ('Address', 'address'),
+    ('Username', 'username'),
+    ('Created At', 'created_at'),
+    ('Updated At', 'updated_at'),
+    ('Group', 'group'),
+)
+
 
 class VaultScreen(Screen):
     """
@@ -22,28 +34,36 @@ class VaultScreen(Screen):
     BINDINGS = [
         ('escape', 'app.pop_screen', 'Logout'),
         ('f', 'filter_grp', 'Group filter'),
+        ('slash', 'search', 'Search'),
         ('Enter', 'enter_entry', 'View'),
         ('c', 'create_entry', 'Create'),
         ('e', 'edit_entry', 'Edit'),
         ('d', 'delete_entry', 'Delete'),
         ('p', 'generate_password', 'Generate'),
         ('g', 'create_group', 'Create group'),
+        ('a', 'audit', 'Audit'),
+        ('m', 'show_metrics', 'Metrics'),
     ]
 
     def __init__(self, pwd_manager: PasswordManager, user_manager: UserManager):
         super().__init__()
         self.pwd_manager = pwd_manager
         self.user_manager = user_manager
+        self.__group: str | None = None
+        self.__sort_by: str | None = None
+        self.__descending = False
 
 
     def compose(self) -> ComposeResult:
         yield Header()
+        yield Input(placeholder='Search address, username or group (/)', id='search')
         yield DataTable(id='table', cursor_type='row')
         yield Footer()
 
     def on_mount(self) -> None:
         table = self.query_one(DataTable)
-        table.add_columns('Address', 'Username', 'Created At', 'Updated At', 'Group')
+        for label, field in COLUMNS:
+            table.add_column(label, key=field)
         self.__load_table()
         table.focus()
 
@@ -54,7 +74,27 @@ class VaultScreen(Screen):
         if entry is None:
             return
 
-        self.app.push_screen(EntryScreen(entry))
+        self.app.push_screen(EntryScreen(entry, self.pwd_manager))
+
+    def on_data_table_header_selected(self, event: DataTable.HeaderSelected) -> None:
+        field = event.column_key.value
+        if field == self.__sort_by:
+            self.__descending = not self.__descending
+        else:
+            self.__sort_by, self.__descending = field, False
+
+        self.__load_table(self.__group)
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if event.input.id == 'search':
+            self.__load_table(self.__group)
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        if event.input.id == 'search':
+            self.query_one(DataTable).focus()
+
+    def action_search(self) -> None:
+        self.query_one('#search', Input).focus()
 
     def action_create_entry(self) -> None:
         self.app.push_screen(
@@ -112,10 +152,31 @@ class VaultScreen(Screen):
 
     def action_filter_grp(self) -> None:
         self.app.push_screen(
-            FilterByGroupModal(self.user_manager.fetch_groups(self.pwd_manager.get_username())),
+            FilterByGroupModal(
+                self.user_manager.fetch_groups(self.pwd_manager.get_username()),
+                self.pwd_manager.group_counts()),
             self.__filter_callback
         )
 
+    def action_audit(self) -> None:
+        report = self.pwd_manager.audit()
+        breached = []
+        if BREACH_INDEX_PATH.exists():
+            with BreachIndex(BREACH_INDEX_PATH) as index:
+                breached = self.pwd_manager.check_breaches(index)
+
+        severity = 'warning' if report.weak or report.reused or breached else 'information'
+
+        self.app.notify(
+            f'{len(report.weak)} weak passwords, '
+            f'{sum(len(ids) for ids in report.reused)} entries share a password, '
+            f'{len(breached)} found in breaches',
+            severity=severity
+        )
+
+    def action_show_metrics(self) -> None:
+        self.app.push_screen(MetricsScreen())
+
     def __edit_callback(self, res: LoginEntry | None) -> None:
         if res is None:
             return
@@ -123,7 +184,13 @@ class VaultScreen(Screen):
         if res.id != '':
             self.pwd_manager.edit_entry(res.id, res)
         else:
-            self.pwd_manager.create_entry(res.address, res.username, res.password)
+            duplicates = self.pwd_manager.find_duplicates(res.address, res.username)
+            self.pwd_manager.create_entry(
+                res.address, res.username, res.password, res.group, res.max_age_days)
+            if duplicates:
+                self.app.notify(
+                    f'{len(duplicates)} other entries exist for {res.username} on {res.address}',
+                    severity='warning')
 
         self.__load_table()
 
@@ -165,8 +232,23 @@ class VaultScreen(Screen):
         self.__load_table(res)
 
     def __load_table(self, group: str | None = None) -> None:
+        self.__group = group
         table = self.query_one(DataTable)
         table.clear()
-        for e in self.pwd_manager.list_passwords():
-            if group is None or e.group == group:
-                table.add_row(e.address, e.username, e.created_at, e.updated_at, e.group, key=e.id)
+        query = self.query_one('#search', Input).value
+        if query.strip():
+            entries = self.pwd_manager.fuzzy_search(query, SEARCH_RESULTS)
+            if group is not None:
+                entries = [e for e in entries if e.group == group]
+        else:
+            entries = self.pwd_manager.list_passwords(
+                sort_by=self.__sort_by, descending=self.__descending, group=group)
+
+        for e in entries:
+            table.add_row(e.address, e.username, e.created_at, e.updated_at, e.group, key=e.id)
+
+        self.__update_rotation_badge()
+
+    def __update_rotation_badge(self) -> None:
+        due = len(self.pwd_manager.rotation_due())
+        self.sub_title = f'{due} passwords due for rotation' if due else ''
@@ -2,52 +2,72 @@
 Class for managing users
 """
 
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 import json
 from pathlib import Path
+from typing import Callable
 
-from src.common.exceptions import UsernameTakenException, UserInvalidLoginException
+from src.common.config import KDF_UNLOCK_SECONDS, KDF_MAX_MEMORY
+from src.common.exceptions import GroupNameTakenException, UsernameTakenException, \
+    UserInvalidLoginException
 import src.common.generators as generators
 import src.common.encryption as encryption
-from src.logging.logging import AuditLog
+from src.logging.logging import AuditLog, Category
+from src.manager.keyring import KEYRING_SUFFIX, rewrap_member, drop_previous_wraps
+from src.metrics.metrics import METRICS, timed
+from src.security import kdf
+from src.security.kdf import KdfParams
 
 
 @dataclass
 class User:
     """
     User dataclass is used for easier management of user's info.
+    hash_kdf holds the Scrypt parameters of password_hash, users registered before they
+    were stored have none and a SHA-256 hash. key_kdf holds the parameters of the master key
     """
     password_salt: str
     password_hash: str
     username: str
     master_password_salt: str
     groups: list[str]
+    hash_kdf: dict = field(default_factory=dict)
+    key_kdf: dict = field(default_factory=dict)
 
 class UserManager:
     """
-    Class used for managing users. Uses a json file as persistent storage of users
+    Class used for managing users. Uses a json file as persistent storage of users.
+    When vault_dir is given, logging in also moves master keys derived with outdated
+    Scrypt parameters to the current ones, rewrapping the data keys of the vaults there
     """
 
-    def __init__(self, logger: AuditLog, user_file_path: str = 'users.json'):
+    def __init__(self, logger: AuditLog, user_file_path: str = 'users.json',
+                 kdf_params: KdfParams | None = None, vault_dir: Path | None = None):
         self.__logger = logger
         self.__user_file = Path(user_file_path)
+        self.__kdf_params = kdf_params
+        self.__vault_dir = vault_dir
 
         if not self.__user_file.exists():
             self.__user_file.write_text(json.dumps({}), encoding='utf-8')
 
         self.__users = self.__load_users()
 
+    @timed('users.register')
     def register_user(self, username: str, password: str) -> None:
         """
         Registers a user with a username/password combination.
         Throws an exception if the username is already taken.
         """
         if username in self.__users or username.strip() == '':
-            self.__logger.log('A user tried to register with an empty or registered username.')
+            self.__logger.log(
+                'A user tried to register with an empty or registered username.',
+                category=Category.SECURITY)
             raise UsernameTakenException
 
+        params = self.kdf_params()
         password_salt = generators.generate_salt()
-        hashed_password = generators.generate_hashed_password(password, password_salt)
+        hashed_password = kdf.hash_password(password, password_salt, params)
 
         master_salt = generators.generate_salt()
         self.__users[username] = User(
@@ -55,12 +75,16 @@ class UserManager:
             hashed_password,
             username,
             master_salt,
-            []
+            [],
+            params.to_dict(),
+            params.to_dict(),
         )
 
-        self.__logger.log_with_user('A new user has been registered', username)
+        self.__logger.log_with_user(
+            'A new user has been registered', username, category=Category.SECURITY)
         self.__save_users()
 
+    @timed('users.login')
     def login_user(self, username: str, password: str) -> bytes:
         """
         Login for a user. Returns the key used for encrypting the passwords, 
@@ -68,42 +92,181 @@ class UserManager:
         """
 
         if username not in self.__users:
-            self.__logger.log('A user tried to login with an invalid username.')
+            # Spend the same work as a real verification, so timing doesn't reveal usernames
+            kdf.hash_password(password, username, self.kdf_params())
+            self.__logger.log(
+                'A user tried to login with an invalid username.', category=Category.SECURITY)
+            METRICS.inc('login_failed')
             raise UserInvalidLoginException
 
         user = self.__users[username]
-        if generators.generate_hashed_password(password, user.password_salt) != user.password_hash:
-            self.__logger.log('A user tried to login with an invalid password.')
+        if not self.__verify_password(user, password):
+            self.__logger.log(
+                'A user tried to login with an invalid password.', category=Category.SECURITY)
+            METRICS.inc('login_failed')
             raise UserInvalidLoginException
 
-        self.__logger.log_with_user('User logged in', username)
-        return encryption.password_to_fernet_key(password, user.master_password_salt.encode())
+        self.__upgrade_verifier(user, password)
+        key = encryption.password_to_fernet_key(
+            password, user.master_password_salt.encode(), KdfParams.from_dict(user.key_kdf))
+        key = self.__upgrade_key(user, password, key)
 
+        self.__logger.log_with_user('User logged in', username, category=Category.SECURITY)
+        return key
+
+    @timed('users.change_password')
+    def change_password(self, username: str, old_password: str, new_password: str,
+                        rekey: Callable[[bytes, bytes], None]) -> bytes:
+        """
+        Changes the master password of a user and returns the new key. rekey is called
+        with the old and the new key before the change is saved, to rewrap the data keys
+        of the user's vaults. The new key uses the current Scrypt parameters.
+        Throws an exception if the old password is invalid.
+        """
+        old_key = self.login_user(username, old_password)
+
+        user = self.__users[username]
+        params = self.kdf_params()
+        master_salt = generators.generate_salt()
+        new_key = encryption.password_to_fernet_key(new_password, master_salt.encode(), params)
+        rekey(old_key, new_key)
+
+        user.password_salt = generators.generate_salt()
+        user.password_hash = kdf.hash_password(new_password, user.password_salt, params)
+        user.hash_kdf = params.to_dict()
+        user.master_password_salt = master_salt
+        user.key_kdf = params.to_dict()
+        self.__save_users()
+
+        self.__logger.log_with_user(
+            'Master password changed', username, category=Category.SECURITY)
+        return new_key
+
+    def kdf_params(self) -> KdfParams:
+        """
+        Returns the Scrypt parameters for new verifiers and keys, calibrated to
+        KDF_UNLOCK_SECONDS on this host unless they were given explicitly
+        """
+        if self.__kdf_params is None:
+            self.__kdf_params = kdf.calibrate(KDF_UNLOCK_SECONDS / 2, KDF_MAX_MEMORY)
+        return self.__kdf_params
+
+    @timed('users.create_group')
     def create_group(self, username: str, group_name: str) -> None:
         """Creates a group with the given name for the input user."""
-        self.__logger.log_with_user(f'A new group has been registered: {group_name}', username)
+        self.__logger.log_with_user(
+            f'A new group has been registered: {group_name}', username, category=Category.WRITE)
 
         self.__users[username].groups.append(group_name)
         self.__save_users()
 
+    @timed('users.fetch_groups')
     def fetch_groups(self, username: str) -> list[str]:
         """Fetches all groups associated with the user."""
-        self.__logger.log_with_user('Request to fetch all groups', username)
+        self.__logger.log_with_user(
+            'Request to fetch all groups', username, category=Category.READ)
 
         return self.__users[username].groups
 
-    def delete_group(self, username: str, group_name: str) -> None:
-        """Deletes a group with the given name for the input user."""
-        self.__logger.log_with_user(f'A group has been deleted: {group_name}', username)
+    @timed('users.delete_group')
+    def delete_group(self, username: str, group_name: str,
+                     cascade: Callable[[str], int] | None = None) -> None:
+        """
+        Deletes a group with the given name for the input user. cascade is called with
+        the group before the change is saved, to remove it from the entries of the vault
+        (see PasswordManager.delete_group)
+        """
+        groups = self.__users[username].groups
+        if group_name not in groups:
+            raise ValueError(f'{username} has no group {group_name}')
+        if cascade is not None:
+            cascade(group_name)
+
+        self.__logger.log_with_user(
+            f'A group has been deleted: {group_name}', username, category=Category.WRITE)
+
+        groups.remove(group_name)
+        self.__save_users()
+
+    @timed('users.rename_group')
+    def rename_group(self, username: str, group_name: str, new_name: str,
+                     cascade: Callable[[str, str], int] | None = None) -> None:
+        """
+        Renames a group of the input user, keeping its position in the list. cascade is
+        called with the old and the new name before the change is saved, to move the entries
+        of the vault (see PasswordManager.rename_group).
+        Throws an exception if the user already has a group named new_name
+        """
+        groups = self.__users[username].groups
+        if group_name not in groups:
+            raise ValueError(f'{username} has no group {group_name}')
+        if new_name in groups:
+            raise GroupNameTakenException(new_name)
+        if cascade is not None:
+            cascade(group_name, new_name)
+
+        self.__logger.log_with_user(
+            f'A group has been renamed: {group_name} -> {new_name}', username,
+            category=Category.WRITE)
+
+        groups[groups.index(group_name)] = new_name
+        self.__save_users()
+
+    @staticmethod
+    def __verify_password(user: User, password: str) -> bool:
+        if not user.hash_kdf:
+            return generators.generate_hashed_password(password, user.password_salt) \
+                == user.password_hash
+
+        return kdf.verify_password(
+            password, user.password_salt, user.password_hash, KdfParams.from_dict(user.hash_kdf))
+
+    def __upgrade_verifier(self, user: User, password: str) -> None:
+        target = self.kdf_params()
+        if user.hash_kdf and not KdfParams.from_dict(user.hash_kdf).weaker_than(target):
+            return
+
+        user.password_salt = generators.generate_salt()
+        user.password_hash = kdf.hash_password(password, user.password_salt, target)
+        user.hash_kdf = target.to_dict()
+        self.__save_users()
+
+        self.__logger.log_with_user(
+            'Password verifier upgraded', user.username, category=Category.SECURITY)
+
+    def __upgrade_key(self, user: User, password: str, key: bytes) -> bytes:
+        target = self.kdf_params()
+        if self.__vault_dir is None \
+                or user.key_kdf and not KdfParams.from_dict(user.key_kdf).weaker_than(target):
+            return key
+
+        # A vault older than keyrings is still encrypted with the key itself, it gets
+        # its own data key when next opened and the key is upgraded on the login after
+        legacy = any((self.__vault_dir / f'{user.username}{suffix}').exists()
+                     for suffix in ('.json', '.vault'))
+        if legacy and not (self.__vault_dir / f'{user.username}{KEYRING_SUFFIX}').exists():
+            return key
+
+        master_salt = generators.generate_salt()
+        new_key = encryption.password_to_fernet_key(password, master_salt.encode(), target)
+        rewrap_member(self.__vault_dir, user.username, key, new_key)
+        user.master_password_salt = master_salt
+        user.key_kdf = target.to_dict()
+        self.__save_users()
+        drop_previous_wraps(self.__vault_dir, user.username)
 
-        self.__users[username].groups.remove(group_name)
+        self.__logger.log_with_user(
+            'Master key upgraded', user.username, category=Category.SECURITY)
+        return new_key
 
+    @timed('users.save')
     def __save_users(self) -> None:
         json_users = json.dumps([asdict(v) for v in self.__users.values()])
         self.__user_file.write_text(json_users, encoding='utf-8')
 
         self.__logger.log('User file has been saved')
 
+    @timed('users.load')
     def __load_users(self) -> dict[str, User]:
         self.__logger.log('Loading user file')
 
@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+
+from src.api.client import ApiClient, ApiClientError
+from src.api.server import ApiServer
+from src.logging.logging import Category, Level
+from src.manager.password_manager import PasswordManager
+from src.security.kdf import KdfParams
+from src.user.user_manager import UserManager
+
+
+class AuditLog:
+    def log(self, msg: str, lvl: Level = Level.INFO,
+            category: Category = Category.SYSTEM) -> None:
+        pass
+
+    def log_with_user(self, msg: str, usr: str, lvl: Level = Level.INFO,
+                      category: Category = Category.SYSTEM) -> None:
+        pass
+
+
+@pytest.fixture
+def setup(tmp_path):
+    log = AuditLog()
+    users = UserManager(log, tmp_path / "users.json", kdf_params=KdfParams(n=2**10))
+    users.register_user("alice", "secret")
+    key = users.login_user("alice", "secret")
+
+    def open_vault(username, vault_key):
+        return PasswordManager(username, vault_key, log, tmp_path)
+
+    vault = open_vault("alice", key)
+    ids = [vault.create_entry(f"site{i}.com", "alice", f"pass{i}").id for i in range(3)]
+    return users, log, open_vault, ids
+
+
+def serve(setup, scenario, **kwargs):
+    users, log, open_vault, ids = setup
+
+    async def main():
+        server = await ApiServer(users, log, open_vault, **kwargs).start("127.0.0.1", 0)
+        async with server:
+            async with ApiClient(port=server.sockets[0].getsockname()[1]) as client:
+                await scenario(client, ids)
+
+    asyncio.run(main())
+
+
+def test_session_and_batched_reads(setup):
+    async def scenario(client, ids):
+        with pytest.raises(ApiClientError) as error:
+            await client.get(ids[0])
+        assert error.value.status == 401
+
+        await client.login("alice", "secret")
+        assert (await client.get(ids[1])).password == "pass1"
+
+        entries = await client.get_many([ids[2], "missing", ids[0]])
+        assert [e.password for e in entries] == ["pass2", "pass0"]
+
+        listed = await client.list_entries(sort="address", desc=1, limit=2)
+        assert [e["address"] for e in listed] == ["site2.com", "site1.com"]
+        assert "password" not in listed[0]
+
+        await client.logout()
+        with pytest.raises(ApiClientError):
+            await client.list_entries()
+
+    serve(setup, scenario)
+
+
+def test_invalid_login_and_routes(setup):
+    async def scenario(client, ids):
+        with pytest.raises(ApiClientError) as error:
+            await client.login("alice", "wrong")
+        assert error.value.status == 401
+
+        await client.login("alice", "secret")
+        with pytest.raises(ApiClientError) as error:
+            await client.request("GET", "/nothing")
+        assert error.value.status == 404
+
+        with pytest.raises(ApiClientError) as error:
+            await client.request("POST", "/entries/get_many", {"ids": "not a list"})
+        assert error.value.status == 400
+
+    serve(setup, scenario)
+
+
+def test_sessions_expire(setup):
+    async def scenario(client, ids):
+        await client.login("alice", "secret")
+        await asyncio.sleep(0.05)
+        with pytest.raises(ApiClientError) as error:
+            await client.get(ids[0])
+        assert error.value.status == 401
+
+    serve(setup, scenario, session_ttl=0.01)
+
+
+def raw_request(setup, data):
+    """ Sends raw bytes to the server, returns the status line of its response """
+    users, log, open_vault, _ = setup
+
+    async def main():
+        server = await ApiServer(users, log, open_vault).start("127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(
+                "127.0.0.1", server.sockets[0].getsockname()[1])
+            writer.write(data)
+            await writer.drain()
+            status = await reader.readline()
+            writer.close()
+            await writer.wait_closed()
+            return status
+
+    return asyncio.run(main())
+
+
+def test_negative_content_length(setup):
+    assert b" 400 " in raw_request(setup, b"POST /session HTTP/1.1\r\nContent-Length: -1\r\n\r\n")
+
+
+def test_over_limit_lines(setup):
+    long = b"x" * 100_000
+    assert b" 400 " in raw_request(setup, b"GET /" + long + b" HTTP/1.1\r\n\r\n")
+    assert b" 431 " in raw_request(setup, b"GET / HTTP/1.1\r\nX-Long: " + long + b"\r\n\r\n")
+
+
+def test_internal_errors_are_logged_not_returned(setup):
+    users, _, _, ids = setup
+    messages = []
+
+    class RecordingLog(AuditLog):
+        def log(self, msg, lvl=Level.INFO, category=Category.SYSTEM):
+            messages.append((msg, lvl))
+
+    def broken_vault(username, key):
+        raise RuntimeError("secret internal detail")
+
+    async def scenario(client, ids):
+        with pytest.raises(ApiClientError) as error:
+            await client.login("alice", "secret")
+        assert error.value.status == 500
+        assert "secret internal detail" not in str(error.value)
+
+    serve((users, RecordingLog(), broken_vault, ids), scenario)
+    assert any("secret internal detail" in msg and lvl == Level.ERROR for msg, lvl in messages)
+
+
+@pytest.mark.skipif(not hasattr(asyncio, "start_unix_server"), reason="no Unix sockets")
+def test_unix_socket_is_private(setup, tmp_path):
+    users, log, open_vault, _ = setup
+    path = tmp_path / "api.sock"
+
+    async def main():
+        server = await ApiServer(users, log, open_vault).start_unix(path)
+        async with server:
+            return path.stat().st_mode & 0o777
+
+    assert asyncio.run(main()) == 0o600
@@ -0,0 +1,121 @@
+import io
+import os
+import tracemalloc
+
+import pytest
+from cryptography.fernet import Fernet
+
+from src.common.exceptions import CorruptedVaultException, InvalidAttachmentException
+from src.manager.attachments import AttachmentStore, KIND_NOTE
+
+CREATED_AT = "2026-01-01 00:00:00"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AttachmentStore(tmp_path / "alice.attachments", Fernet.generate_key(), chunk_size=1024)
+
+
+def chunk_files(store):
+    return [p for p in store.directory.rglob("*") if p.is_file() and p.name != "catalog"]
+
+
+def test_file_roundtrip(store):
+    content = os.urandom(3 * 1024 + 100)
+    attachment = store.add("entry-1", "id_ed25519", io.BytesIO(content), CREATED_AT)
+
+    assert attachment.size == len(content)
+    assert len(attachment.chunks) == 4
+
+    reopened = AttachmentStore(store.directory, store._AttachmentStore__key, chunk_size=1024)
+    target = io.BytesIO()
+    assert reopened.read(attachment.id, target) == len(content)
+    assert target.getvalue() == content
+    assert [a.name for a in reopened.for_entry("entry-1")] == ["id_ed25519"]
+    assert reopened.for_entry("entry-2") == []
+
+
+def test_note_roundtrip(store):
+    note = store.add_note("entry-1", "Recovery codes", "1111-2222\n3333-4444", CREATED_AT)
+
+    assert note.kind == KIND_NOTE
+    assert store.read_note(note.id) == "1111-2222\n3333-4444"
+
+
+def test_chunks_are_encrypted_and_deduplicated(store):
+    content = b"-----BEGIN CERTIFICATE-----" * 100
+    first = store.add("entry-1", "cert.pem", io.BytesIO(content), CREATED_AT)
+    second = store.add("entry-2", "cert.pem", io.BytesIO(content), CREATED_AT)
+
+    assert first.chunks == second.chunks
+    files = chunk_files(store)
+    assert len(files) == len(set(first.chunks))
+    assert all(b"CERTIFICATE" not in path.read_bytes() for path in files)
+    assert b"cert.pem" not in (store.directory / "catalog").read_bytes()
+
+
+def test_delete_keeps_shared_chunks(store):
+    shared = os.urandom(1024)
+    first = store.add("entry-1", "a", io.BytesIO(shared + os.urandom(1024)), CREATED_AT)
+    second = store.add("entry-2", "b", io.BytesIO(shared), CREATED_AT)
+
+    store.delete(first.id)
+    assert len(chunk_files(store)) == 1
+    target = io.BytesIO()
+    store.read(second.id, target)
+    assert target.getvalue() == shared
+
+    assert store.delete_entry("entry-2") == 1
+    assert chunk_files(store) == []
+    with pytest.raises(InvalidAttachmentException):
+        store.get(second.id)
+
+
+def test_move_entry(store):
+    attachment = store.add_note("entry-1", "note", "text", CREATED_AT)
+
+    assert store.move_entry("entry-1", "entry-2") == 1
+    assert store.for_entry("entry-1") == []
+    assert [a.id for a in store.for_entry("entry-2")] == [attachment.id]
+
+
+def test_tampered_chunks_are_detected(store):
+    first = store.add("entry-1", "a", io.BytesIO(b"a" * 1024), CREATED_AT)
+    second = store.add("entry-1", "b", io.BytesIO(b"b" * 1024), CREATED_AT)
+    first_path = store.directory / first.chunks[0][:2] / first.chunks[0][2:]
+    second_path = store.directory / second.chunks[0][:2] / second.chunks[0][2:]
+
+    # A valid chunk moved to another address
+    first_path.write_bytes(second_path.read_bytes())
+    with pytest.raises(CorruptedVaultException):
+        store.read(first.id, io.BytesIO())
+
+    second_path.write_bytes(b"garbage")
+    with pytest.raises(CorruptedVaultException):
+        store.read(second.id, io.BytesIO())
+
+
+def test_large_attachments_stream_in_constant_memory(tmp_path):
+    store = AttachmentStore(tmp_path / "alice.attachments", Fernet.generate_key())
+    size = 8 * 1024 * 1024
+    source = tmp_path / "backup.tar"
+    with source.open("wb") as f:
+        for _ in range(size // (1024 * 1024)):
+            f.write(os.urandom(1024 * 1024))
+
+    tracemalloc.start()
+    try:
+        with source.open("rb") as f:
+            attachment = store.add("entry-1", "backup.tar", f, CREATED_AT)
+        _, written_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        with (tmp_path / "restored.tar").open("wb") as f:
+            store.read(attachment.id, f)
+        _, read_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert (tmp_path / "restored.tar").read_bytes() == source.read_bytes()
+    assert written_peak < size / 8
+    assert read_peak < size / 8
@@ -0,0 +1,95 @@
+import io
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.backup.backup import BackupRepository, chunk_boundaries, read_chunks, MIN_CHUNK, \
+    MAX_CHUNK, READ_SIZE
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / "data"
+    (path / "user_passwords").mkdir(parents=True)
+    (path / "users.json").write_bytes(b'{"alice": {}}')
+    (path / "user_passwords" / "alice.json").write_bytes(os.urandom(200_000))
+    return path
+
+
+def test_chunk_boundaries_are_content_defined():
+    data = os.urandom(300_000)
+    chunks = [data[s:e] for s, e in chunk_boundaries(data)]
+
+    assert b"".join(chunks) == data
+    assert all(MIN_CHUNK <= len(c) <= MAX_CHUNK for c in chunks[:-1])
+
+    shifted = [(b"x" + data)[s:e] for s, e in chunk_boundaries(b"x" + data)]
+    assert len(set(chunks) & set(shifted)) >= len(chunks) - 2
+
+
+def test_read_chunks_streams_the_same_chunks():
+    data = os.urandom(2 * READ_SIZE + 12_345)
+
+    assert list(read_chunks(io.BytesIO(data))) == [data[s:e] for s, e in chunk_boundaries(data)]
+
+
+def test_backup_only_writes_changed_chunks(tmp_path, data_dir):
+    repository = BackupRepository(tmp_path / "backups")
+    first = repository.backup(data_dir)
+    assert first.files_chunked == 2
+
+    unchanged = repository.backup(data_dir)
+    assert (unchanged.files_chunked, unchanged.chunks_written) == (0, 0)
+
+    vault = data_dir / "user_passwords" / "alice.json"
+    content = vault.read_bytes()
+    vault.write_bytes(content[:100_000] + b"new entry" + content[100_000:])
+    changed = repository.backup(data_dir)
+
+    assert changed.files_chunked == 1
+    assert 0 < changed.chunks_written <= 3
+    assert [s.id for s in repository.snapshots()] == [
+        first.snapshot.id, unchanged.snapshot.id, changed.snapshot.id]
+
+
+def test_restore_to_any_snapshot(tmp_path, data_dir):
+    repository = BackupRepository(tmp_path / "backups")
+    vault = data_dir / "user_passwords" / "alice.json"
+    original = vault.read_bytes()
+    first = repository.backup(data_dir).snapshot
+
+    vault.write_bytes(b"overwritten")
+    (data_dir / "users.json").unlink()
+    repository.backup(data_dir)
+
+    assert repository.restore(first.id[:8], data_dir) == 2
+    assert vault.read_bytes() == original
+    assert (data_dir / "users.json").exists()
+    assert repository.restore(first.id, data_dir) == 0
+
+
+def test_delete_collects_unreferenced_chunks(tmp_path, data_dir):
+    repository = BackupRepository(tmp_path / "backups")
+    first = repository.backup(data_dir).snapshot
+    (data_dir / "user_passwords" / "alice.json").write_bytes(os.urandom(50_000))
+    repository.backup(data_dir)
+
+    assert repository.delete(first.id) > 0
+    with pytest.raises(KeyError):
+        repository.snapshot(first.id)
+
+
+def test_backup_does_not_import_the_vault():
+    deferred = ["src.manager.password_manager", "cryptography"]
+    code = ("import sys, src.backup.backup; "
+            f"print([m for m in {deferred!r} if m in sys.modules])")
+
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,37 @@
+from cryptography.fernet import Fernet
+
+from benchmarks.harness import BenchmarkResult, measure, compare, save_results, load_results
+from benchmarks.synthetic import write_synthetic_vault
+from src.manager.password_manager import PasswordManager
+from src.logging.logging import AuditLog
+
+
+def test_measure_runs_setup_before_each_run():
+    calls = []
+
+    result = measure("bench", 10, lambda: calls.append("run"), repeat=3,
+                     setup=lambda: calls.append("setup"))
+
+    assert calls == ["setup", "run"] * 4
+    assert result.repeat == 3 and result.best <= result.median
+
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = [BenchmarkResult("a", 1, 1, 1.0, 1.0, 0), BenchmarkResult("b", 1, 1, 1.0, 1.0, 0)]
+    save_results(baseline, tmp_path / "baseline.json")
+
+    current = [BenchmarkResult("a", 1, 1, 1.1, 1.1, 0), BenchmarkResult("b", 1, 1, 2.0, 2.0, 0),
+               BenchmarkResult("c", 1, 1, 9.0, 9.0, 0)]
+    regressions = compare(current, load_results(tmp_path / "baseline.json"), threshold=0.25)
+
+    assert [(r.name, r.ratio) for r in regressions] == [("b", 2.0)]
+
+
+def test_synthetic_vault_loads(tmp_path):
+    key = Fernet.generate_key()
+    write_synthetic_vault(tmp_path, "bench", 50, key)
+
+    manager = PasswordManager("bench", key, AuditLog(tmp_path / "trail.log"), tmp_path)
+
+    assert len(manager.list_passwords()) == 50
+    assert manager.fetch_entry_by_id(manager.list_passwords()[0].id).password == "password-0"
@@ -0,0 +1,47 @@
+import io
+from hashlib import sha1
+from unittest.mock import patch
+
+import pytest
+
+import src.security.breach as breach
+
+
+def dump(*passwords: str) -> io.StringIO:
+    lines = [f"{sha1(p.encode()).hexdigest().upper()}:{i + 1}" for i, p in enumerate(passwords)]
+    return io.StringIO("\n".join(lines) + "\n\n")
+
+
+def test_build_and_lookup(tmp_path):
+    target = tmp_path / "breaches.idx"
+    count = breach.build_breach_index(dump("password", "123456", "qwerty", "password"), target)
+
+    assert count == 3
+    with breach.BreachIndex(target) as index:
+        assert len(index) == 3
+        assert index.check_passwords(["qwerty", "not-breached", "password"]) == [True, False, True]
+
+
+def test_build_with_nested_spills(tmp_path):
+    passwords = [f"pass{i}" for i in range(500)]
+    target = tmp_path / "breaches.idx"
+
+    with patch.object(breach, "MAX_SORT_RECORDS", 4):
+        breach.build_breach_index(dump(*passwords), target)
+
+    with breach.BreachIndex(target) as index:
+        assert all(index.check_passwords(passwords))
+        assert not any(index.check_passwords([f"other{i}" for i in range(100)]))
+
+
+def test_invalid_index_file(tmp_path):
+    target = tmp_path / "breaches.idx"
+    target.write_bytes(b"\0" * breach.DATA_OFFSET)
+
+    with pytest.raises(ValueError):
+        breach.BreachIndex(target)
+
+
+def test_invalid_dump_line(tmp_path):
+    with pytest.raises(ValueError):
+        breach.build_breach_index(io.StringIO("abcd:1\n"), tmp_path / "breaches.idx")
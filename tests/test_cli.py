@@ -0,0 +1,142 @@
+import pytest
+
+import src.cli.cli as cli
+import src.manager.password_manager as password_manager
+import src.security.kdf as kdf
+from src.common.config import ENCRYPT_METADATA, VAULT_FORMAT
+from src.logging.logging import AuditLog as TrailLog, Category, Level
+from src.manager.password_manager import PasswordManager
+from src.security.kdf import KdfParams
+
+FAST_KDF = KdfParams(n=2**10)
+
+
+class AuditLog:
+    def log(self, msg: str, lvl: Level = Level.INFO,
+            category: Category = Category.SYSTEM) -> None:
+        pass
+
+    def log_with_user(self, msg: str, usr: str, lvl: Level = Level.INFO,
+                      category: Category = Category.SYSTEM) -> None:
+        pass
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, "APP_DATA_DIR", tmp_path)
+    monkeypatch.setattr(password_manager, "APP_DATA_DIR", tmp_path)
+    monkeypatch.setattr(kdf, "calibrate", lambda *args, **kwargs: FAST_KDF)
+    return tmp_path
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """ Passwords typed at the getpass prompts, in order """
+    typed = []
+    monkeypatch.setattr("getpass.getpass", lambda prompt="": typed.pop(0))
+    return typed
+
+
+def register(log, username, password, *addresses):
+    users = cli.user_manager(log)
+    users.register_user(username, password)
+    vault = PasswordManager(username, users.login_user(username, password), log,
+                            encrypt_metadata=ENCRYPT_METADATA, vault_format=VAULT_FORMAT)
+    for address in addresses:
+        vault.create_entry(address, username, "hunter2")
+
+
+def test_passwd_then_login(data_dir, answers, capsys):
+    log = AuditLog()
+    register(log, "alice", "old secret", "example.com")
+
+    answers.extend(["old secret", "new secret", "typo"])
+    assert cli.main(["passwd", "alice"], log) == 1
+
+    answers.extend(["old secret", "new secret", "new secret"])
+    assert cli.main(["passwd", "alice"], log) == 0
+
+    answers.append("old secret")
+    assert cli.main(["list", "alice"], log) == 1
+
+    capsys.readouterr()
+    answers.append("new secret")
+    assert cli.main(["list", "alice"], log) == 0
+    assert "example.com" in capsys.readouterr().out
+
+
+def test_share_then_open_as_member(data_dir, answers, capsys):
+    log = AuditLog()
+    register(log, "alice", "alice secret", "example.com")
+    register(log, "bob", "bob secret")
+
+    answers.append("bob secret")
+    assert cli.main(["list", "bob", "--vault", "alice"], log) == 1
+
+    answers.extend(["alice secret", "bob secret"])
+    assert cli.main(["share", "alice", "bob"], log) == 0
+    assert "Members: alice, bob" in capsys.readouterr().out
+
+    answers.append("bob secret")
+    assert cli.main(["list", "bob", "--vault", "alice"], log) == 0
+    assert "example.com" in capsys.readouterr().out
+
+    answers.append("alice secret")
+    assert cli.main(["unshare", "alice", "bob"], log) == 0
+    answers.append("bob secret")
+    assert cli.main(["list", "bob", "--vault", "alice"], log) == 1
+
+
+def test_maintenance_commands_on_a_shared_vault(data_dir, answers, capsys):
+    log = AuditLog()
+    register(log, "alice", "alice secret", "example.com", "https://example.com")
+    register(log, "bob", "bob secret")
+    answers.extend(["alice secret", "bob secret"])
+    cli.main(["share", "alice", "bob"], log)
+    capsys.readouterr()
+
+    index = ["--index", str(data_dir / "missing.index")]
+    answers.append("bob secret")
+    assert cli.main(["audit", "bob", *index], log) == 0
+    answers.append("bob secret")
+    assert cli.main(["audit", "bob", "--vault", "alice", *index], log) == 1
+    assert "1 reused" in capsys.readouterr().out
+
+    answers.append("bob secret")
+    assert cli.main(["rotation", "bob", "--vault", "alice"], log) == 0
+    answers.append("bob secret")
+    assert cli.main(["dedupe", "bob", "--vault", "alice"], log) == 0
+    assert "Merged 1 entries into 1" in capsys.readouterr().out
+
+
+def test_rename_and_delete_group(data_dir, answers, capsys):
+    log = AuditLog()
+    register(log, "alice", "secret")
+    users = cli.user_manager(log)
+    users.create_group("alice", "work")
+    users.create_group("alice", "home")
+    answers.append("secret")
+    assert cli.main(["rename-group", "alice", "work", "home"], log) == 1
+
+    answers.append("secret")
+    assert cli.main(["rename-group", "alice", "work", "office"], log) == 0
+    assert "Renamed group work to office (0 entries)" in capsys.readouterr().out
+    answers.append("secret")
+    assert cli.main(["delete-group", "alice", "home"], log) == 0
+    answers.append("secret")
+    assert cli.main(["delete-group", "alice", "home"], log) == 1
+    assert cli.user_manager(log).fetch_groups("alice") == ["office"]
+
+
+def test_verify_log_exit_codes(data_dir, capsys):
+    path = data_dir / "trail.log"
+    trail = TrailLog(path)
+    for i in range(5):
+        trail.log(f"record {i}")
+
+    assert cli.main(["verify-log"], trail) == 0
+    assert "intact" in capsys.readouterr().out
+
+    path.write_bytes(path.read_bytes().replace(b"record 2", b"record 7"))
+    assert cli.main(["verify-log", "--full"], trail) == 1
+    assert "Tampering found" in capsys.readouterr().out
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from src.common.clipboard import ClipboardService
+
+
+class FakeClipboard:
+    def __init__(self):
+        self.value = ""
+        self.copies = 0
+
+    def copy(self, text):
+        self.copies += 1
+        self.value = text
+
+    def paste(self):
+        return self.value
+
+
+@pytest.fixture
+def board():
+    return FakeClipboard()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_copy_happens_in_background(board):
+    service = ClipboardService(clear_after=None, backend=(board.copy, board.paste))
+    service.copy("secret").result(timeout=5)
+
+    assert board.value == "secret"
+    service.close()
+    assert board.value == ""
+
+
+def test_copied_bytearray_is_wiped(board):
+    service = ClipboardService(clear_after=None, backend=(board.copy, board.paste))
+    secret = bytearray("sécret".encode())
+    service.copy(secret).result(timeout=5)
+
+    assert board.value == "sécret"
+    assert secret == bytes(len(secret))
+    service.close()
+    assert board.value == ""
+
+
+def test_clears_after_timeout(board):
+    service = ClipboardService(clear_after=0.05, backend=(board.copy, board.paste))
+    service.copy("secret").result(timeout=5)
+
+    assert wait_for(lambda: board.value == "")
+    service.close()
+
+
+def test_does_not_clear_foreign_value(board):
+    service = ClipboardService(clear_after=0.05, backend=(board.copy, board.paste))
+    service.copy("secret").result(timeout=5)
+    board.value = "copied by the user"
+
+    time.sleep(0.2)
+    service.clear().result(timeout=5)
+    assert board.value == "copied by the user"
+    service.close()
+
+
+def test_backend_errors_reach_the_caller():
+    def broken(_):
+        raise OSError("no clipboard")
+
+    service = ClipboardService(backend=(broken, lambda: ""))
+    with pytest.raises(OSError):
+        service.copy("secret").result(timeout=5)
+    service.close()
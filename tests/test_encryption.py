@@ -1,5 +1,5 @@
 import pytest
-from cryptography.fernet import InvalidToken
+from cryptography.fernet import Fernet, InvalidToken
 
 import src.common.encryption as encryption
 
@@ -23,4 +23,32 @@ def test_encryption_diff_key():
     key2 = encryption.password_to_fernet_key("abc", salt)
 
     with pytest.raises(InvalidToken):
-        encryption.decrypt(encryption.encrypt(text, key), key2)
\ No newline at end of file
+        encryption.decrypt(encryption.encrypt(text, key), key2)
+
+def test_raw_tokens_are_fernet_tokens():
+    key = Fernet.generate_key()
+    secret = bytearray("pässwörd".encode())
+
+    raw = encryption.encrypt_raw(memoryview(secret), key)
+
+    assert Fernet(key).decrypt(encryption.from_raw(raw)) == bytes(secret)
+    for text in ("", "x" * 16, "I need to be encrypted and decrypted properly :)"):
+        token = encryption.encrypt(text, key)
+        assert encryption.decrypt_raw(encryption.to_raw(token), key) == text.encode()
+
+def test_decrypt_raw_rejects_tampering():
+    key = Fernet.generate_key()
+    raw = bytearray(encryption.encrypt_raw(b"secret", key))
+    raw[30] ^= 1
+
+    with pytest.raises(InvalidToken):
+        encryption.decrypt_raw(raw, key)
+    with pytest.raises(InvalidToken):
+        encryption.decrypt_raw(raw[:20], key)
+
+def test_wipe():
+    plain = bytearray(b"secret")
+
+    encryption.wipe(memoryview(plain)[2:])
+
+    assert plain == b"se\0\0\0\0"
@@ -0,0 +1,62 @@
+import pytest
+
+from src.manager.fuzzy import FuzzyIndex, normalize_address, match_score, substring_distance
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("https://www.GitHub.com/login/", "github.com/login"),
+    ("http://user@mail.example.org:8080/?next=1", "mail.example.org"),
+    ("www.amazon.de", "amazon.de"),
+    ("steam", "steam"),
+])
+def test_normalize_address(address, expected):
+    assert normalize_address(address) == expected
+
+
+def test_match_score_ordering():
+    exact = match_score("github.com", "github.com")
+    prefix = match_score("git", "github.com")
+    substring = match_score("hub", "github.com")
+    subsequence = match_score("ghb", "github.com")
+    typo = match_score("githbu", "github.com")
+
+    assert exact > prefix > substring > subsequence > typo > 0
+    assert match_score("zzzz", "github.com") == 0
+    assert substring_distance("gmial", "gmail.com") == 1
+    assert substring_distance("github", "gitlab.com") == 2
+
+
+@pytest.fixture
+def index():
+    index = FuzzyIndex()
+    index.add("1", "https://www.github.com", "alice", "work")
+    index.add("2", "gitlab.com", "alice", "work")
+    index.add("3", "mail.google.com", "bob", "personal")
+    index.add("4", "https://github.com/enterprise", "bob", "")
+    return index
+
+
+def test_search_ranks_and_limits(index):
+    assert [e for _, e in index.search("github")] == ["1", "4"]
+    assert {e for _, e in index.search("git", limit=2)} == {"1", "2"}
+    assert [e for _, e in index.search("goolge")] == ["3"]
+    assert index.search("") == []
+
+
+def test_search_words_match_any_field(index):
+    assert [e for _, e in index.search("git bob")] == ["4"]
+    assert {e for _, e in index.search("work")} == {"1", "2"}
+
+
+def test_search_after_update_and_remove(index):
+    index.add("1", "bitbucket.org", "alice", "work")
+    index.remove("4")
+
+    assert [e for _, e in index.search("github")] == []
+    assert len(index) == 3
+
+
+def test_search_single_character(index):
+    assert {e for _, e in index.search("g")} == {"1", "2", "3", "4"}
+    assert [e for _, e in index.search("m")][0] == "3"
+    assert index.search("z") == []
@@ -32,4 +32,41 @@ def test_generate_password2():
     alphabet_set = set(alphabet)
     pwd_set = set(pwd)
 
-    assert len(pwd) == 8 and pwd_set.issubset(alphabet_set)
\ No newline at end of file
+    assert len(pwd) == 8 and pwd_set.issubset(alphabet_set)
+
+def test_generate_passwords_contain_every_class():
+    passwords = generators.generate_passwords(200, 6, True, True, True)
+
+    assert len(passwords) == 200
+    for pwd in passwords:
+        assert len(pwd) == 6
+        for chars in (generators.LOWERCASE, generators.UPPERCASE,
+                      generators.SYMBOLS, generators.NUMBERS):
+            assert set(pwd) & set(chars)
+
+def test_required_classes_are_not_always_first():
+    passwords = generators.generate_passwords(200, 4, True, True, True)
+
+    assert len({pwd[0] in generators.LOWERCASE for pwd in passwords}) == 2
+
+def test_generate_short_password():
+    assert len(generators.generate_password(1, True, True, True)) == 1
+    assert generators.generate_password(0, True, True, True) == ""
+
+def test_random_string_is_unbiased_over_alphabet():
+    chars = generators.random_string(20000, "abc")
+
+    assert set(chars) == set("abc")
+    assert all(6000 < chars.count(c) < 7300 for c in "abc")
+
+def test_generate_passphrase():
+    phrase = generators.generate_passphrase(5, " ")
+
+    words = phrase.split(" ")
+    assert len(words) == 5 and set(words).issubset(generators.load_wordlist())
+
+
+def test_passphrase_entropy():
+    assert len(set(generators.load_wordlist())) == 7776
+    assert generators.passphrase_entropy() > 77
+    assert generators.passphrase_entropy(4, ["a", "b"]) == 4
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+import src.manager.history as history
+from src.manager.history import EntryHistory
+
+
+def test_history_is_newest_first(tmp_path):
+    store = EntryHistory(tmp_path / "alice.history")
+    store.record("1", {"username": "a"}, "2025-01-01 10:00:00")
+    store.record("2", {"username": "x"}, "2025-01-01 10:30:00")
+    store.record("1", {"username": "b", "password": "tok"}, "2025-01-01 11:00:00")
+    store.record("1", {}, "2025-01-01 12:00:00")
+
+    reopened = EntryHistory(tmp_path / "alice.history")
+    records = reopened.history("1")
+
+    assert [r.changes for r in records] == [{"username": "b", "password": "tok"}, {"username": "a"}]
+    assert reopened.history("missing") == []
+
+
+def test_history_retention(tmp_path):
+    store = EntryHistory(tmp_path / "alice.history", max_versions=2, max_age_days=30)
+    store.record("1", {"username": "expired"}, "2000-01-01 00:00:00")
+    for i in range(3):
+        store.record("1", {"username": str(i)}, f"2099-01-0{i + 1} 00:00:00")
+
+    assert [r.changes["username"] for r in store.history("1")] == ["2", "1"]
+
+
+def test_history_compaction(tmp_path):
+    path = tmp_path / "alice.history"
+    store = EntryHistory(path, max_versions=2)
+
+    with patch.object(history, "COMPACT_SLACK", 3):
+        for i in range(10):
+            store.record("1", {"username": str(i)}, f"2025-01-01 00:00:0{i}")
+            store.record("2", {"username": str(i)}, f"2025-01-01 00:00:0{i}")
+
+    assert len(path.read_text().splitlines()) < 20
+    assert [r.changes["username"] for r in EntryHistory(path).history("2")][:2] == ["9", "8"]
+
+
+def test_records_past_their_age_are_removed_from_the_file(tmp_path):
+    path = tmp_path / "alice.history"
+    store = EntryHistory(path, max_age_days=None)
+    store.record("1", {"password": "old-ciphertext"}, "2000-01-01 00:00:00")
+    store.record("1", {"password": "recent-ciphertext"}, "2099-01-01 00:00:00")
+
+    EntryHistory(path, max_age_days=30).record("2", {"username": "x"}, "2099-01-02 00:00:00")
+
+    assert "old-ciphertext" not in path.read_text()
+    assert len(path.read_text().splitlines()) == 2
@@ -0,0 +1,25 @@
+from src.security.kdf import KdfParams, LEGACY_PARAMS, calibrate, hash_password, verify_password
+
+
+def test_verifier_roundtrip():
+    params = KdfParams(n=2**10)
+    verifier = hash_password("secret", "salt", params)
+
+    assert verify_password("secret", "salt", verifier, params)
+    assert not verify_password("secret!", "salt", verifier, params)
+    assert not verify_password("secret", "pepper", verifier, params)
+    assert verifier != hash_password("secret", "salt", KdfParams(n=2**11))
+
+
+def test_params_from_stored_record():
+    assert KdfParams.from_dict({}) == LEGACY_PARAMS
+    assert KdfParams.from_dict({"n": 2**15, "r": 8, "p": 1}) == KdfParams(n=2**15)
+    assert KdfParams(n=2**14).weaker_than(KdfParams(n=2**15))
+    assert not KdfParams(n=2**15).weaker_than(KdfParams(n=2**15))
+    assert not KdfParams(n=2**15, r=4).weaker_than(KdfParams(n=2**14))
+
+
+def test_calibrate_bounds():
+    assert calibrate(0.0, 1 << 30) == LEGACY_PARAMS
+    assert calibrate(60.0, 32 * 1024 * 1024).memory <= 32 * 1024 * 1024
+    assert calibrate(60.0, 32 * 1024 * 1024).n >= LEGACY_PARAMS.n
@@ -0,0 +1,54 @@
+import pytest
+from cryptography.fernet import Fernet
+
+from src.common.exceptions import VaultAccessException
+from src.manager.keyring import VaultKeyring, rewrap_member, drop_previous_wraps
+
+
+@pytest.fixture
+def keys():
+    return Fernet.generate_key(), Fernet.generate_key()
+
+
+def test_create_and_unwrap(tmp_path, keys):
+    alice, bob = keys
+    keyring = VaultKeyring(tmp_path / "alice.keyring")
+    data_key = keyring.create("alice", alice)
+
+    reloaded = VaultKeyring(tmp_path / "alice.keyring")
+    assert reloaded.unwrap("alice", alice) == data_key
+    with pytest.raises(VaultAccessException):
+        reloaded.unwrap("alice", bob)
+    with pytest.raises(VaultAccessException):
+        reloaded.unwrap("bob", bob)
+
+
+def test_members(tmp_path, keys):
+    alice, bob = keys
+    keyring = VaultKeyring(tmp_path / "alice.keyring")
+    data_key = keyring.create("alice", alice)
+
+    keyring.add_member("bob", bob, data_key)
+    assert VaultKeyring(keyring.path).unwrap("bob", bob) == data_key
+
+    keyring.remove_member("bob")
+    assert keyring.members() == ["alice"]
+    with pytest.raises(ValueError):
+        keyring.remove_member("alice")
+
+
+def test_rewrap_keeps_the_old_key_until_dropped(tmp_path, keys):
+    alice, new_alice = keys
+    data_key = VaultKeyring(tmp_path / "alice.keyring").create("alice", alice)
+    VaultKeyring(tmp_path / "team.keyring").create("alice", alice)
+    VaultKeyring(tmp_path / "bob.keyring").create("bob", Fernet.generate_key())
+
+    assert rewrap_member(tmp_path, "alice", alice, new_alice) == 2
+    keyring = VaultKeyring(tmp_path / "alice.keyring")
+    assert keyring.unwrap("alice", new_alice) == keyring.unwrap("alice", alice) == data_key
+
+    drop_previous_wraps(tmp_path, "alice")
+    keyring = VaultKeyring(tmp_path / "alice.keyring")
+    assert keyring.unwrap("alice", new_alice) == data_key
+    with pytest.raises(VaultAccessException):
+        keyring.unwrap("alice", alice)
@@ -0,0 +1,124 @@
+from unittest.mock import patch
+
+import src.logging.chain as chain
+from src.logging.chain import LogChain, verify_log
+
+
+def write_log(path, records, checkpoint_every=10):
+    log = LogChain(path, checkpoint_every)
+    for i in range(records):
+        log.append(f"2025-01-01T12:00:00 - INFO - record {i}")
+    return log
+
+
+def test_intact_log_verifies(tmp_path):
+    path = tmp_path / "trail.log"
+    write_log(path, 25)
+
+    result = verify_log(path)
+
+    assert result.ok
+    assert (result.records, result.checkpoint) == (25, 20)
+
+
+def test_chain_continues_after_reopening(tmp_path):
+    path = tmp_path / "trail.log"
+    write_log(path, 15)
+    write_log(path, 15)
+
+    result = verify_log(path)
+
+    assert result.ok and result.records == 30
+
+
+def test_modified_record_is_detected(tmp_path):
+    path = tmp_path / "trail.log"
+    write_log(path, 25)
+    path.write_bytes(path.read_bytes().replace(b"record 13 ", b"record 31 "))
+
+    result = verify_log(path)
+
+    assert not result.ok
+    assert "Record 14 " in result.error
+    assert result.checkpoint == 10
+
+
+def test_removed_and_truncated_records_are_detected(tmp_path):
+    path = tmp_path / "trail.log"
+    write_log(path, 25)
+    lines = path.read_bytes().splitlines(keepends=True)
+
+    path.write_bytes(b"".join(lines[:5] + lines[6:]))
+    assert not verify_log(path, full=True).ok
+
+    path.write_bytes(b"".join(lines[:15]))
+    assert "truncated" in verify_log(path, full=True).error
+
+
+def test_records_after_the_last_checkpoint_are_covered_by_the_head(tmp_path):
+    path = tmp_path / "trail.log"
+    write_log(path, 150, checkpoint_every=100)
+    lines = path.read_bytes().splitlines(keepends=True)
+
+    path.write_bytes(b"".join(lines[:110]))
+
+    assert "truncated" in verify_log(path, full=True).error
+
+
+def test_missing_checkpoints_are_reported(tmp_path):
+    path = tmp_path / "trail.log"
+    write_log(path, 5)
+    checkpoints = tmp_path / "trail.log.checkpoints"
+
+    checkpoints.write_text("")
+    assert "missing" in verify_log(path).error
+    checkpoints.unlink()
+    assert "missing" in verify_log(path).error
+
+
+def test_writers_in_several_processes_share_the_chain(tmp_path):
+    path = tmp_path / "trail.log"
+    first, second = LogChain(path, 10), LogChain(path, 10)
+
+    for i in range(15):
+        first.append(f"first {i}")
+        second.append(f"second {i}")
+
+    result = verify_log(path, full=True)
+    assert result.ok
+    assert (result.records, result.checkpoint) == (30, 30)
+
+
+def test_forged_checkpoint_is_detected(tmp_path):
+    path = tmp_path / "trail.log"
+    write_log(path, 25)
+    checkpoints = tmp_path / "trail.log.checkpoints"
+    checkpoints.write_text(checkpoints.read_text().replace('"seq": 20', '"seq": 21'))
+
+    assert "invalid signature" in verify_log(path).error
+
+
+def test_verification_resumes_from_last_checkpoint(tmp_path):
+    path = tmp_path / "trail.log"
+    log = write_log(path, 1000, checkpoint_every=100)
+    assert verify_log(path).ok
+
+    for i in range(50):
+        log.append(f"new record {i}")
+    with patch.object(chain, "link", wraps=chain.link) as link:
+        result = verify_log(path)
+
+    assert result.ok
+    assert result.records == link.call_count == 50
+    assert verify_log(path, full=True).records == 1050
+
+
+def test_lines_before_the_chain_are_skipped(tmp_path):
+    path = tmp_path / "trail.log"
+    path.write_text("2024-01-01T00:00:00 - INFO - Loading user file\n", encoding="utf-8")
+    log = LogChain(path, 10)
+    log.append("2025-01-01T00:00:00 - INFO - first chained record")
+
+    result = verify_log(path)
+
+    assert result.ok and result.records == 1
@@ -0,0 +1,77 @@
+from unittest.mock import patch
+
+import src.logging.logging as logging
+from src.logging.logging import AuditLog, Category, Level, LogPolicy
+
+
+def lines(path):
+    # without the chain value ending every line
+    return [line.rpartition(" ")[0] for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_default_policy_keeps_writes_and_security(tmp_path):
+    log = AuditLog(tmp_path / "trail.log", LogPolicy(read_per_second=None))
+
+    log.log_with_user("Edited password entry 1", "alice", category=Category.WRITE)
+    log.log("A user tried to login with an invalid password.", category=Category.SECURITY)
+    log.log_with_user("Listing passwords", "alice", category=Category.READ)
+
+    written = lines(tmp_path / "trail.log")
+    assert len(written) == 3
+    assert written[0].endswith("INFO - (User: alice) - Edited password entry 1")
+
+
+def test_min_level_and_disabled_categories(tmp_path):
+    policy = LogPolicy(min_level=Level.WARNING, disabled=frozenset({Category.READ}))
+    log = AuditLog(tmp_path / "trail.log", policy)
+
+    log.log("Saved passwords")
+    log.log_with_user("Listing passwords", "alice", Level.ERROR, category=Category.READ)
+    log.log_with_user("Invalid input entry on edit", "alice", Level.ERROR)
+    log.log_with_user("User logged in", "alice", category=Category.SECURITY)
+
+    assert [line.split(" - ")[-1] for line in lines(tmp_path / "trail.log")] == \
+        ["Invalid input entry on edit", "User logged in"]
+    assert log.suppressed == 2
+
+
+def test_security_events_can_not_be_disabled(tmp_path):
+    policy = LogPolicy(min_level=Level.ERROR, disabled=frozenset(Category))
+    log = AuditLog(tmp_path / "trail.log", policy)
+
+    log.log_with_user("User logged in", "alice", category=Category.SECURITY)
+
+    assert len(lines(tmp_path / "trail.log")) == 1
+
+
+def test_read_events_are_sampled(tmp_path):
+    log = AuditLog(tmp_path / "trail.log", LogPolicy(read_sample_every=4, read_per_second=None))
+
+    for _ in range(12):
+        log.log_with_user("Listing passwords", "alice", category=Category.READ)
+    log.log_with_user("Searching failed", "alice", Level.WARNING, category=Category.READ)
+
+    assert len(lines(tmp_path / "trail.log")) == 4
+    assert log.suppressed == 9
+
+
+def test_read_events_are_rate_limited(tmp_path):
+    log = AuditLog(tmp_path / "trail.log", LogPolicy(read_per_second=5))
+
+    with patch.object(logging.time, "monotonic", return_value=100.0) as clock:
+        for _ in range(20):
+            log.log_with_user("Listing passwords", "alice", category=Category.READ)
+        clock.return_value = 101.0
+        for _ in range(20):
+            log.log_with_user("Listing passwords", "alice", category=Category.READ)
+
+    assert len(lines(tmp_path / "trail.log")) == 10
+
+
+def test_dropped_events_do_not_touch_the_file(tmp_path):
+    log = AuditLog(tmp_path / "trail.log", LogPolicy(disabled=frozenset({Category.READ})))
+
+    with patch.object(logging.Path, "open") as open_file:
+        log.log_with_user("Listing passwords", "alice", category=Category.READ)
+
+    open_file.assert_not_called()
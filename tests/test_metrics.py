@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from src.metrics.metrics import MetricsRegistry
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry()
+
+    @registry.timed("op")
+    def op():
+        return 42
+
+    assert op() == 42
+    registry.inc("event")
+    assert registry.snapshot() == {"counters": {}, "operations": {}}
+
+
+def test_timed_records_calls_and_errors():
+    registry = MetricsRegistry(enabled=True)
+
+    @registry.timed("op")
+    def op(fail: bool):
+        if fail:
+            raise ValueError
+
+    op(False)
+    with pytest.raises(ValueError):
+        op(True)
+
+    stats = registry.snapshot()["operations"]["op"]
+    assert stats["count"] == 2 and stats["errors"] == 1
+    assert sum(stats["buckets"].values()) == 2
+
+
+def test_span_callbacks():
+    registry = MetricsRegistry(enabled=True)
+    spans = []
+    registry.add_span_callback(lambda name, start, end, error: spans.append((name, end >= start)))
+
+    with registry.span("block"):
+        pass
+
+    assert spans == [("block", True)]
+
+
+def test_exports(tmp_path):
+    registry = MetricsRegistry(enabled=True)
+    registry.inc("login_failed", 2)
+    registry.observe("vault.load", 0.002)
+
+    registry.write_textfile(tmp_path / "metrics.prom")
+    registry.write_json(tmp_path / "metrics.json")
+
+    text = (tmp_path / "metrics.prom").read_text()
+    assert 'pwd_manager_events_total{event="login_failed"} 2' in text
+    assert 'pwd_manager_operation_seconds_bucket{operation="vault.load",le="+Inf"} 1' in text
+    assert 'pwd_manager_operation_seconds_count{operation="vault.load"} 1' in text
+    assert json.loads((tmp_path / "metrics.json").read_text())["counters"] == {"login_failed": 2}
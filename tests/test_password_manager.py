@@ -1,22 +1,36 @@
 import pytest
+import io
 import json
+import zlib
 from unittest.mock import patch
-from datetime import datetime
+from datetime import datetime, timedelta
+from hashlib import sha1
 
+from cryptography.fernet import Fernet
+
+from src.manager.keyring import VaultKeyring
 from src.manager.password_manager import PasswordManager, LoginEntry
-from src.common.exceptions import InvalidEntryException
-from src.logging.logging import Level
+from src.common.exceptions import InvalidAttachmentException, InvalidEntryException, \
+    VaultAccessException
+from src.logging.logging import Category, Level
 
+import src.common.encryption as encryption
 import src.manager.password_manager as pwd_manager
+import src.common.clipboard as clipboard
+
+MASTER_KEY = Fernet.generate_key()
+DATA_KEY = Fernet.generate_key()
 
 class AuditLog:
     def __init__(self, _: str) -> None:
         pass
 
-    def log(self, msg: str, lvl: Level = Level.INFO) -> None:
+    def log(self, msg: str, lvl: Level = Level.INFO,
+            category: Category = Category.SYSTEM) -> None:
         pass
 
-    def log_with_user(self, msg: str, usr: str, lvl: Level = Level.INFO) -> None:
+    def log_with_user(self, msg: str, usr: str, lvl: Level = Level.INFO,
+                      category: Category = Category.SYSTEM) -> None:
         pass
 
 
@@ -25,6 +39,10 @@ def mock_encryption():
     with patch.object(pwd_manager, "encryption") as mock_enc:
         mock_enc.encrypt.side_effect = lambda data,k : f"enc_{data}"
         mock_enc.decrypt.side_effect = lambda data,k : data.replace(f"enc_", "")
+        mock_enc.decrypt_many.side_effect = lambda data,k : [d.replace("enc_", "") for d in data]
+        mock_enc.to_raw.side_effect = str.encode
+        mock_enc.decrypt_raw.side_effect = lambda data,k : bytearray(data.replace(b"enc_", b""))
+        mock_enc.wipe.side_effect = encryption.wipe
 
         yield mock_enc
 
@@ -47,17 +65,21 @@ def mock_datetime():
 
 @pytest.fixture
 def mock_pyperclip():
-    with patch.object(pwd_manager, "pyperclip") as mock_clip:
+    with patch.object(clipboard, "pyperclip") as mock_clip, \
+            patch.object(pwd_manager, "CLIPBOARD", clipboard.ClipboardService()):
+        mock_clip.determine_clipboard.return_value = (mock_clip.copy, mock_clip.paste)
         yield mock_clip
 
 
 @pytest.fixture
 def manager(tmp_path):
     fake_logger = AuditLog("")
+    (tmp_path / "user_passwords").mkdir()
+    VaultKeyring(tmp_path / "user_passwords" / "alice.keyring").create("alice", MASTER_KEY, DATA_KEY)
 
     return PasswordManager(
         username="alice",
-        master_password=b"master_key",
+        master_password=MASTER_KEY,
         log=fake_logger,
         storage_path=tmp_path
     )
@@ -83,7 +105,7 @@ def test_create_entry(manager, mock_encryption, mock_uuid, mock_datetime):
     assert entry.password == "enc_my_password"
     assert entry.created_at == "2025-01-01 12:00:00"
 
-    mock_encryption.encrypt.assert_called_with("my_password", b"master_key")
+    mock_encryption.encrypt.assert_called_with("my_password", DATA_KEY)
 
     saved_entry = manager._PasswordManager__user_passwords["fixed-uuid-1234"]
     assert saved_entry.username == "user1"
@@ -96,7 +118,7 @@ def test_fetch_entry_decrypts_password(manager, mock_encryption, mock_uuid):
 
     assert fetched is not None
     assert fetched.password == "secret_pass"
-    mock_encryption.decrypt.assert_called_with("enc_secret_pass", b"master_key")
+    mock_encryption.decrypt.assert_called_with("enc_secret_pass", DATA_KEY)
 
 
 def test_fetch_entry_invalid_returns_none(manager):
@@ -163,9 +185,429 @@ def test_search_by_groups(manager, mock_encryption):
 
 
 def test_copy_password_to_clipboard(manager, mock_pyperclip):
-    manager.copy_password_to_clipboard("secret123")
+    manager.copy_password_to_clipboard("secret123").result(timeout=5)
     mock_pyperclip.copy.assert_called_with("secret123")
 
 
 def test_get_username(manager):
-    assert manager.get_username() == "alice"
\ No newline at end of file
+    assert manager.get_username() == "alice"
+
+def test_group_counts(manager, mock_encryption):
+    manager.create_entry("site1", "u1", "p1", group="work")
+    manager.create_entry("site2", "u2", "p2", group="personal")
+    manager.create_entry("site3", "u3", "p3", group="work")
+
+    assert manager.count_by_group("work") == 2
+    assert manager.count_by_group("missing") == 0
+    assert manager.group_counts() == {"work": 2, "personal": 1}
+
+
+def test_group_index_follows_edit_and_delete(manager, mock_encryption):
+    entry = manager.create_entry("site1", "u1", "p1", group="work")
+
+    edited = manager.fetch_entry_by_id(entry.id)
+    edited.group = "personal"
+    manager.edit_entry(entry.id, edited)
+
+    assert manager.count_by_group("work") == 0
+    assert [e.id for e in manager.search_by_groups("personal")] == [entry.id]
+
+    manager.delete_entry(entry.id)
+    assert manager.group_counts() == {}
+
+
+def test_rename_group_cascades(manager, mock_encryption):
+    manager.create_entry("site1", "u1", "p1", group="work")
+    manager.create_entry("site2", "u2", "p2", group="work")
+    manager.create_entry("site3", "u3", "p3", group="personal")
+
+    assert manager.rename_group("work", "office") == 2
+    assert manager.count_by_group("office") == 2
+    assert manager.search_by_groups("work") == []
+
+    user_file = manager._PasswordManager__path / "alice.json"
+    groups = sorted(e["group"] for e in json.loads(user_file.read_text()))
+    assert groups == ["office", "office", "personal"]
+
+
+def test_delete_group_clears_entries(manager, mock_encryption):
+    manager.create_entry("site1", "u1", "p1", group="work")
+    manager.create_entry("site2", "u2", "p2", group="personal")
+
+    assert manager.delete_group("work") == 1
+    assert manager.delete_group("work") == 0
+    assert manager.group_counts() == {"": 1, "personal": 1}
+
+
+def test_encrypted_metadata_roundtrip(tmp_path):
+    key = Fernet.generate_key()
+    sealed = PasswordManager("alice", key, AuditLog(""), tmp_path, encrypt_metadata=True)
+    entry = sealed.create_entry("secret-site.com", "bob", "pass", group="work")
+
+    raw = (tmp_path / "user_passwords" / "alice.json").read_text()
+    assert "secret-site.com" not in raw and "work" not in raw
+
+    reopened = PasswordManager("alice", key, AuditLog(""), tmp_path, encrypt_metadata=True)
+    fetched = reopened.fetch_entry_by_id(entry.id)
+    assert (fetched.address, fetched.username, fetched.group) == ("secret-site.com", "bob", "work")
+    assert fetched.password == "pass"
+    assert reopened.search_by_address("secret")[0].id == entry.id
+
+
+def test_encrypted_metadata_unlock_uses_index(tmp_path):
+    key = Fernet.generate_key()
+    sealed = PasswordManager("alice", key, AuditLog(""), tmp_path, encrypt_metadata=True)
+    for i in range(5):
+        sealed.create_entry(f"site{i}", "user", "pass")
+
+    index_file = tmp_path / "user_passwords" / "alice.index"
+    with patch.object(pwd_manager.encryption, "decrypt_many",
+                      wraps=pwd_manager.encryption.decrypt_many) as decrypt_many:
+        PasswordManager("alice", key, AuditLog(""), tmp_path, encrypt_metadata=True)
+        data_key = VaultKeyring(tmp_path / "user_passwords" / "alice.keyring").unwrap("alice", key)
+        decrypt_many.assert_called_once_with(index_file.read_text().split(), data_key)
+
+        index_file.unlink()
+        decrypt_many.reset_mock()
+        reopened = PasswordManager("alice", key, AuditLog(""), tmp_path, encrypt_metadata=True)
+        decrypt_many.assert_called_once()
+        assert len(decrypt_many.call_args[0][0]) == 5
+
+    assert len(reopened.list_passwords()) == 5
+
+
+def test_encrypted_metadata_can_be_disabled(tmp_path):
+    key = Fernet.generate_key()
+    sealed = PasswordManager("alice", key, AuditLog(""), tmp_path, encrypt_metadata=True)
+    sealed.create_entry("site.com", "user", "pass")
+
+    plain = PasswordManager("alice", key, AuditLog(""), tmp_path)
+    plain.create_entry("other.com", "user", "pass")
+
+    data = json.loads((tmp_path / "user_passwords" / "alice.json").read_text())
+    assert sorted(e["address"] for e in data) == ["other.com", "site.com"]
+    assert not (tmp_path / "user_passwords" / "alice.index").exists()
+
+
+def test_audit_reports_weak_and_reused(manager, mock_encryption):
+    weak = manager.create_entry("site1", "u1", "abc")
+    first = manager.create_entry("site2", "u2", "Tr0ub4dor&3xYz!q")
+    second = manager.create_entry("site3", "u3", "Tr0ub4dor&3xYz!q")
+
+    report = manager.audit()
+
+    assert report.weak == [weak.id]
+    assert report.reused == [[first.id, second.id]]
+    assert set(report.scores) == {weak.id, first.id, second.id}
+
+
+def test_audit_only_rescores_changed_entries(manager, mock_encryption):
+    manager.create_entry("site1", "u1", "abc")
+    changed = manager.create_entry("site2", "u2", "def")
+    manager.audit()
+
+    entry = manager.fetch_entry_by_id(changed.id)
+    entry.password = "Tr0ub4dor&3xYz!q"
+    manager.edit_entry(changed.id, entry)
+
+    mock_encryption.decrypt_many.reset_mock()
+    report = manager.audit()
+
+    mock_encryption.decrypt_many.assert_called_once_with(["enc_Tr0ub4dor&3xYz!q"], DATA_KEY)
+    assert report.weak != [] and changed.id not in report.weak
+
+
+def test_check_breaches(manager, mock_encryption):
+    class Checker:
+        def contains_many(self, digests):
+            return [d == sha1(b"hunter2").digest() for d in digests]
+
+    manager.create_entry("site1", "u1", "safe-password")
+    breached = manager.create_entry("site2", "u2", "hunter2")
+
+    assert manager.check_breaches(Checker()) == [breached.id]
+
+
+def test_binary_vault_migrates_json(tmp_path, mock_encryption):
+    plain = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    entry = plain.create_entry("site.com", "user", "pass", group="work")
+
+    binary = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path, vault_format="binary")
+    binary.create_entry("other.com", "user", "pass")
+
+    reopened = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path, vault_format="binary")
+    assert reopened.fetch_entry_by_id(entry.id).group == "work"
+    assert len(reopened.list_passwords()) == 2
+    assert not (tmp_path / "user_passwords" / "alice.json").exists()
+
+
+def test_migrated_vault_opens_with_default_format(tmp_path, mock_encryption):
+    json_vault = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    json_vault.create_entry("site.com", "user", "pass")
+    PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path, vault_format="binary")
+
+    reopened = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    reopened.create_entry("other.com", "user", "pass")
+
+    binary = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path, vault_format="binary")
+    assert sorted(e.address for e in binary.list_passwords()) == ["other.com", "site.com"]
+    assert not (tmp_path / "user_passwords" / "alice.json").exists()
+
+
+def test_entry_history(manager, mock_encryption):
+    entry = manager.create_entry("site.com", "user", "old_pass", group="work")
+
+    edited = manager.fetch_entry_by_id(entry.id)
+    edited.password = "new_pass"
+    edited.group = "personal"
+    manager.edit_entry(entry.id, edited)
+
+    edited = manager.fetch_entry_by_id(entry.id)
+    edited.username = "renamed"
+    manager.edit_entry(entry.id, edited)
+
+    history = manager.entry_history(entry.id)
+    assert [r.changes for r in history] == [
+        {"username": "user"},
+        {"group": "work", "password": "old_pass"},
+    ]
+
+    manager.delete_entry(entry.id)
+    assert manager.entry_history(entry.id)[0].changes["password"] == "new_pass"
+
+
+def test_entry_history_of_vault_without_changes(manager, tmp_path):
+    entry = manager.create_entry("site.com", "user", "pass")
+
+    assert manager.entry_history(entry.id) == []
+    assert manager.entry_history("missing") == []
+    assert not (tmp_path / "user_passwords" / "alice.history").exists()
+
+
+def test_fuzzy_search(manager, mock_encryption):
+    github = manager.create_entry("https://www.github.com", "alice", "pass")
+    manager.create_entry("gitlab.com", "alice", "pass", group="work")
+
+    assert [e.id for e in manager.fuzzy_search("githbu")] == [github.id]
+
+    manager.rename_group("work", "code")
+    assert [e.address for e in manager.fuzzy_search("code")] == ["gitlab.com"]
+
+    manager.delete_entry(github.id)
+    assert manager.fuzzy_search("github") == []
+
+
+def test_list_passwords_sorted_pages(manager, mock_encryption):
+    for address, group in [("c.com", "work"), ("a.com", ""), ("d.com", "work"), ("b.com", "")]:
+        manager.create_entry(address, "user", "pass", group=group)
+
+    def addresses(**kwargs):
+        return [e.address for e in manager.list_passwords(**kwargs)]
+
+    assert addresses() == ["c.com", "a.com", "d.com", "b.com"]
+    assert addresses(sort_by="address", offset=1, limit=2) == ["b.com", "c.com"]
+    assert addresses(sort_by="address", descending=True, limit=1) == ["d.com"]
+    assert addresses(sort_by="address", group="work", descending=True) == ["d.com", "c.com"]
+
+    entry = manager.search_by_address("a.com")[0]
+    edited = manager.fetch_entry_by_id(entry.id)
+    edited.address = "z.com"
+    manager.edit_entry(entry.id, edited)
+    manager.rename_group("work", "a")
+
+    assert addresses(sort_by="address") == ["b.com", "c.com", "d.com", "z.com"]
+    assert set(addresses(sort_by="group", limit=2)) == {"b.com", "z.com"}
+    assert manager.count_entries("a") == 2
+
+
+def test_rotation_schedule(tmp_path, mock_encryption):
+    with patch.object(pwd_manager, "datetime", wraps=datetime) as clock:
+        clock.now.return_value = datetime(2025, 1, 1)
+        manager = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+        stale = manager.create_entry("old.com", "u", "p", max_age_days=30)
+        manager.create_entry("new.com", "u", "p", max_age_days=365)
+        manager.create_entry("never.com", "u", "p")
+
+        later = datetime(2025, 2, 15)
+        assert [e.id for _, e in manager.rotation_due(later)] == [stale.id]
+        assert manager.next_rotation() == ("2025-01-31 00:00:00", manager.list_passwords()[0])
+
+        clock.now.return_value = datetime(2025, 1, 10)
+        edited = manager.fetch_entry_by_id(stale.id)
+        edited.group = "work"
+        manager.edit_entry(stale.id, edited)
+        assert [e.id for _, e in manager.rotation_due(later)] == [stale.id]
+
+        edited = manager.fetch_entry_by_id(stale.id)
+        edited.password = "rotated"
+        manager.edit_entry(stale.id, edited)
+        assert manager.rotation_due(datetime(2025, 2, 5)) == []
+
+    reopened = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    assert reopened.next_rotation()[0] == "2025-02-09 00:00:00"
+    assert [e.address for _, e in reopened.rotation_due(datetime(2026, 1, 2))] == \
+        ["old.com", "new.com"]
+
+
+def test_duplicates_found_and_merged(tmp_path, mock_encryption):
+    with patch.object(pwd_manager, "datetime", wraps=datetime) as clock:
+        manager = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+        clock.now.return_value = datetime(2025, 1, 1)
+        first = manager.create_entry("https://www.GitHub.com/login", "Alice", "old", group="work",
+                                     max_age_days=90)
+        manager.create_entry("gitlab.com", "alice", "other")
+        clock.now.return_value = datetime(2025, 1, 2)
+        newest = manager.create_entry("github.com", "alice ", "new", max_age_days=30)
+
+    assert {e.id for e in manager.find_duplicates("http://github.com:443", "ALICE")} == \
+        {first.id, newest.id}
+    assert len(manager.duplicate_groups()) == 1
+
+    assert manager.merge_duplicates() == {newest.id: [first.id]}
+
+    survivor = manager.fetch_entry_by_id(newest.id)
+    assert (survivor.password, survivor.group, survivor.max_age_days) == ("new", "work", 30)
+    assert manager.entry_history(first.id)[0].changes["password"] == "old"
+    assert manager.duplicate_groups() == []
+
+    reopened = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    assert len(reopened.list_passwords()) == 2
+    assert reopened.search_by_groups("work")[0].id == newest.id
+
+
+def test_merged_passwords_stay_in_the_survivors_history(tmp_path, mock_encryption):
+    with patch.object(pwd_manager, "datetime", wraps=datetime) as clock:
+        manager = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+        for day, password in enumerate(["oldest", "older", "current", "current"], start=1):
+            clock.now.return_value = datetime(2025, 1, day)
+            survivor = manager.create_entry("github.com", "alice", password)
+
+    manager.merge_duplicates()
+
+    assert [e.id for e in manager.list_passwords()] == [survivor.id]
+    assert [r.changes for r in manager.entry_history(survivor.id)] == \
+        [{"password": "older"}, {"password": "oldest"}]
+
+
+def legacy_vault(tmp_path):
+    directory = tmp_path / "user_passwords"
+    directory.mkdir(exist_ok=True)
+    fernet = Fernet(MASTER_KEY)
+    (directory / "alice.json").write_text(json.dumps([{
+        "id": "entry-1", "username": "u", "password": fernet.encrypt(b"secret").decode(),
+        "address": "a.com", "group": "", "created_at": "2020-01-01 00:00:00",
+        "updated_at": "2020-01-01 00:00:00",
+    }]))
+    (directory / "alice.history").write_text(json.dumps({
+        "id": "entry-1", "at": "2099-01-01 00:00:00",
+        "changes": {"password": fernet.encrypt(b"older").decode()},
+    }) + "\n")
+    return directory
+
+
+def test_legacy_vault_gets_its_own_data_key(tmp_path):
+    directory = legacy_vault(tmp_path)
+
+    PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+
+    data_key = VaultKeyring(directory / "alice.keyring").unwrap("alice", MASTER_KEY)
+    assert data_key != MASTER_KEY
+    stored = json.loads((directory / "alice.json").read_text())
+    assert encryption.decrypt(stored[0]["password"], data_key) == "secret"
+    assert not list(directory.glob("*.rekey"))
+
+    reopened = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    assert reopened.fetch_entry_by_id("entry-1").password == "secret"
+    assert reopened.entry_history("entry-1")[0].changes["password"] == "older"
+
+
+def test_sharing_a_legacy_vault_does_not_reveal_the_owner_key(tmp_path):
+    directory = legacy_vault(tmp_path)
+    bob_key = Fernet.generate_key()
+
+    PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path).add_member("bob", bob_key)
+
+    shared = PasswordManager("bob", bob_key, AuditLog(""), tmp_path, vault="alice")
+    assert shared.fetch_entry_by_id("entry-1").password == "secret"
+    assert VaultKeyring(directory / "alice.keyring").unwrap("bob", bob_key) != MASTER_KEY
+
+
+def test_interrupted_legacy_rekey_is_finished_on_open(tmp_path):
+    directory = legacy_vault(tmp_path)
+    PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    keyring = VaultKeyring(directory / "alice.keyring")
+    data_key = keyring.unwrap("alice", MASTER_KEY)
+
+    # Stopped after writing the keyring, before moving the re-encrypted vault in place
+    (directory / "alice.json").rename(directory / "alice.json.rekey")
+    (directory / "alice.json").write_text("[]")
+    keyring.create("alice", MASTER_KEY, data_key, ["alice.json"])
+
+    reopened = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    assert reopened.fetch_entry_by_id("entry-1").password == "secret"
+    assert VaultKeyring(directory / "alice.keyring").pending() == []
+
+
+def test_shared_vault(tmp_path):
+    bob_key = Fernet.generate_key()
+    manager = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    entry = manager.create_entry("a.com", "u", "secret")
+
+    with pytest.raises(VaultAccessException):
+        PasswordManager("bob", bob_key, AuditLog(""), tmp_path, vault="alice")
+
+    manager.add_member("bob", bob_key)
+    shared = PasswordManager("bob", bob_key, AuditLog(""), tmp_path, vault="alice")
+    assert shared.fetch_entry_by_id(entry.id).password == "secret"
+    assert manager.members() == ["alice", "bob"]
+
+    manager.remove_member("bob")
+    with pytest.raises(VaultAccessException):
+        PasswordManager("bob", bob_key, AuditLog(""), tmp_path, vault="alice")
+
+
+def test_binary_vault_stores_raw_tokens(tmp_path):
+    manager = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path, vault_format="binary")
+    entry = manager.create_entry("site.com", "user", "pass")
+    token = manager.export_records([entry.id])[0]["password"]
+
+    data = (tmp_path / "user_passwords" / "alice.vault").read_bytes()
+    body = zlib.decompress(data[12:-32])
+    assert encryption.to_raw(token) in body and token.encode() not in body
+
+    reopened = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path, vault_format="binary")
+    assert reopened.fetch_entry_by_id(entry.id).password == "pass"
+
+
+def test_attachments_follow_their_entry(tmp_path):
+    manager = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    entry = manager.create_entry("host.example.com", "deploy", "pass")
+    manager.attach_file(entry.id, "id_ed25519", io.BytesIO(b"private key"))
+    note = manager.attach_note(entry.id, "Recovery codes", "1234-5678")
+
+    with pytest.raises(InvalidEntryException):
+        manager.attach_note("bad-id", "note", "text")
+
+    reopened = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    assert [a.name for a in reopened.list_attachments(entry.id)] == ["id_ed25519", "Recovery codes"]
+    assert reopened.read_note(note.id) == "1234-5678"
+    target = io.BytesIO()
+    reopened.read_attachment(reopened.list_attachments(entry.id)[0].id, target)
+    assert target.getvalue() == b"private key"
+
+    reopened.delete_entry(entry.id)
+    with pytest.raises(InvalidAttachmentException):
+        reopened.read_note(note.id)
+    directory = tmp_path / "user_passwords" / "alice.attachments"
+    assert [p.name for p in directory.rglob("*") if p.is_file()] == ["catalog"]
+
+
+def test_fetch_password_raw(tmp_path):
+    manager = PasswordManager("alice", MASTER_KEY, AuditLog(""), tmp_path)
+    entry = manager.create_entry("a.com", "u", "pässword")
+
+    password = manager.fetch_password_raw(entry.id)
+
+    assert isinstance(password, bytearray) and password == "pässword".encode()
+    with pytest.raises(InvalidEntryException):
+        manager.fetch_password_raw("bad-id")
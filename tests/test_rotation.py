@@ -0,0 +1,59 @@
+from src.manager.rotation import RotationSchedule
+
+
+def test_next_due_skips_rescheduled_and_removed(tmp_path):
+    schedule = RotationSchedule(tmp_path / "alice.rotation")
+    schedule.schedule("a", "2025-03-01 00:00:00")
+    schedule.schedule("b", "2025-01-01 00:00:00")
+    schedule.schedule("c", "2025-02-01 00:00:00")
+
+    assert schedule.next_due() == ("2025-01-01 00:00:00", "b")
+
+    schedule.schedule("b", "2025-06-01 00:00:00")
+    schedule.remove("c")
+    assert schedule.next_due() == ("2025-03-01 00:00:00", "a")
+    assert len(schedule) == 2
+
+
+def test_due_before(tmp_path):
+    schedule = RotationSchedule(tmp_path / "alice.rotation")
+    for i in range(1, 10):
+        schedule.schedule(str(i), f"2025-01-0{i} 00:00:00")
+    schedule.schedule("3", "2026-01-01 00:00:00")
+
+    due = schedule.due_before("2025-01-05 00:00:00")
+
+    assert [entry_id for _, entry_id in due] == ["1", "2", "4", "5"]
+
+
+def test_saved_schedule_is_only_trusted_with_matching_stamp(tmp_path):
+    path = tmp_path / "alice.rotation"
+    schedule = RotationSchedule(path)
+    schedule.schedule("a", "2025-01-01 00:00:00")
+    schedule.save([1, 2])
+
+    reloaded = RotationSchedule(path)
+    assert reloaded.load([1, 2])
+    assert reloaded.next_due() == ("2025-01-01 00:00:00", "a")
+    assert not RotationSchedule(path).load([1, 3])
+    assert not RotationSchedule(tmp_path / "missing").load([1, 2])
+
+
+def test_rescheduling_a_removed_entry_keeps_one_pair(tmp_path):
+    path = tmp_path / "alice.rotation"
+    schedule = RotationSchedule(path)
+    schedule.schedule("a", "2025-01-01 00:00:00")
+    schedule.schedule("b", "2025-02-01 00:00:00")
+    schedule.remove("a")
+    schedule.schedule("a", "2025-01-01 00:00:00")
+    schedule.schedule("b", "2025-03-01 00:00:00")
+
+    assert schedule.due_before("2026-01-01 00:00:00") == [
+        ("2025-01-01 00:00:00", "a"), ("2025-03-01 00:00:00", "b")]
+
+    # The stale pair of b is saved as is and still ignored after loading
+    schedule.save([1, 2])
+    reloaded = RotationSchedule(path)
+    assert reloaded.load([1, 2])
+    assert list(reloaded) == list(schedule)
+    assert reloaded.due_before("2026-01-01 00:00:00") == schedule.due_before("2026-01-01 00:00:00")
@@ -0,0 +1,45 @@
+from cryptography.fernet import Fernet
+
+from src.manager.search_index import SearchIndex, IndexRecord
+
+
+def test_index_persists_deltas(tmp_path):
+    key = Fernet.generate_key()
+    path = tmp_path / "alice.index"
+
+    index = SearchIndex(path, key)
+    index.put("1", IndexRecord("v1", "site.com", "bob", "work"))
+    index.flush()
+    index.put("2", IndexRecord("v2", "other.com", "eve", ""))
+    index.remove("1")
+    index.flush()
+
+    assert len(path.read_text().split()) == 2
+
+    reopened = SearchIndex(path, key)
+    assert reopened.get("1") is None
+    assert reopened.get("2") == IndexRecord("v2", "other.com", "eve", "")
+
+
+def test_index_compacts(tmp_path):
+    key = Fernet.generate_key()
+    path = tmp_path / "alice.index"
+
+    index = SearchIndex(path, key, compact_after=2)
+    for i in range(5):
+        index.put(str(i), IndexRecord(f"v{i}", "a", "u", "g"))
+        index.flush()
+
+    assert len(path.read_text().split()) < 5
+    assert len(SearchIndex(path, key)) == 5
+
+
+def test_index_with_wrong_key_is_discarded(tmp_path):
+    path = tmp_path / "alice.index"
+
+    index = SearchIndex(path, Fernet.generate_key())
+    index.put("1", IndexRecord("v1", "a", "u", "g"))
+    index.flush()
+
+    assert len(SearchIndex(path, Fernet.generate_key())) == 0
+    assert not path.exists()
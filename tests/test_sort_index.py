@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.manager.sort_index import SortIndex
+
+
+@pytest.fixture
+def entries():
+    return {
+        "1": SimpleNamespace(address="beta.com", updated_at="2025-01-03"),
+        "2": SimpleNamespace(address="Alpha.com", updated_at="2025-01-01"),
+        "3": SimpleNamespace(address="gamma.com", updated_at="2025-01-02"),
+    }
+
+
+def test_page_in_both_directions(entries):
+    index = SortIndex("address", entries)
+
+    assert index.page() == ["2", "1", "3"]
+    assert index.page(1, 1) == ["1"]
+    assert index.page(descending=True) == ["3", "1", "2"]
+    assert index.page(1, 5, descending=True) == ["1", "2"]
+    assert index.page(5, 5) == []
+
+
+def test_add_and_remove_keep_order(entries):
+    index = SortIndex("updated_at", entries)
+    index.remove("1", entries["1"])
+    index.add("4", SimpleNamespace(updated_at="2025-01-01"))
+
+    assert index.page() == ["2", "4", "3"]
+    assert len(index) == 3
+
+
+def test_unknown_field(entries):
+    with pytest.raises(ValueError):
+        SortIndex("password", entries)
@@ -0,0 +1,53 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.startup import STARTUP_BUDGET_SECONDS, time_to_first_frame
+from benchmarks.synthetic import write_synthetic_users
+from src.logging.logging import Category, Level
+from src.user.user_manager import UserManager
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class AuditLog:
+    def log(self, msg: str, lvl: Level = Level.INFO,
+            category: Category = Category.SYSTEM) -> None:
+        pass
+
+    def log_with_user(self, msg: str, usr: str, lvl: Level = Level.INFO,
+                      category: Category = Category.SYSTEM) -> None:
+        pass
+
+
+def test_time_to_first_frame_within_budget(tmp_path):
+    user_file = write_synthetic_users(tmp_path / "users.json", 10_000, "password")
+
+    elapsed = asyncio.run(time_to_first_frame(user_file, AuditLog()))
+
+    assert elapsed <= STARTUP_BUDGET_SECONDS
+
+
+def test_users_load_in_background(tmp_path):
+    from src.ui.ui import PasswordManagerApp
+
+    async def scenario():
+        app = PasswordManagerApp(tmp_path / "users.json", AuditLog())
+        async with app.run_test() as pilot:
+            await pilot.pause()
+            return await asyncio.wrap_future(app.users)
+
+    assert isinstance(asyncio.run(scenario()), UserManager)
+
+
+def test_first_frame_does_not_import_the_vault():
+    deferred = ["src.ui.vault", "src.ui.modals", "src.manager.password_manager",
+                "src.user.user_manager", "src.cli.cli", "cryptography"]
+    code = ("import sys, main, src.ui.ui; "
+            f"print([m for m in {deferred!r} if m in sys.modules])")
+
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "[]"
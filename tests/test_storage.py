@@ -0,0 +1,100 @@
+import base64
+import json
+
+import pytest
+
+from src.common.exceptions import CorruptedVaultException
+from src.manager.storage import BinaryVaultStore, JsonVaultStore, migrate_json_to_binary
+
+RECORDS = [
+    {"id": "1", "username": "bob", "password": "tok1", "address": "site.com", "group": "work",
+     "created_at": "2025-01-01 12:00:00", "updated_at": "2025-01-01 12:00:00"},
+    {"id": "2", "username": "žluťoučký", "password": "tok2", "sealed": "tok3",
+     "created_at": "2025-01-01 12:00:00", "updated_at": "2025-01-02 12:00:00", "max_age": 30},
+]
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_binary_roundtrip(tmp_path, compression):
+    store = BinaryVaultStore(tmp_path / "alice.vault", b"key", compression)
+    store.write(RECORDS)
+
+    assert store.read() == RECORDS
+    assert store.read_columns()["sealed"] == [None, "tok3"]
+
+
+def test_binary_values_with_separator(tmp_path):
+    store = BinaryVaultStore(tmp_path / "alice.vault")
+    records = [{"id": "a\0b"}, {"id": ""}]
+    store.write(records)
+
+    assert store.read() == records
+
+
+def test_binary_empty_vault(tmp_path):
+    store = BinaryVaultStore(tmp_path / "alice.vault", b"key")
+    store.create()
+
+    assert store.read() == []
+
+
+def test_binary_detects_corruption(tmp_path):
+    store = BinaryVaultStore(tmp_path / "alice.vault", b"key")
+    store.write(RECORDS)
+
+    data = bytearray(store.path.read_bytes())
+    data[20] ^= 1
+    store.path.write_bytes(bytes(data))
+
+    with pytest.raises(CorruptedVaultException):
+        store.read()
+
+
+def test_binary_detects_wrong_key(tmp_path):
+    BinaryVaultStore(tmp_path / "alice.vault", b"key").write(RECORDS)
+
+    with pytest.raises(CorruptedVaultException):
+        BinaryVaultStore(tmp_path / "alice.vault", b"other").read()
+
+
+def test_binary_rejects_unkeyed_digest(tmp_path):
+    store = BinaryVaultStore(tmp_path / "alice.vault", b"key")
+    store.write(RECORDS)
+
+    # A forged vault with the HMAC flag cleared and a plain sha256 digest
+    forged = BinaryVaultStore(tmp_path / "forged.vault")
+    forged.write([dict(RECORDS[0], address="evil.com")])
+    store.path.write_bytes(forged.path.read_bytes())
+
+    with pytest.raises(CorruptedVaultException):
+        store.read()
+
+
+def test_binary_rejects_mixed_types(tmp_path):
+    with pytest.raises(TypeError):
+        BinaryVaultStore(tmp_path / "alice.vault").write([{"id": "1"}, {"id": 2}])
+
+
+def test_migrate_json_to_binary(tmp_path):
+    json_path = tmp_path / "alice.json"
+    JsonVaultStore(json_path).write(RECORDS)
+
+    assert migrate_json_to_binary(json_path, tmp_path / "alice.vault", b"key") == 2
+    assert not json_path.exists()
+    assert json.loads((tmp_path / "alice.json.bak").read_text()) == RECORDS
+    assert BinaryVaultStore(tmp_path / "alice.vault", b"key").read() == RECORDS
+
+
+def test_token_fields_are_stored_raw(tmp_path):
+    tokens = [base64.urlsafe_b64encode(bytes([i]) * (57 + i)).decode() for i in range(3)]
+    records = [{"id": str(i), "password": t} for i, t in enumerate(tokens)]
+    store = BinaryVaultStore(tmp_path / "alice.vault", compression="none", token_fields=("password",))
+    store.write(records)
+
+    assert tokens[0].encode() not in store.path.read_bytes()
+    assert base64.urlsafe_b64decode(tokens[0]) in store.path.read_bytes()
+    assert store.read() == records
+
+    # the binary format round-trips any other values of token fields as well
+    store.write(RECORDS)
+    assert store.read() == RECORDS
@@ -0,0 +1,23 @@
+from unittest.mock import patch
+
+import src.security.strength as strength
+
+
+def test_score_password():
+    assert strength.score_password("").score == 0
+    assert strength.score_password("aaaaaaaa").weak
+    assert strength.score_password("correct-Horse-battery-9").score == 4
+
+
+def test_repeated_characters_lower_entropy():
+    assert strength.estimate_entropy("abababab") < strength.estimate_entropy("abcdefgh")
+
+
+def test_score_passwords_in_parallel():
+    passwords = ["abc", "Tr0ub4dor&3xYz!q"] * 6
+
+    with patch.object(strength, "PARALLEL_THRESHOLD", 4), \
+         patch.object(strength, "PARALLEL_CHUNK_SIZE", 5):
+        parallel = strength.score_passwords(passwords)
+
+    assert parallel == [strength.score_password(p) for p in passwords]
@@ -0,0 +1,162 @@
+import threading
+
+import pytest
+from cryptography.fernet import Fernet
+
+from src.common.exceptions import VaultAccessException
+from src.manager.password_manager import PasswordManager
+from src.sync.sync import VaultReplica, LoopbackTransport, DirectoryTransport
+from src.logging.logging import Category, Level
+
+
+class AuditLog:
+    def log(self, msg: str, lvl: Level = Level.INFO,
+            category: Category = Category.SYSTEM) -> None:
+        pass
+
+    def log_with_user(self, msg: str, usr: str, lvl: Level = Level.INFO,
+                      category: Category = Category.SYSTEM) -> None:
+        pass
+
+
+@pytest.fixture
+def key():
+    return Fernet.generate_key()
+
+
+def replica(tmp_path, name, key, encrypt_metadata=False):
+    manager = PasswordManager("alice", key, AuditLog(), tmp_path / name,
+                              encrypt_metadata=encrypt_metadata)
+    return manager, VaultReplica(manager, tmp_path / f"{name}.sync.json")
+
+
+def addresses(manager):
+    return sorted(e.address for e in manager.list_passwords())
+
+
+def test_sync_exchanges_entries_both_ways(tmp_path, key):
+    mgr_a, rep_a = replica(tmp_path, "a", key)
+    mgr_b, rep_b = replica(tmp_path, "b", key)
+    rep_a.sync(LoopbackTransport(rep_b.handle))
+    mgr_a.create_entry("a.com", "u", "pa")
+    mgr_b.create_entry("b.com", "u", "pb")
+
+    result = rep_a.sync(LoopbackTransport(rep_b.handle))
+
+    assert (result.received, result.sent, result.conflicts) == (1, 1, 0)
+    assert addresses(mgr_a) == addresses(mgr_b) == ["a.com", "b.com"]
+    entry_id = mgr_a.search_by_address("b.com")[0].id
+    assert mgr_a.fetch_entry_by_id(entry_id).password == "pb"
+
+
+def test_sync_only_sends_deltas(tmp_path, key):
+    mgr_a, rep_a = replica(tmp_path, "a", key)
+    mgr_b, rep_b = replica(tmp_path, "b", key)
+    for i in range(5):
+        mgr_a.create_entry(f"site{i}.com", "u", "p")
+    rep_a.sync(LoopbackTransport(rep_b.handle))
+
+    transport = LoopbackTransport(rep_b.handle)
+    result = rep_a.sync(transport)
+    assert (result.received, result.sent) == (0, 0)
+
+    mgr_a.create_entry("new.com", "u", "p")
+    result = rep_a.sync(LoopbackTransport(rep_b.handle))
+    assert (result.received, result.sent) == (0, 1)
+
+
+def test_sync_propagates_deletes(tmp_path, key):
+    mgr_a, rep_a = replica(tmp_path, "a", key)
+    mgr_b, rep_b = replica(tmp_path, "b", key)
+    entry = mgr_a.create_entry("a.com", "u", "p")
+    rep_a.sync(LoopbackTransport(rep_b.handle))
+
+    mgr_b.delete_entry(entry.id)
+    rep_a.sync(LoopbackTransport(rep_b.handle))
+
+    assert mgr_a.list_passwords() == []
+
+
+def test_concurrent_edits_resolve_the_same_way(tmp_path, key):
+    mgr_a, rep_a = replica(tmp_path, "a", key)
+    mgr_b, rep_b = replica(tmp_path, "b", key)
+    mgr_c, rep_c = replica(tmp_path, "c", key)
+    entry = mgr_a.create_entry("a.com", "u", "p")
+    rep_a.sync(LoopbackTransport(rep_b.handle))
+    rep_a.sync(LoopbackTransport(rep_c.handle))
+
+    for manager, name in ((mgr_b, "from-b"), (mgr_c, "from-c")):
+        edited = manager.fetch_entry_by_id(entry.id)
+        edited.username = name
+        manager.edit_entry(entry.id, edited)
+
+    result = rep_b.sync(LoopbackTransport(rep_c.handle))
+    rep_a.sync(LoopbackTransport(rep_b.handle))
+    rep_a.sync(LoopbackTransport(rep_c.handle))
+
+    assert result.conflicts == 1
+    usernames = {m.fetch_entry_by_id(entry.id).username for m in (mgr_a, mgr_b, mgr_c)}
+    assert len(usernames) == 1
+
+
+def test_sync_of_encrypted_metadata(tmp_path, key):
+    mgr_a, rep_a = replica(tmp_path, "a", key, encrypt_metadata=True)
+    mgr_b, rep_b = replica(tmp_path, "b", key, encrypt_metadata=True)
+    mgr_a.create_entry("secret.com", "u", "p", group="work")
+
+    rep_a.sync(LoopbackTransport(rep_b.handle))
+
+    assert mgr_b.search_by_groups("work")[0].address == "secret.com"
+
+
+def test_directory_transport(tmp_path, key):
+    mgr_a, rep_a = replica(tmp_path, "a", key)
+    mgr_b, rep_b = replica(tmp_path, "b", key)
+    mgr_b.create_entry("b.com", "u", "p")
+    shared = tmp_path / "shared"
+
+    client = DirectoryTransport(shared, timeout=5, poll_interval=0.01)
+    server = DirectoryTransport(shared)
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            server.serve_pending(rep_b.handle)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        rep_a.sync(client)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert addresses(mgr_a) == ["b.com"]
+
+
+def test_new_replica_adopts_the_data_key(tmp_path, key):
+    mgr_a, rep_a = replica(tmp_path, "a", key)
+    mgr_a.create_entry("a.com", "u", "pa")
+    mgr_b, rep_b = replica(tmp_path, "b", key)
+
+    rep_b.sync(LoopbackTransport(rep_a.handle))
+
+    entry_id = mgr_b.search_by_address("a.com")[0].id
+    assert mgr_b.fetch_entry_by_id(entry_id).password == "pa"
+    reopened = PasswordManager("alice", key, AuditLog(), tmp_path / "b")
+    assert reopened.fetch_entry_by_id(entry_id).password == "pa"
+
+
+def test_sync_refuses_vaults_with_different_data_keys(tmp_path, key):
+    mgr_a, rep_a = replica(tmp_path, "a", key)
+    mgr_b, rep_b = replica(tmp_path, "b", key)
+    mgr_a.create_entry("a.com", "u", "pa")
+    mgr_b.create_entry("b.com", "u", "pb")
+
+    with pytest.raises(VaultAccessException):
+        rep_a.sync(LoopbackTransport(rep_b.handle))
+    assert addresses(mgr_a) == ["a.com"]
+
+    response = rep_b.handle({"op": "hello", "replica": rep_a.replica_id, "vector": {},
+                             "key": mgr_a.wrapped_key()})
+    assert "error" in response and "changes" not in response
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+import benchmarks.ui as ui
+from benchmarks.ui import UI_BUDGETS, measure_vault_screen, open_synthetic_vault
+from src.logging.logging import Category, Level
+
+
+class AuditLog:
+    def log(self, msg: str, lvl: Level = Level.INFO,
+            category: Category = Category.SYSTEM) -> None:
+        pass
+
+    def log_with_user(self, msg: str, usr: str, lvl: Level = Level.INFO,
+                      category: Category = Category.SYSTEM) -> None:
+        pass
+
+
+def test_vault_screen_within_budget(tmp_path):
+    pwd_manager, user_manager = open_synthetic_vault(tmp_path, 1_000, AuditLog())
+
+    timings = asyncio.run(measure_vault_screen(pwd_manager, user_manager))
+
+    over = {step: t for step, t in timings.items() if t > UI_BUDGETS[step]}
+    assert not over, f"over budget: {over}"
+    # the entry created through the modals was edited and deleted again
+    assert pwd_manager.count_entries() == 1_000
+    assert pwd_manager.search_by_address("benchmark.example.com") == []
+
+
+def test_hung_step_times_out(monkeypatch):
+    class Pilot:
+        async def pause(self, delay=None):
+            await asyncio.sleep(delay or 0)
+
+    monkeypatch.setitem(UI_BUDGETS, "mount", 0.01)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(ui._step(Pilot(), "mount", lambda: None, lambda: False))
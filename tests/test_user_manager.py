@@ -3,19 +3,27 @@ import json
 from unittest.mock import patch
 
 from src.user.user_manager import UserManager, User
-from src.logging.logging import Level
-from src.common.exceptions import UsernameTakenException, UserInvalidLoginException
+from src.logging.logging import Category, Level
+from src.common.exceptions import GroupNameTakenException, UsernameTakenException, \
+    UserInvalidLoginException, VaultAccessException
+from src.manager.password_manager import PasswordManager
+from src.common.generators import generate_hashed_password
+from src.security.kdf import KdfParams, hash_password
 
 import src.user.user_manager as user_manager
 
+FAST_KDF = KdfParams(n=2**10)
+
 class AuditLog:
     def __init__(self, path: str) -> None:
         pass
 
-    def log(self, msg: str, lvl: Level = Level.INFO) -> None:
+    def log(self, msg: str, lvl: Level = Level.INFO,
+            category: Category = Category.SYSTEM) -> None:
         pass
 
-    def log_with_user(self, msg: str,  usr: str, lvl: Level = Level.INFO) -> None:
+    def log_with_user(self, msg: str, usr: str, lvl: Level = Level.INFO,
+                      category: Category = Category.SYSTEM) -> None:
         pass
 
 
@@ -37,7 +45,7 @@ def mock_encryption():
 def manager(tmp_path, mock_generators):
     temp_file = tmp_path / "test_users.json"
     fake_logger = AuditLog("")
-    return UserManager(logger=fake_logger, user_file_path=str(temp_file))
+    return UserManager(logger=fake_logger, user_file_path=str(temp_file), kdf_params=FAST_KDF)
 
 def test_init_creates_empty_file(tmp_path):
     temp_file = tmp_path / "new_users.json"
@@ -56,10 +64,10 @@ def test_register_user_success(tmp_path, manager,  mock_generators):
     assert "alice" in manager._UserManager__users
     user = manager._UserManager__users["alice"]
     assert user.username == "alice"
-    assert user.password_hash == "mock_hashed_password"
+    assert user.password_hash == hash_password("secret123", "mock_salt", FAST_KDF)
+    assert user.hash_kdf == user.key_kdf == FAST_KDF.to_dict()
 
     mock_generators.generate_salt.assert_called()
-    mock_generators.generate_hashed_password.assert_called_with("secret123", "mock_salt")
 
 
 def test_register_user_saves_to_file(manager, tmp_path):
@@ -144,4 +152,135 @@ def test_load_existing_users(tmp_path):
     manager = UserManager(logger=fake_logger, user_file_path=str(f))
 
     assert "dave" in manager._UserManager__users
-    assert manager.fetch_groups("dave") == ["groupA"]
\ No newline at end of file
+    assert manager.fetch_groups("dave") == ["groupA"]
+
+def test_group_rename_and_delete_are_saved(manager):
+    manager.register_user("alice", "pass")
+    manager.create_group("alice", "admins")
+    manager.create_group("alice", "editors")
+
+    manager.rename_group("alice", "admins", "owners")
+    manager.delete_group("alice", "editors")
+
+    file_content = json.loads(manager._UserManager__user_file.read_text())
+    assert file_content[0]["groups"] == ["owners"]
+
+
+def test_group_changes_cascade_to_the_vault(tmp_path):
+    users = UserManager(AuditLog(""), tmp_path / "users.json", kdf_params=FAST_KDF)
+    users.register_user("alice", "pass")
+    vault = PasswordManager("alice", users.login_user("alice", "pass"), AuditLog(""), tmp_path)
+    for group in ("work", "home"):
+        users.create_group("alice", group)
+        vault.create_entry(f"{group}.com", "alice", "p", group=group)
+
+    with pytest.raises(GroupNameTakenException):
+        users.rename_group("alice", "work", "home", vault.rename_group)
+    assert users.fetch_groups("alice") == ["work", "home"]
+    assert vault.group_counts() == {"work": 1, "home": 1}
+
+    users.rename_group("alice", "work", "office", vault.rename_group)
+    assert users.fetch_groups("alice") == ["office", "home"]
+    assert [e.address for e in vault.search_by_groups("office")] == ["work.com"]
+
+    users.delete_group("alice", "home", vault.delete_group)
+    assert users.fetch_groups("alice") == ["office"]
+    assert vault.group_counts() == {"office": 1, "": 1}
+
+
+def legacy_user_file(tmp_path, password):
+    f = tmp_path / "legacy.json"
+    f.write_text(json.dumps([{
+        "username": "dave",
+        "password_salt": "s1",
+        "password_hash": generate_hashed_password(password, "s1"),
+        "master_password_salt": "ms1",
+        "groups": [],
+    }]), encoding="utf-8")
+    return f
+
+
+def test_legacy_user_is_upgraded_on_login(tmp_path, mock_encryption):
+    f = legacy_user_file(tmp_path, "pass")
+    manager = UserManager(AuditLog(""), f, kdf_params=FAST_KDF)
+
+    with pytest.raises(UserInvalidLoginException):
+        manager.login_user("dave", "wrong")
+    assert json.loads(f.read_text())[0].get("hash_kdf") is None
+
+    manager.login_user("dave", "pass")
+    stored = json.loads(f.read_text())[0]
+    assert stored["hash_kdf"] == FAST_KDF.to_dict()
+    assert stored["password_hash"] == hash_password("pass", stored["password_salt"], FAST_KDF)
+
+    # The master key keeps the parameters the vault was encrypted with
+    assert stored["key_kdf"] == {}
+    mock_encryption.password_to_fernet_key.assert_called_with("pass", b"ms1", KdfParams())
+
+    reloaded = UserManager(AuditLog(""), f, kdf_params=FAST_KDF)
+    reloaded.login_user("dave", "pass")
+
+
+def test_weaker_verifier_is_rehashed(tmp_path, mock_encryption):
+    f = tmp_path / "users.json"
+    UserManager(AuditLog(""), f, kdf_params=KdfParams(n=2**8)).register_user("alice", "pass")
+
+    UserManager(AuditLog(""), f, kdf_params=FAST_KDF).login_user("alice", "pass")
+
+    stored = json.loads(f.read_text())[0]
+    assert stored["hash_kdf"] == FAST_KDF.to_dict()
+    assert stored["key_kdf"] == KdfParams(n=2**8).to_dict()
+
+
+def test_weaker_master_key_is_upgraded_with_the_vaults(tmp_path):
+    f = tmp_path / "users.json"
+    vault_dir = tmp_path / "user_passwords"
+    weak = KdfParams(n=2**8)
+    UserManager(AuditLog(""), f, kdf_params=weak).register_user("alice", "pass")
+    old_key = UserManager(AuditLog(""), f, kdf_params=weak).login_user("alice", "pass")
+    entry = PasswordManager("alice", old_key, AuditLog(""), tmp_path).create_entry("a.com", "u", "p")
+
+    new_key = UserManager(AuditLog(""), f, kdf_params=FAST_KDF, vault_dir=vault_dir) \
+        .login_user("alice", "pass")
+
+    assert new_key != old_key
+    assert json.loads(f.read_text())[0]["key_kdf"] == FAST_KDF.to_dict()
+    assert PasswordManager("alice", new_key, AuditLog(""), tmp_path) \
+        .fetch_entry_by_id(entry.id).password == "p"
+    with pytest.raises(VaultAccessException):
+        PasswordManager("alice", old_key, AuditLog(""), tmp_path)
+
+    again = UserManager(AuditLog(""), f, kdf_params=FAST_KDF, vault_dir=vault_dir)
+    assert again.login_user("alice", "pass") == new_key
+
+
+def test_change_password_rekeys_before_saving(tmp_path):
+    f = tmp_path / "users.json"
+    manager = UserManager(AuditLog(""), f, kdf_params=FAST_KDF)
+    manager.register_user("alice", "old")
+    old_key = manager.login_user("alice", "old")
+    rekeyed = []
+
+    new_key = manager.change_password("alice", "old", "new", lambda *keys: rekeyed.append(keys))
+
+    assert rekeyed == [(old_key, new_key)]
+    reloaded = UserManager(AuditLog(""), f, kdf_params=FAST_KDF)
+    assert reloaded.login_user("alice", "new") == new_key
+    with pytest.raises(UserInvalidLoginException):
+        reloaded.login_user("alice", "old")
+
+
+def test_failed_rekey_keeps_the_old_password(tmp_path):
+    f = tmp_path / "users.json"
+    manager = UserManager(AuditLog(""), f, kdf_params=FAST_KDF)
+    manager.register_user("alice", "old")
+
+    def rekey(old_key, new_key):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        manager.change_password("alice", "old", "new", rekey)
+    with pytest.raises(UserInvalidLoginException):
+        manager.change_password("alice", "wrong", "new", rekey)
+
+    UserManager(AuditLog(""), f, kdf_params=FAST_KDF).login_user("alice", "old")